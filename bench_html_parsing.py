@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Micro-benchmark del parsing della pagina ospiti
+
+Confronta il parsing originale (BeautifulSoup + html.parser su tutta la
+pagina), le varianti BeautifulSoup (parser lxml, SoupStrainer sui container)
+e html_parsing.parse_guests_page (lxml + XPath), verificando che tutte
+estraggano le stesse voci.
+
+Esempio:
+  curl -s https://officeofcards.com/ospite/ -o ospite.html
+  python bench_html_parsing.py --pages ospite.html --repeat 20
+
+Senza --pages usa una pagina generata dal catalogo locale (data/db.csv),
+appesantita con markup di contorno simile a quello di una pagina WordPress.
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from html_parsing import GuestEntry, parse_guests_page
+
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+def _soup_entries(soup) -> List[GuestEntry]:
+    """Estrazione delle voci come nel WebScraper originale"""
+    entries = []
+    for container in soup.find_all('div', attrs={'class': 'container-overlay'}):
+        spans = container.find_all('span')
+        try:
+            episode_id = int(spans[0].text.split()[-1])
+        except (IndexError, ValueError):
+            continue
+        link = container.find('a')
+        entries.append(GuestEntry(
+            episode_id=episode_id,
+            guest=spans[1].text.strip() if len(spans) > 1 else '*',
+            url=link.get('href', '*') if link else '*'
+        ))
+    return entries
+
+
+def bs4_html_parser(html: str) -> List[GuestEntry]:
+    return _soup_entries(BeautifulSoup(html, 'html.parser'))
+
+
+def bs4_lxml(html: str) -> List[GuestEntry]:
+    return _soup_entries(BeautifulSoup(html, 'lxml'))
+
+
+def bs4_strainer(html: str) -> List[GuestEntry]:
+    strainer = SoupStrainer('div', attrs={'class': 'container-overlay'})
+    return _soup_entries(BeautifulSoup(html, 'html.parser', parse_only=strainer))
+
+
+def lxml_xpath(html: str) -> List[GuestEntry]:
+    return parse_guests_page(html)[0]
+
+
+PARSERS = [
+    ('bs4 + html.parser', bs4_html_parser),
+    ('bs4 + lxml', bs4_lxml),
+    ('bs4 + SoupStrainer', bs4_strainer),
+    ('lxml + XPath', lxml_xpath),
+]
+
+
+def generated_page(padding_kb: int) -> str:
+    """Pagina ospiti dal catalogo locale, con header/footer e script di contorno"""
+    import pandas as pd
+    from fake_services import _guest_containers
+
+    containers = _guest_containers(pd.read_csv(Path('data', 'db.csv'), encoding='utf-8'))
+    filler_block = (
+        '<div class="elementor-widget"><ul class="menu">'
+        + ''.join(f'<li class="menu-item"><a href="/pagina-{i}/">Voce {i}</a></li>' for i in range(10))
+        + '</ul><script>window.dataLayer=window.dataLayer||[];</script></div>\n'
+    )
+    filler = filler_block * max(1, padding_kb * 1024 // len(filler_block))
+    half = len(filler) // 2
+    return (
+        '<!DOCTYPE html><html><head><title>Ospiti</title></head><body>\n'
+        + filler[:half]
+        + '<div class="archive">\n' + '\n'.join(containers) + '\n</div>\n'
+        + filler[half:]
+        + '</body></html>'
+    )
+
+
+def measure(func: Callable[[str], List[GuestEntry]], html: str, repeat: int) -> float:
+    """Mediana in secondi di `repeat` esecuzioni"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    """Funzione principale"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', nargs='*', type=Path, default=[],
+                        help='Copie salvate della pagina ospiti')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--padding-kb', type=int, default=150,
+                        help='Markup di contorno della pagina generata')
+    args = parser.parse_args()
+
+    pages = [(path.name, path.read_text(encoding='utf-8')) for path in args.pages]
+    if not pages:
+        pages = [('pagina generata', generated_page(args.padding_kb))]
+
+    for name, html in pages:
+        expected = bs4_html_parser(html)
+        logger.info(f"📄 {name}: {len(html) / 1024:.0f} KB, {len(expected)} voci")
+
+        baseline = None
+        for label, func in PARSERS:
+            if func(html) != expected:
+                logger.error(f"  ❌ {label}: risultato diverso dal parsing originale")
+                continue
+
+            elapsed = measure(func, html, args.repeat)
+            baseline = baseline or elapsed
+            logger.info(f"  {label:<20} {elapsed * 1000:8.2f} ms  x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
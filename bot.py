@@ -6,6 +6,8 @@ Bot Telegram per Office of Cards Podcast
 Versione refactorata con check centralizzato e migliore gestione
 """
 
+import asyncio
+import html
 import logging
 from datetime import time, datetime
 from zoneinfo import ZoneInfo
@@ -24,9 +26,22 @@ from telegram.ext import (
     filters
 )
 
+from broadcast_queue import BroadcastQueue, JOB_RUNNING, JOB_DONE, DELIVERY_PENDING
+from callback_data import encode_part_selection, decode_part_selection
 from config import Config
 from database_csv import Database
+from http_cache import HttpCache
+from http_client import HttpClient
+from notification_dispatcher import (
+    NotificationDispatcher,
+    DeliveryReport,
+    SENT,
+    BLOCKED,
+    NOT_FOUND,
+    DEACTIVATED
+)
 from spotify_service import SpotifyService
+from update_processor import PerChatUpdateProcessor
 from web_scraper import WebScraper
 
 # Configurazione logging
@@ -46,13 +61,23 @@ class OfficeOfCardsBot:
     def __init__(self, config: Config):
         self.config = config
         self.db = Database(config)
-        self.spotify = SpotifyService(config)
-        self.scraper = WebScraper()
+        self.http_cache = HttpCache(config)
+        # Un solo client HTTP (pool di connessioni, retry, metriche) per tutti i servizi
+        self.http_client = HttpClient(config)
+        self.scraper = WebScraper.from_config(config, self.http_cache, self.http_client)
+        self.spotify = SpotifyService(config, self.http_cache, self.scraper, self.http_client)
+        self.broadcast_queue = BroadcastQueue(config)
+        
+        # Un solo worker alla volta svuota la coda dei broadcast
+        self._broadcast_lock = asyncio.Lock()
         
         # Track dei job centralizzati
         self.episode_check_job = None
         self.pill_check_job = None
         
+        # Dispatcher notifiche (creato al primo invio, serve il bot)
+        self.dispatcher = None
+        
         # Costanti UI
         self.LAST_EPISODE = "Ultimo Episodio"
         self.RANDOM_EPISODE = "Pillola Casuale"
@@ -114,6 +139,130 @@ class OfficeOfCardsBot:
         
         return buttons
     
+    def get_dispatcher(self, bot) -> NotificationDispatcher:
+        """Restituisce il dispatcher notifiche condiviso"""
+        if self.dispatcher is None:
+            self.dispatcher = NotificationDispatcher(
+                bot,
+                rate_per_second=self.config.NOTIFY_RATE_PER_SECOND,
+                max_concurrency=self.config.NOTIFY_MAX_CONCURRENCY,
+                max_retries=self.config.NOTIFY_MAX_RETRIES
+            )
+        return self.dispatcher
+    
+    async def process_broadcast_job(self, job_id: int, bot) -> Optional[DeliveryReport]:
+        """
+        Invia un job della coda ai destinatari ancora in attesa
+        Gli esiti vengono salvati a blocchi di NOTIFY_RESULT_FLUSH_EVERY in un thread,
+        così l'event loop non aspetta SQLite e un riavvio riprende da dove si era fermato.
+        A fine invio chi ha bloccato il bot viene rimosso in un'unica operazione.
+        Restituisce None per un job già completato (il suo report resta invariato).
+        """
+        job = self.broadcast_queue.get_job(job_id)
+        if job['status'] == JOB_DONE:
+            logger.info(f"📤 Broadcast job #{job_id} already completed, skipping")
+            return None
+        
+        recipients = self.broadcast_queue.get_pending_recipients(job_id)
+        
+        logger.info(f"📤 Processing {job['kind']} job #{job_id}: {len(recipients)} pending recipients")
+        self.broadcast_queue.set_job_status(job_id, JOB_RUNNING)
+        
+        reply_markup = None
+        if job['reply_markup']:
+            reply_markup = InlineKeyboardMarkup.de_json(job['reply_markup'], bot)
+        
+        pending_results = []
+        flushes = []
+        
+        def flush_results():
+            if not pending_results:
+                return
+            batch = pending_results[:]
+            pending_results.clear()
+            flushes.append(asyncio.create_task(
+                asyncio.to_thread(self.broadcast_queue.record_results, job_id, batch)
+            ))
+        
+        def on_result(chat_id, outcome, error):
+            pending_results.append((chat_id, outcome, error))
+            if len(pending_results) >= self.config.NOTIFY_RESULT_FLUSH_EVERY:
+                flush_results()
+        
+        try:
+            report = await self.get_dispatcher(bot).send(
+                recipients,
+                job['text'],
+                parse_mode=job['parse_mode'],
+                reply_markup=reply_markup,
+                on_result=on_result
+            )
+        finally:
+            # Anche se l'invio si interrompe, gli esiti già noti vanno salvati
+            flush_results()
+            await asyncio.gather(*flushes)
+        
+        # Esiti definitivi applicati in blocco (anche quelli registrati prima di un riavvio)
+        unreachable = self.broadcast_queue.get_recipients_with_status(
+            job_id, (BLOCKED, NOT_FOUND, DEACTIVATED)
+        )
+        pruned = await asyncio.to_thread(self.db.remove_users_from_notifications, unreachable)
+        
+        self.broadcast_queue.save_report(job_id, {
+            'progress': self.broadcast_queue.get_progress(job_id),
+            'pruned': pruned,
+            'retries': report.retries,
+            'elapsed': round(report.elapsed, 1),
+            'throughput': round(report.throughput, 1)
+        })
+        self.broadcast_queue.set_job_status(job_id, JOB_DONE)
+        return report
+    
+    async def drain_broadcast_queue(self, context: ContextTypes.DEFAULT_TYPE):
+        """Completa tutti i job non terminati (anche quelli interrotti da un riavvio)"""
+        async with self._broadcast_lock:
+            for job_id in self.broadcast_queue.get_unfinished_job_ids():
+                try:
+                    report = await self.process_broadcast_job(job_id, context.bot)
+                    if report is None:
+                        continue
+                    
+                    progress = self.broadcast_queue.get_progress(job_id)
+                    total = sum(progress.values())
+                    
+                    await context.bot.send_message(
+                        chat_id=self.config.ADMIN_CHAT_ID,
+                        text=(
+                            f"📤 Job #{job_id} completato\n"
+                            f"✅ Inviati: {progress.get(SENT, 0)}/{total}\n"
+                            f"❌ Falliti: {total - progress.get(SENT, 0)}\n"
+                            f"⏱️ {report.elapsed:.0f}s ({report.throughput:.1f} msg/s)"
+                        )
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing broadcast job #{job_id}: {e}", exc_info=True)
+    
+    async def post_init(self, application: Application):
+        """Riprende i broadcast interrotti all'avvio e prepara il token Spotify"""
+        if self.broadcast_queue.get_unfinished_job_ids():
+            logger.info("📤 Resuming unfinished broadcast jobs...")
+            application.job_queue.run_once(self.drain_broadcast_queue, when=5, name='resume_broadcasts')
+        
+        # Il token viene rinnovato in anticipo: i check non attendono mai l'autenticazione
+        application.job_queue.run_repeating(
+            self.refresh_spotify_token,
+            interval=max(60, self.config.SPOTIFY_TOKEN_REFRESH_MARGIN // 2),
+            first=0,
+            name='spotify_token_refresh'
+        )
+    
+    async def refresh_spotify_token(self, context: ContextTypes.DEFAULT_TYPE):
+        """Rinnova il token Spotify se sta per scadere"""
+        try:
+            await asyncio.to_thread(self.spotify.refresh_token_if_needed)
+        except Exception as e:
+            logger.warning(f"Could not refresh Spotify token: {e}")
+    
     def _setup_centralized_jobs(self, context: ContextTypes.DEFAULT_TYPE):
         """
         Setup job centralizzati (eseguiti una volta sola)
@@ -187,6 +336,105 @@ class OfficeOfCardsBot:
                 "Si è verificato un errore. Riprova tra poco."
             )
     
+    async def log_stat(self, chat_id: str, query: str):
+        """Registra una statistica senza bloccare gli altri update"""
+        await asyncio.to_thread(self.db.log_stat, chat_id, query)
+    
+    def _resolve_subscription_target(self, text: str) -> Optional[tuple]:
+        """Interpreta il testo come categoria o ospite; restituisce (kind, nome)"""
+        text = text.strip().lower()
+        
+        for category in self.db.get_categories():
+            if category.lower() == text:
+                return 'category', category
+        
+        for guest in self.db.get_guests():
+            if guest.lower() == text:
+                return 'guest', guest
+        
+        return None
+    
+    async def follow_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Iscrive l'utente alle uscite di una categoria o di un ospite"""
+        try:
+            chat_id = update.effective_chat.id
+            target = self._resolve_subscription_target(' '.join(context.args))
+            
+            if target is None:
+                await update.message.reply_text(
+                    "Uso: /segui <categoria o ospite>\n"
+                    f"Categorie: {', '.join(self.db.get_categories())}"
+                )
+                return
+            
+            kind, name = target
+            self.db.add_user_to_notifications(chat_id)
+            self.db.add_subscription(chat_id, kind, name)
+            
+            await update.message.reply_text(
+                f"✅ Riceverai le notifiche per {name}.\n"
+                f"Usa /iscrizioni per vedere cosa segui, /tutti per tornare a ricevere tutto."
+            )
+            
+        except Exception as e:
+            logger.error(f"Error in follow_command: {e}", exc_info=True)
+            await update.message.reply_text("Si è verificato un errore. Riprova.")
+    
+    async def unfollow_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Rimuove l'iscrizione a una categoria o a un ospite"""
+        try:
+            chat_id = update.effective_chat.id
+            target = self._resolve_subscription_target(' '.join(context.args))
+            
+            if target is None or not self.db.remove_subscription(chat_id, *target):
+                await update.message.reply_text(
+                    "Non segui questa categoria/ospite. Usa /iscrizioni per la lista."
+                )
+                return
+            
+            text = f"❎ Non riceverai più notifiche per {target[1]}."
+            if not self.db.get_subscriptions(chat_id):
+                text += "\nNon segui più nulla in particolare: riceverai tutte le uscite."
+            await update.message.reply_text(text)
+            
+        except Exception as e:
+            logger.error(f"Error in unfollow_command: {e}", exc_info=True)
+            await update.message.reply_text("Si è verificato un errore. Riprova.")
+    
+    async def subscriptions_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mostra le iscrizioni dell'utente"""
+        try:
+            subscriptions = self.db.get_subscriptions(update.effective_chat.id)
+            
+            if not subscriptions:
+                await update.message.reply_text(
+                    "Ricevi le notifiche di tutte le uscite.\n"
+                    "Usa /segui <categoria o ospite> per ricevere solo quelle che ti interessano."
+                )
+                return
+            
+            labels = {'category': '📁', 'guest': '👤'}
+            text = "Ricevi notifiche solo per:\n"
+            text += "\n".join(f"{labels.get(kind, '•')} {value}" for kind, value in subscriptions)
+            text += "\n\n/nonseguire <nome> per rimuovere, /tutti per ricevere tutto."
+            await update.message.reply_text(text)
+            
+        except Exception as e:
+            logger.error(f"Error in subscriptions_command: {e}", exc_info=True)
+            await update.message.reply_text("Si è verificato un errore. Riprova.")
+    
+    async def all_notifications_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Rimuove le iscrizioni segmentate: l'utente riceve tutte le uscite"""
+        try:
+            chat_id = update.effective_chat.id
+            self.db.add_user_to_notifications(chat_id)
+            self.db.clear_subscriptions(chat_id)
+            await update.message.reply_text("✅ Riceverai le notifiche di tutte le uscite.")
+            
+        except Exception as e:
+            logger.error(f"Error in all_notifications_command: {e}", exc_info=True)
+            await update.message.reply_text("Si è verificato un errore. Riprova.")
+    
     async def send_episode(self, update: Update, episode: pd.Series, prefix: str = ""):
         """Invia un episodio formattato"""
         try:
@@ -278,7 +526,7 @@ class OfficeOfCardsBot:
         """Gestisce richiesta ultimo episodio"""
         episode = self.db.get_last_episode()
         if episode is not None:
-            self.db.log_stat(chat_id, 'Last')
+            await self.log_stat(chat_id, 'Last')
             await self.send_episode(update, episode)
         else:
             await update.message.reply_text("Nessun episodio trovato.")
@@ -287,7 +535,7 @@ class OfficeOfCardsBot:
         """Gestisce richiesta pillola casuale"""
         pill = self.db.get_random_pill()
         if pill is not None:
-            self.db.log_stat(chat_id, 'Random')
+            await self.log_stat(chat_id, 'Random')
             prefix = "Ciao! Se trovi utile questo bot, considera una donazione tramite i link in fondo."
             await self.send_episode(update, pill, prefix)
         else:
@@ -308,11 +556,11 @@ class OfficeOfCardsBot:
             await update.message.reply_text("Nessun episodio trovato per questa categoria.")
         
         elif len(episodes) == 1:
-            self.db.log_stat(chat_id, f'Category {category}')
+            await self.log_stat(chat_id, f'Category {category}')
             await self.send_episode(update, episodes.iloc[0])
         
         else:
-            self.db.log_stat(chat_id, f'Category {category}')
+            await self.log_stat(chat_id, f'Category {category}')
             buttons = [[title] for title in episodes['Titolo'].tolist()]
             buttons.append([self.BACK])
             
@@ -329,11 +577,11 @@ class OfficeOfCardsBot:
             await update.message.reply_text("Nessun episodio trovato per questo ospite.")
         
         elif len(episodes) == 1:
-            self.db.log_stat(chat_id, f'Guest {guest_name}')
+            await self.log_stat(chat_id, f'Guest {guest_name}')
             await self.send_episode(update, episodes.iloc[0])
         
         else:
-            self.db.log_stat(chat_id, f'Guest {guest_name}')
+            await self.log_stat(chat_id, f'Guest {guest_name}')
             buttons = [[title] for title in episodes['Titolo'].tolist()]
             buttons.append([self.BACK])
             
@@ -362,19 +610,19 @@ class OfficeOfCardsBot:
             )
         
         elif len(episodes) == 1:
-            self.db.log_stat(chat_id, 'Numero')
+            await self.log_stat(chat_id, 'Numero')
             await self.send_episode(update, episodes.iloc[0])
         
         else:
-            # Episodio multi-parte
-            self.db.log_stat(chat_id, 'Numero')
-            context.user_data['episode_id'] = episode_id
+            # Episodio multi-parte: lo stato viaggia nel callback_data
+            await self.log_stat(chat_id, 'Numero')
+            catalog_version = self.db.get_catalog_version()
             
             buttons = []
             for part in episodes['Part'].tolist():
                 buttons.append([InlineKeyboardButton(
                     f"Parte {part}",
-                    callback_data=f"part_{part}"
+                    callback_data=encode_part_selection(episode_id, part, catalog_version)
                 )])
             
             await update.message.reply_text(
@@ -388,18 +636,40 @@ class OfficeOfCardsBot:
             query = update.callback_query
             await query.answer()
             
-            if query.data.startswith("part_"):
-                part = int(query.data.split("_")[1])
-                episode_id = context.user_data.get('episode_id')
-                
-                if episode_id:
-                    episode = self.db.get_episode_by_id_and_part(episode_id, part)
-                    if episode is not None:
-                        await query.message.reply_text(
-                            f"<b>{episode['Titolo']}</b>\n\n{episode.get('Description', '')}",
-                            parse_mode='HTML',
-                            reply_markup=InlineKeyboardMarkup(self.create_episode_buttons(episode))
-                        )
+            # I bottoni legacy "part_<n>" dipendono ancora da user_data
+            selection = decode_part_selection(
+                query.data,
+                legacy_episode_id=context.user_data.get('episode_id')
+            )
+            
+            if selection is None:
+                await query.message.reply_text(
+                    "Questo bottone non è più valido. Ripeti la ricerca."
+                )
+                return
+            
+            # Bottone creato con un catalogo diverso: le parti potrebbero non corrispondere
+            # (i bottoni legacy non hanno versione)
+            if (selection.catalog_version is not None
+                    and selection.catalog_version != self.db.get_catalog_version()):
+                logger.info(f"Stale callback data: {query.data}")
+                await query.message.reply_text(
+                    "Questo bottone è scaduto: il catalogo è stato aggiornato. Ripeti la ricerca."
+                )
+                return
+            
+            episode = self.db.get_episode_by_id_and_part(selection.episode_id, selection.part)
+            
+            if episode is not None:
+                await query.message.reply_text(
+                    f"<b>{episode['Titolo']}</b>\n\n{episode.get('Description', '')}",
+                    parse_mode='HTML',
+                    reply_markup=InlineKeyboardMarkup(self.create_episode_buttons(episode))
+                )
+            else:
+                await query.message.reply_text(
+                    "Episodio non trovato. Ripeti la ricerca."
+                )
                     
         except Exception as e:
             logger.error(f"Error in callback_query_handler: {e}", exc_info=True)
@@ -412,83 +682,22 @@ class OfficeOfCardsBot:
         try:
             logger.info("🔍 Running centralized episode check...")
             
-            # 1. Prendi ultimo episodio da Spotify
-            latest_episode = self.spotify.get_latest_episode()
-            
-            if not latest_episode:
-                logger.warning("No episode found on Spotify")
-                return
-            
-            # 2. Controlla se è nuovo
-            if not self.db.is_new_episode(latest_episode):
-                logger.info("No new episode found")
-                return
-            
-            logger.info(f"🎉 New episode detected: {latest_episode.get('Titolo')}")
-            
-            # 3. Scraping delle shownotes (se disponibili)
-            latest_episode = self.scraper.update_episode_metadata(latest_episode)
-            
-            # 4. Aggiungi al database
-            self.db.add_episode(latest_episode)
-            self.db.reload()
-            
-            # 5. Recupera episodio completo
-            episode = self.db.get_last_episode()
-            if episode is None:
-                logger.error("Could not retrieve newly added episode")
-                return
-            
-            # 6. Prendi tutti gli utenti da notificare
-            users_to_notify = self.db.get_notification_users()
-            logger.info(f"📢 Notifying {len(users_to_notify)} users...")
-            
-            buttons = self.create_episode_buttons(episode)
-            message_text = (
-                f"<b>🎉 Nuovo episodio del tuo podcast preferito!</b>\n\n"
-                f"<b>{episode['Titolo']}</b>\n\n"
-                f"{episode.get('Description', '')}"
-            )
-            
-            # 7. Invia a tutti gli utenti
-            success_count = 0
-            fail_count = 0
-            
-            for chat_id in users_to_notify:
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(chat_id),
-                        text=message_text,
-                        parse_mode='HTML',
-                        reply_markup=InlineKeyboardMarkup(buttons)
-                    )
-                    success_count += 1
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to notify user {chat_id}: {e}")
-                    fail_count += 1
-                    
-                    # Se utente ha bloccato il bot, rimuovilo
-                    if "blocked by the user" in str(e).lower():
-                        self.db.remove_user_from_notifications(chat_id)
-            
-            logger.info(
-                f"✅ Episode notification complete: "
-                f"{success_count} sent, {fail_count} failed"
-            )
-            
-            # 8. Notifica admin
-            try:
-                await context.bot.send_message(
-                    chat_id=self.config.ADMIN_CHAT_ID,
-                    text=(
-                        f"✅ Nuovo episodio pubblicato e notificato\n"
-                        f"📊 {success_count} utenti notificati, {fail_count} falliti\n"
-                        f"🎧 {episode['Titolo']}"
-                    )
-                )
-            except Exception as e:
-                logger.warning(f"Could not notify admin: {e}")
+            # Arricchimento e metadati usano un solo download della pagina ospiti
+            with self.scraper.request_scope():
+                # 1. Episodi usciti dopo l'ultimo già in database (anche più di uno)
+                known_urls = self.db.get_known_spotify_urls('episodes')
+                new_episodes = await self.spotify.get_new_episodes_async(known_urls)
+                
+                if not new_episodes:
+                    logger.info("No new episode found")
+                    return
+                
+                logger.info(f"🎉 {len(new_episodes)} new episode(s) detected")
+                
+                # 2. Pubblica dal più vecchio: se uno fallisce, i successivi
+                # restano sconosciuti e verranno ripresi al prossimo check
+                for episode in new_episodes:
+                    await self._publish_new_episode(episode, context)
                 
         except Exception as e:
             logger.error(f"Error in centralized episode check: {e}", exc_info=True)
@@ -502,31 +711,98 @@ class OfficeOfCardsBot:
             except:
                 pass
     
+    async def _publish_new_episode(self, episode: dict, context: ContextTypes.DEFAULT_TYPE):
+        """Salva un nuovo episodio e lo notifica agli utenti"""
+        logger.info(f"🎉 New episode: {episode.get('Titolo')}")
+        
+        # 1. Scraping delle shownotes (se disponibili, senza perdere quelle dell'arricchimento)
+        episode = await asyncio.to_thread(self.scraper.update_episode_metadata, episode)
+        
+        # 2. Aggiungi al database
+        await asyncio.to_thread(self.db.add_episode, episode)
+        await asyncio.to_thread(self.db.reload)
+        
+        # 3. Prendi gli utenti da notificare (tutti o iscritti a categoria/ospite)
+        users_to_notify = self.db.get_notification_users_for_episode(episode)
+        logger.info(f"📢 Notifying {len(users_to_notify)} users...")
+        
+        buttons = self.create_episode_buttons(episode)
+        message_text = (
+            f"<b>🎉 Nuovo episodio del tuo podcast preferito!</b>\n\n"
+            f"<b>{episode['Titolo']}</b>\n\n"
+            f"{episode.get('Description', '')}"
+        )
+        
+        # 4. Accoda e invia a tutti gli utenti (in parallelo, con rate limiting)
+        # Job creato sotto lock: drain_broadcast_queue non può prenderlo in carico a metà
+        async with self._broadcast_lock:
+            job_id = self.broadcast_queue.create_job(
+                'episode',
+                message_text,
+                users_to_notify,
+                parse_mode='HTML',
+                reply_markup=InlineKeyboardMarkup(buttons).to_dict()
+            )
+            report = await self.process_broadcast_job(job_id, context.bot)
+        success_count = report.sent
+        fail_count = report.failed
+        
+        logger.info(
+            f"✅ Episode notification complete: "
+            f"{success_count} sent, {fail_count} failed "
+            f"({report.throughput:.1f} msg/s)"
+        )
+        
+        # 5. Notifica admin
+        try:
+            await context.bot.send_message(
+                chat_id=self.config.ADMIN_CHAT_ID,
+                text=(
+                    f"✅ Nuovo episodio pubblicato e notificato\n"
+                    f"📊 {success_count} utenti notificati, {fail_count} falliti\n"
+                    f"⏱️ {report.elapsed:.0f}s ({report.throughput:.1f} msg/s)\n"
+                    f"🎧 {episode['Titolo']}"
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Could not notify admin: {e}")
+    
     async def check_new_pill_centralized(self, context: ContextTypes.DEFAULT_TYPE):
         """Check centralizzato per nuove pillole"""
         try:
             logger.info("🔍 Running centralized pill check...")
             
-            latest_pill = self.spotify.get_latest_pill()
+            known_urls = self.db.get_known_spotify_urls('pills')
+            new_pills = await self.spotify.get_new_pills_async(known_urls)
             
-            if latest_pill and self.db.is_new_pill(latest_pill):
-                self.db.add_pill(latest_pill)
-                logger.info(f"💊 New pill added: {latest_pill.get('Titolo')}")
-                
-                # Notifica admin
-                try:
-                    await context.bot.send_message(
-                        chat_id=self.config.ADMIN_CHAT_ID,
-                        text=f"💊 Nuova pillola aggiunta: {latest_pill.get('Titolo')}"
-                    )
-                except Exception as e:
-                    logger.warning(f"Could not notify admin: {e}")
-            else:
+            if not new_pills:
                 logger.info("No new pill found")
+                return
+            
+            for pill in new_pills:
+                await asyncio.to_thread(self.db.add_pill, pill)
+                logger.info(f"💊 New pill added: {pill.get('Titolo')}")
+            
+            # Notifica admin
+            try:
+                titles = '\n'.join(f"• {pill.get('Titolo')}" for pill in new_pills)
+                await context.bot.send_message(
+                    chat_id=self.config.ADMIN_CHAT_ID,
+                    text=f"💊 Nuove pillole aggiunte ({len(new_pills)}):\n{titles}"
+                )
+            except Exception as e:
+                logger.warning(f"Could not notify admin: {e}")
                 
         except Exception as e:
             logger.error(f"Error in centralized pill check: {e}", exc_info=True)
     
+    async def check_all_centralized(self, context: ContextTypes.DEFAULT_TYPE):
+        """Check episodi e pillole in parallelo"""
+        await asyncio.gather(
+            self.check_new_episode_centralized(context),
+            self.check_new_pill_centralized(context)
+        )
+    
     async def broadcast_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Inizia processo broadcast (solo admin)"""
         if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
@@ -544,21 +820,16 @@ class OfficeOfCardsBot:
         message = update.message.text
         chat_ids = self.db.get_notification_users()
         
-        sent = 0
-        failed = 0
-        
-        for chat_id in chat_ids:
-            try:
-                await context.bot.send_message(chat_id=int(chat_id), text=message)
-                sent += 1
-            except Exception as e:
-                logger.warning(f"Failed to send to {chat_id}: {e}")
-                failed += 1
+        job_id = self.broadcast_queue.create_job('broadcast', message, chat_ids)
         
         await update.message.reply_text(
-            f"Messaggio inviato!\n✅ Inviati: {sent}\n❌ Falliti: {failed}"
+            f"📤 Broadcast #{job_id} in coda per {len(chat_ids)} utenti.\n"
+            f"Usa /queue per seguire l'avanzamento."
         )
         
+        # Invio in background: il job è persistito e riprende anche dopo un riavvio
+        context.job_queue.run_once(self.drain_broadcast_queue, when=0, name=f'broadcast_{job_id}')
+        
         return ConversationHandler.END
     
     async def broadcast_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -570,6 +841,127 @@ class OfficeOfCardsBot:
     # COMANDI ADMIN
     # ==========================================
     
+    async def queue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mostra avanzamento dei broadcast in coda (solo admin)"""
+        if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
+            await update.message.reply_text("❌ Non sei autorizzato.")
+            return
+        
+        try:
+            jobs = self.broadcast_queue.get_recent_jobs(5)
+            
+            if not jobs:
+                await update.message.reply_text("📤 Nessun broadcast in coda")
+                return
+            
+            text = "📤 <b>Ultimi broadcast</b>\n\n"
+            
+            for job in jobs:
+                progress = job['progress']
+                total = sum(progress.values())
+                done = total - progress.get(DELIVERY_PENDING, 0)
+                
+                text += f"<b>#{job['id']} {job['kind']}</b> ({job['status']})\n"
+                text += f"  📊 {done}/{total} processati\n"
+                text += f"  ✅ {progress.get(SENT, 0)} inviati, ❌ {done - progress.get(SENT, 0)} falliti\n"
+                text += f"  🕐 Creato: {job['created_at']}\n\n"
+            
+            await update.message.reply_text(text, parse_mode='HTML')
+            
+        except Exception as e:
+            logger.error(f"Error in queue_command: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Errore: {str(e)}")
+    
+    async def report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mostra il report di consegna di un broadcast (solo admin)"""
+        if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
+            await update.message.reply_text("❌ Non sei autorizzato.")
+            return
+        
+        try:
+            if context.args:
+                job_id = int(context.args[0])
+            else:
+                jobs = self.broadcast_queue.get_recent_jobs(1)
+                job_id = jobs[0]['id'] if jobs else None
+            
+            job = self.broadcast_queue.get_job(job_id) if job_id is not None else None
+            if job is None:
+                await update.message.reply_text("📤 Nessun broadcast trovato")
+                return
+            
+            report = job['report']
+            if report is None:
+                await update.message.reply_text(
+                    f"📤 Job #{job_id} non ancora completato ({job['status']}). Usa /queue."
+                )
+                return
+            
+            progress = report['progress']
+            labels = {
+                SENT: '✅ Inviati',
+                BLOCKED: '🚫 Bot bloccato',
+                NOT_FOUND: '❓ Chat non trovata',
+                DEACTIVATED: '👻 Account disattivato'
+            }
+            
+            text = f"📤 <b>Report job #{job_id} ({html.escape(job['kind'])})</b>\n\n"
+            for status, count in sorted(progress.items(), key=lambda item: -item[1]):
+                text += f"{labels.get(status, '❌ ' + html.escape(status))}: {count}\n"
+            text += f"\n🧹 Utenti rimossi: {report['pruned']}\n"
+            text += f"🔁 Retry: {report['retries']}\n"
+            text += f"⏱️ {report['elapsed']}s ({report['throughput']} msg/s)\n"
+            
+            errors = self.broadcast_queue.get_delivery_errors(job_id)
+            if errors:
+                text += "\n<b>Ultimi errori:</b>\n"
+                # Gli errori di Telegram possono contenere HTML: si tronca e poi si fa l'escape
+                for error in errors:
+                    text += (
+                        f"  • <code>{html.escape(str(error['chat_id']))}</code> "
+                        f"{html.escape(error['status'])}: {html.escape((error['error'] or '')[:80])}\n"
+                    )
+            
+            await update.message.reply_text(text, parse_mode='HTML')
+            
+        except ValueError:
+            await update.message.reply_text("Uso: /report [id job]")
+        except Exception as e:
+            logger.error(f"Error in report_command: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Errore: {str(e)}")
+    
+    async def http_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mostra richieste, errori e latenze per host del client HTTP (solo admin)"""
+        if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
+            await update.message.reply_text("❌ Non sei autorizzato.")
+            return
+        
+        try:
+            metrics = self.http_client.get_metrics()
+            
+            if not metrics:
+                await update.message.reply_text("🌐 Nessuna richiesta HTTP dall'avvio")
+                return
+            
+            text = "🌐 <b>Richieste HTTP dall'avvio</b>\n\n"
+            
+            for host, host_metrics in metrics.items():
+                statuses = ', '.join(
+                    f"{status}: {count}" for status, count in sorted(host_metrics['statuses'].items())
+                )
+                text += f"<b>{host}</b>\n"
+                text += f"  📊 {host_metrics['requests']} richieste, ❌ {host_metrics['errors']} errori\n"
+                text += f"  ⏱️ p50 {host_metrics['p50_ms']} ms, p95 {host_metrics['p95_ms']} ms\n"
+                if statuses:
+                    text += f"  📬 {statuses}\n"
+                text += "\n"
+            
+            await update.message.reply_text(text, parse_mode='HTML')
+            
+        except Exception as e:
+            logger.error(f"Error in http_command: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Errore: {str(e)}")
+    
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostra statistiche bot (solo admin)"""
         if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
@@ -691,6 +1083,21 @@ class OfficeOfCardsBot:
             logger.error(f"Error in testpill_command: {e}", exc_info=True)
             await update.message.reply_text(f"❌ Errore durante il check: {str(e)}")
     
+    async def testall_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Esegue check manuale di episodi e pillole in parallelo (solo admin)"""
+        if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
+            await update.message.reply_text("❌ Non sei autorizzato.")
+            return
+        
+        try:
+            await update.message.reply_text("🔍 Eseguo check manuale per episodi e pillole...")
+            await self.check_all_centralized(context)
+            await update.message.reply_text("✅ Check completato! Controlla i log.")
+            
+        except Exception as e:
+            logger.error(f"Error in testall_command: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Errore durante il check: {str(e)}")
+    
     async def users_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lista utenti registrati per notifiche (solo admin)"""
         if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
@@ -718,6 +1125,28 @@ class OfficeOfCardsBot:
             logger.error(f"Error in users_command: {e}", exc_info=True)
             await update.message.reply_text(f"❌ Errore: {str(e)}")
     
+    def _write_backup_zip(self, backup_path):
+        """Crea lo zip di backup con tutti i file dati"""
+        import zipfile
+        
+        with self.db.snapshot(), zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # Database episodi
+            if self.config.DB_PATH.exists():
+                zipf.write(self.config.DB_PATH, 'db.csv')
+            
+            # Statistiche
+            if self.config.STATS_PATH.exists():
+                zipf.write(self.config.STATS_PATH, 'stats.csv')
+            
+            # Pillole
+            if self.config.PILLS_PATH.exists():
+                zipf.write(self.config.PILLS_PATH, 'pills.csv')
+            
+            # Utenti notifiche
+            notification_file = self.config.DATA_DIR / 'notification_users.txt'
+            if notification_file.exists():
+                zipf.write(notification_file, 'notification_users.txt')
+    
     async def backup_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Crea e invia backup del database (solo admin)"""
         if update.effective_chat.id != self.config.ADMIN_CHAT_ID:
@@ -725,7 +1154,6 @@ class OfficeOfCardsBot:
             return
         
         try:
-            import zipfile
             from pathlib import Path
             
             # Nome backup con timestamp
@@ -735,24 +1163,8 @@ class OfficeOfCardsBot:
             
             await update.message.reply_text("📦 Creando backup...")
             
-            # Crea zip con tutti i file dati
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Database episodi
-                if self.config.DB_PATH.exists():
-                    zipf.write(self.config.DB_PATH, 'db.csv')
-                
-                # Statistiche
-                if self.config.STATS_PATH.exists():
-                    zipf.write(self.config.STATS_PATH, 'stats.csv')
-                
-                # Pillole
-                if self.config.PILLS_PATH.exists():
-                    zipf.write(self.config.PILLS_PATH, 'pills.csv')
-                
-                # Utenti notifiche
-                notification_file = self.config.DATA_DIR / 'notification_users.txt'
-                if notification_file.exists():
-                    zipf.write(notification_file, 'notification_users.txt')
+            # Crea zip con tutti i file dati (in un thread per non bloccare il bot)
+            await asyncio.to_thread(self._write_backup_zip, backup_path)
             
             # Invia file
             with open(backup_path, 'rb') as f:
@@ -835,10 +1247,14 @@ class OfficeOfCardsBot:
 /stats - Statistiche bot
 /jobs - Job schedulati attivi
 /users - Lista utenti registrati
+/queue - Avanzamento broadcast
+/report [id] - Report consegna broadcast
+/http - Richieste e latenze HTTP per host
 
 <b>Testing:</b>
 /testcheck - Check manuale episodi
 /testpill - Check manuale pillole
+/testall - Check episodi e pillole in parallelo
 /notify - Anteprima notifica
 
 <b>Gestione:</b>
@@ -850,48 +1266,92 @@ class OfficeOfCardsBot:
 <b>Broadcast:</b>
 1. /message
 2. Scrivi il messaggio
-3. Verrà inviato a tutti gli utenti
+3. Verrà accodato e inviato a tutti gli utenti
+   (riprende da dove si era fermato dopo un riavvio)
         """
         
         await update.message.reply_text(text, parse_mode='HTML')
     
+    def build_application(self) -> Application:
+        """Crea l'Application con tutti gli handler registrati"""
+        builder = Application.builder().token(self.config.BOT_TOKEN)
+        
+        if self.config.TELEGRAM_API_BASE_URL:
+            builder = builder.base_url(self.config.TELEGRAM_API_BASE_URL)
+        
+        # Update di chat diverse in parallelo, della stessa chat in ordine
+        if self.config.CONCURRENT_UPDATES > 1:
+            builder = builder.concurrent_updates(
+                PerChatUpdateProcessor(self.config.CONCURRENT_UPDATES)
+            )
+        
+        application = builder.post_init(self.post_init).build()
+        
+        # Handlers comandi base
+        application.add_handler(CommandHandler('start', self.start_command))
+        application.add_handler(CallbackQueryHandler(self.callback_query_handler))
+        
+        # Iscrizioni segmentate
+        application.add_handler(CommandHandler('segui', self.follow_command))
+        application.add_handler(CommandHandler('nonseguire', self.unfollow_command))
+        application.add_handler(CommandHandler('iscrizioni', self.subscriptions_command))
+        application.add_handler(CommandHandler('tutti', self.all_notifications_command))
+        
+        # Admin commands
+        application.add_handler(CommandHandler('stats', self.stats_command))
+        application.add_handler(CommandHandler('jobs', self.jobs_command))
+        application.add_handler(CommandHandler('testcheck', self.testcheck_command))
+        application.add_handler(CommandHandler('testpill', self.testpill_command))
+        application.add_handler(CommandHandler('testall', self.testall_command))
+        application.add_handler(CommandHandler('users', self.users_command))
+        application.add_handler(CommandHandler('queue', self.queue_command))
+        application.add_handler(CommandHandler('report', self.report_command))
+        application.add_handler(CommandHandler('http', self.http_command))
+        application.add_handler(CommandHandler('backup', self.backup_command))
+        application.add_handler(CommandHandler('reload', self.reload_command))
+        application.add_handler(CommandHandler('notify', self.notify_command))
+        application.add_handler(CommandHandler('admin', self.help_admin_command))
+        
+        # Conversation handler per broadcast
+        broadcast_handler = ConversationHandler(
+            entry_points=[CommandHandler("message", self.broadcast_start)],
+            states={
+                MESSAGGIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.broadcast_send)],
+            },
+            fallbacks=[CommandHandler("cancel", self.broadcast_cancel)],
+        )
+        application.add_handler(broadcast_handler)
+        
+        # Message handler (deve essere ultimo)
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.message_handler))
+        
+        return application
+    
     def run(self):
-        """Avvia il bot"""
+        """Avvia il bot in modalità polling o webhook"""
         try:
-            application = Application.builder().token(self.config.BOT_TOKEN).build()
-            
-            # Handlers comandi base
-            application.add_handler(CommandHandler('start', self.start_command))
-            application.add_handler(CallbackQueryHandler(self.callback_query_handler))
-            
-            # Admin commands
-            application.add_handler(CommandHandler('stats', self.stats_command))
-            application.add_handler(CommandHandler('jobs', self.jobs_command))
-            application.add_handler(CommandHandler('testcheck', self.testcheck_command))
-            application.add_handler(CommandHandler('testpill', self.testpill_command))
-            application.add_handler(CommandHandler('users', self.users_command))
-            application.add_handler(CommandHandler('backup', self.backup_command))
-            application.add_handler(CommandHandler('reload', self.reload_command))
-            application.add_handler(CommandHandler('notify', self.notify_command))
-            application.add_handler(CommandHandler('admin', self.help_admin_command))
-            
-            # Conversation handler per broadcast
-            broadcast_handler = ConversationHandler(
-                entry_points=[CommandHandler("message", self.broadcast_start)],
-                states={
-                    MESSAGGIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.broadcast_send)],
-                },
-                fallbacks=[CommandHandler("cancel", self.broadcast_cancel)],
-            )
-            application.add_handler(broadcast_handler)
-            
-            # Message handler (deve essere ultimo)
-            application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.message_handler))
+            application = self.build_application()
             
             logger.info("🤖 Bot started successfully")
             logger.info("📅 Episode check: Weekly (Monday 17:00)")
             logger.info("💊 Pill check: Daily (12:00)")
-            application.run_polling(allowed_updates=Update.ALL_TYPES)
+            
+            if self.config.BOT_MODE == 'webhook':
+                logger.info(
+                    f"🌐 Webhook mode on {self.config.WEBHOOK_LISTEN}:{self.config.WEBHOOK_PORT}"
+                    f"/{self.config.WEBHOOK_PATH}"
+                )
+                application.run_webhook(
+                    listen=self.config.WEBHOOK_LISTEN,
+                    port=self.config.WEBHOOK_PORT,
+                    url_path=self.config.WEBHOOK_PATH,
+                    webhook_url=self.config.WEBHOOK_URL,
+                    secret_token=self.config.WEBHOOK_SECRET_TOKEN,
+                    max_connections=self.config.WEBHOOK_MAX_CONNECTIONS,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            else:
+                application.run_polling(allowed_updates=Update.ALL_TYPES)
             
         except Exception as e:
             logger.error(f"Fatal error: {e}", exc_info=True)
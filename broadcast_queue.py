@@ -0,0 +1,307 @@
+"""
+Coda persistente per broadcast e notifiche di nuovi episodi
+
+Ogni invio massivo diventa un job salvato su SQLite con lo stato di consegna
+di ogni destinatario. Se il processo si riavvia a metà, il worker riprende
+dai destinatari ancora 'pending': chi ha già ricevuto il messaggio non lo
+riceve di nuovo (solo gli invii in volo al momento del crash possono essere
+ripetuti).
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Stati dei job
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+
+# Stato iniziale dei destinatari (gli altri sono gli esiti del dispatcher)
+DELIVERY_PENDING = 'pending'
+
+
+class BroadcastQueue:
+    """Gestisce job di broadcast e stato di consegna per destinatario"""
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = Lock()
+        self.db_path = self.config.QUEUE_DB_PATH
+        self._init_database()
+
+    def _init_database(self):
+        """Crea tabelle se non esistono"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                cursor = conn.cursor()
+
+                cursor.execute('PRAGMA journal_mode=WAL')
+
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        parse_mode TEXT,
+                        reply_markup TEXT,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        started_at TIMESTAMP,
+                        finished_at TIMESTAMP
+                    )
+                ''')
+
+                # Report di consegna salvato a fine job (JSON)
+                columns = [row[1] for row in cursor.execute('PRAGMA table_info(broadcast_jobs)')]
+                if 'report' not in columns:
+                    cursor.execute('ALTER TABLE broadcast_jobs ADD COLUMN report TEXT')
+
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+                        job_id INTEGER NOT NULL,
+                        chat_id TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        error TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (job_id, chat_id)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_deliveries_status
+                    ON broadcast_deliveries(job_id, status)
+                ''')
+
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error initializing broadcast queue: {e}", exc_info=True)
+                raise
+
+    def _get_connection(self):
+        """Crea connessione al database della coda"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def create_job(self, kind: str, text: str, chat_ids: Iterable,
+                   parse_mode: Optional[str] = None, reply_markup: Optional[dict] = None) -> int:
+        """
+        Crea un job con tutti i destinatari in stato 'pending'
+
+        Args:
+            kind: Tipo di job ('broadcast', 'episode', ...)
+            reply_markup: Markup serializzato (es. InlineKeyboardMarkup.to_dict())
+
+        Returns:
+            ID del job
+        """
+        with self._lock:
+            conn = self._get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO broadcast_jobs (kind, text, parse_mode, reply_markup)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    kind,
+                    text,
+                    parse_mode,
+                    json.dumps(reply_markup) if reply_markup else None
+                ))
+                job_id = cursor.lastrowid
+
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO broadcast_deliveries (job_id, chat_id)
+                    VALUES (?, ?)
+                ''', [(job_id, str(chat_id)) for chat_id in chat_ids])
+
+                conn.commit()
+                logger.info(f"Queued {kind} job #{job_id} for {cursor.rowcount} recipients")
+                return job_id
+
+            finally:
+                conn.close()
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Restituisce un job (con reply_markup deserializzato)"""
+        try:
+            conn = self._get_connection()
+            row = conn.execute('SELECT * FROM broadcast_jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.close()
+
+            if row is None:
+                return None
+
+            job = dict(row)
+            job['reply_markup'] = json.loads(job['reply_markup']) if job['reply_markup'] else None
+            job['report'] = json.loads(job['report']) if job['report'] else None
+            return job
+
+        except Exception as e:
+            logger.error(f"Error getting broadcast job {job_id}: {e}", exc_info=True)
+            return None
+
+    def get_unfinished_job_ids(self) -> List[int]:
+        """ID dei job non ancora completati, in ordine di creazione"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(
+                'SELECT id FROM broadcast_jobs WHERE status != ? ORDER BY id',
+                (JOB_DONE,)
+            ).fetchall()
+            conn.close()
+            return [row[0] for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting unfinished broadcast jobs: {e}", exc_info=True)
+            return []
+
+    def get_pending_recipients(self, job_id: int) -> List[str]:
+        """Destinatari del job che non hanno ancora un esito"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(
+                'SELECT chat_id FROM broadcast_deliveries WHERE job_id = ? AND status = ?',
+                (job_id, DELIVERY_PENDING)
+            ).fetchall()
+            conn.close()
+            return [row[0] for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting pending recipients for job {job_id}: {e}", exc_info=True)
+            return []
+
+    def record_results(self, job_id: int, results: List[Tuple[str, str, Optional[str]]]):
+        """Salva in un'unica transazione gli esiti (chat_id, esito, errore) di più destinatari"""
+        if not results:
+            return
+        
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                conn.executemany('''
+                    UPDATE broadcast_deliveries
+                    SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ? AND chat_id = ?
+                ''', [(status, error, job_id, str(chat_id)) for chat_id, status, error in results])
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error recording {len(results)} deliveries for job #{job_id}: {e}", exc_info=True)
+
+    def get_recipients_with_status(self, job_id: int, statuses: Iterable[str]) -> List[str]:
+        """Destinatari del job con uno degli esiti indicati"""
+        statuses = list(statuses)
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(
+                f'SELECT chat_id FROM broadcast_deliveries WHERE job_id = ? '
+                f'AND status IN ({", ".join("?" for _ in statuses)})',
+                (job_id, *statuses)
+            ).fetchall()
+            conn.close()
+            return [row[0] for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting recipients for job {job_id}: {e}", exc_info=True)
+            return []
+
+    def get_delivery_errors(self, job_id: int, limit: int = 5) -> List[Dict]:
+        """Esempi di errori di consegna per il report admin"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute('''
+                SELECT chat_id, status, error FROM broadcast_deliveries
+                WHERE job_id = ? AND error IS NOT NULL
+                ORDER BY updated_at DESC
+                LIMIT ?
+            ''', (job_id, limit)).fetchall()
+            conn.close()
+            return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting delivery errors for job {job_id}: {e}", exc_info=True)
+            return []
+
+    def save_report(self, job_id: int, report: Dict):
+        """Salva il report di consegna di un job"""
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                conn.execute(
+                    'UPDATE broadcast_jobs SET report = ? WHERE id = ?',
+                    (json.dumps(report), job_id)
+                )
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error saving report for job {job_id}: {e}", exc_info=True)
+
+    def set_job_status(self, job_id: int, status: str):
+        """Aggiorna lo stato di un job"""
+        column = {JOB_RUNNING: 'started_at', JOB_DONE: 'finished_at'}.get(status)
+
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                if column:
+                    conn.execute(
+                        f'UPDATE broadcast_jobs SET status = ?, {column} = COALESCE({column}, CURRENT_TIMESTAMP) '
+                        f'WHERE id = ?',
+                        (status, job_id)
+                    )
+                else:
+                    conn.execute('UPDATE broadcast_jobs SET status = ? WHERE id = ?', (status, job_id))
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error updating broadcast job {job_id}: {e}", exc_info=True)
+
+    def get_progress(self, job_id: int) -> Dict[str, int]:
+        """Conteggio destinatari per stato di consegna"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute('''
+                SELECT status, COUNT(*) FROM broadcast_deliveries
+                WHERE job_id = ?
+                GROUP BY status
+            ''', (job_id,)).fetchall()
+            conn.close()
+            return {row[0]: row[1] for row in rows}
+
+        except Exception as e:
+            logger.error(f"Error getting progress for job {job_id}: {e}", exc_info=True)
+            return {}
+
+    def get_recent_jobs(self, limit: int = 5) -> List[Dict]:
+        """Ultimi job con il relativo avanzamento"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(
+                'SELECT id, kind, status, created_at, started_at, finished_at '
+                'FROM broadcast_jobs ORDER BY id DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+            conn.close()
+
+            jobs = []
+            for row in rows:
+                job = dict(row)
+                job['progress'] = self.get_progress(job['id'])
+                jobs.append(job)
+            return jobs
+
+        except Exception as e:
+            logger.error(f"Error getting recent broadcast jobs: {e}", exc_info=True)
+            return []
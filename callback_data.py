@@ -0,0 +1,76 @@
+"""
+Codifica e decodifica dei callback_data dei bottoni inline
+
+I bottoni contengono tutto lo stato necessario per servire il callback
+(episodio, parte, versione del catalogo), quindi qualsiasi processo può
+rispondere senza dipendere da context.user_data.
+"""
+
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prefisso + versione del formato: "p1:<episode_id>:<part>:<catalog_version>"
+PART_SELECTION_PREFIX = 'p1'
+SEPARATOR = ':'
+
+# Formato legacy emesso dalle versioni precedenti: "part_<part>"
+LEGACY_PART_PREFIX = 'part_'
+
+# Limite imposto da Telegram sulla lunghezza di callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+
+
+class PartSelection(NamedTuple):
+    """Selezione di una parte di un episodio multi-parte"""
+    episode_id: int
+    part: int
+    catalog_version: Optional[int]
+
+
+def encode_part_selection(episode_id: int, part: int, catalog_version: int) -> str:
+    """Codifica la selezione di una parte in un callback_data compatto"""
+    data = SEPARATOR.join([
+        PART_SELECTION_PREFIX,
+        str(int(episode_id)),
+        str(int(part)),
+        str(int(catalog_version))
+    ])
+
+    if len(data.encode('utf-8')) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data troppo lungo: {data}")
+
+    return data
+
+
+def decode_part_selection(data: str, legacy_episode_id: Optional[int] = None) -> Optional[PartSelection]:
+    """
+    Decodifica un callback_data di selezione parte
+
+    Args:
+        data: callback_data ricevuto da Telegram
+        legacy_episode_id: ID episodio da usare per i bottoni legacy "part_<n>",
+            che non contengono l'episodio (es. da context.user_data)
+
+    Returns:
+        PartSelection oppure None se il formato non è riconosciuto
+    """
+    if not data:
+        return None
+
+    try:
+        if data.startswith(PART_SELECTION_PREFIX + SEPARATOR):
+            _, episode_id, part, catalog_version = data.split(SEPARATOR)
+            return PartSelection(int(episode_id), int(part), int(catalog_version))
+
+        if data.startswith(LEGACY_PART_PREFIX):
+            if legacy_episode_id is None:
+                return None
+            part = int(data[len(LEGACY_PART_PREFIX):])
+            return PartSelection(int(legacy_episode_id), part, None)
+
+    except ValueError as e:
+        logger.warning(f"Malformed callback data '{data}': {e}")
+
+    return None
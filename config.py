@@ -23,26 +23,121 @@ class Config:
         self.ZAI_MODEL=os.getenv("ZAI_MODEL")
         self.ZAI_BASE=os.getenv("ZAI_BASE")
 
+        # Modalità di ricezione update: 'polling' oppure 'webhook'
+        self.BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+        
+        # Webhook (usato solo con BOT_MODE=webhook)
+        self.WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+        self.WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+        self.WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+        self.WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL pubblico (es. dietro reverse proxy)
+        self.WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+        self.WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+        
+        # Numero massimo di update elaborati in parallelo (1 = sequenziale)
+        # Gli update della stessa chat restano comunque in ordine
+        self.CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+        
+        # Invio notifiche: limiti Telegram ~30 msg/s globali e ~1 msg/s per chat
+        self.NOTIFY_RATE_PER_SECOND = float(os.getenv("NOTIFY_RATE_PER_SECOND", "25"))
+        self.NOTIFY_MAX_CONCURRENCY = int(os.getenv("NOTIFY_MAX_CONCURRENCY", "20"))
+        self.NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+        
+        # Esiti di consegna salvati a blocchi: dopo un riavvio al massimo
+        # un blocco di destinatari riceve di nuovo il messaggio
+        self.NOTIFY_RESULT_FLUSH_EVERY = int(os.getenv("NOTIFY_RESULT_FLUSH_EVERY", "50"))
+        
+        # Chiamate Spotify: timeout per richiesta (s) e retry per errori temporanei
+        self.SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "10"))
+        self.SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+        
+        # Token Spotify rinnovato quando mancano meno di N secondi alla scadenza
+        self.SPOTIFY_TOKEN_REFRESH_MARGIN = int(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", "600"))
+        
+        # Cache HTTP: secondi in cui una risposta è servita senza contattare il server
+        # (dopo il TTL viene rivalidata con ETag / Last-Modified)
+        self.SPOTIFY_CACHE_TTL = float(os.getenv("SPOTIFY_CACHE_TTL", "60"))
+        self.WEBSITE_CACHE_TTL = float(os.getenv("WEBSITE_CACHE_TTL", "3600"))
+        
+        # Crawl dell'archivio ospiti: pagine in parallelo, richieste/s verso il sito
+        # e limite di pagine
+        self.WEBSITE_CRAWL_CONCURRENCY = int(os.getenv("WEBSITE_CRAWL_CONCURRENCY", "4"))
+        self.WEBSITE_RATE_PER_SECOND = float(os.getenv("WEBSITE_RATE_PER_SECOND", "2"))
+        self.WEBSITE_MAX_PAGES = int(os.getenv("WEBSITE_MAX_PAGES", "50"))
+        
+        # Client HTTP condiviso: timeout di default (s), connessioni per host,
+        # richieste contemporanee per host e retry con backoff per errori temporanei
+        self.HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+        self.HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+        self.HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "6"))
+        self.HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+        self.HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+        
+        # Confidenza minima (0-1) per accettare un campo estratto dalle regole
+        # senza chiedere all'LLM
+        self.ENRICHMENT_MIN_CONFIDENCE = float(os.getenv("ENRICHMENT_MIN_CONFIDENCE", "0.75"))
+        
+        # Scadenza (s) di una richiesta di arricchimento LLM, singola e a blocchi
+        self.ENRICHMENT_TIMEOUT = float(os.getenv("ENRICHMENT_TIMEOUT", "30"))
+        self.ENRICHMENT_BATCH_TIMEOUT = float(os.getenv("ENRICHMENT_BATCH_TIMEOUT", "90"))
+        
+        # Arricchimento LLM a blocchi (rescrape): episodi per richiesta e richieste in parallelo
+        self.ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", "10"))
+        self.ENRICHMENT_BATCH_CONCURRENCY = int(os.getenv("ENRICHMENT_BATCH_CONCURRENCY", "4"))
+        
+        # Rescrape: pagine Spotify in parallelo e richieste/s verso Spotify e LLM
+        self.RESCRAPE_SPOTIFY_CONCURRENCY = int(os.getenv("RESCRAPE_SPOTIFY_CONCURRENCY", "4"))
+        self.RESCRAPE_SPOTIFY_RATE_PER_SECOND = float(os.getenv("RESCRAPE_SPOTIFY_RATE_PER_SECOND", "5"))
+        self.RESCRAPE_LLM_RATE_PER_SECOND = float(os.getenv("RESCRAPE_LLM_RATE_PER_SECOND", "2"))
+        
+        # Massimo di item nuovi importati in un check (protegge da un database vuoto)
+        self.SPOTIFY_SYNC_MAX_ITEMS = int(os.getenv("SPOTIFY_SYNC_MAX_ITEMS", "20"))
+        
+        # Base URL alternativo per la Bot API (es. server Telegram finto per test locali)
+        self.TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+
         # Validazione
+        if self.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"BOT_MODE non valido: {self.BOT_MODE} (usa 'polling' o 'webhook')")
+        if self.BOT_MODE == "webhook" and not self.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL obbligatorio con BOT_MODE=webhook (URL pubblico raggiungibile da Telegram)")
+        if self.CONCURRENT_UPDATES < 1:
+            raise ValueError("CONCURRENT_UPDATES deve essere almeno 1")
+        if self.NOTIFY_RESULT_FLUSH_EVERY < 1:
+            raise ValueError("NOTIFY_RESULT_FLUSH_EVERY deve essere almeno 1")
+        if self.SPOTIFY_TOKEN_REFRESH_MARGIN < 60:
+            raise ValueError("SPOTIFY_TOKEN_REFRESH_MARGIN deve essere almeno 60 secondi")
         if not self.BOT_TOKEN:
             raise ValueError("BOT_TOKEN non trovato nel file .env")
         if not self.SPOTIFY_CLIENT_ID or not self.SPOTIFY_CLIENT_SECRET:
             raise ValueError("Credenziali Spotify non trovate nel file .env")
         
-        # URL Spotify
-        self.SPOTIFY_SHOW_URL = 'https://api.spotify.com/v1/shows/2cqzDBQRxqgba39VPp3FDs/episodes'
-        self.SPOTIFY_PILLS_URL = 'https://api.spotify.com/v1/shows/5ILsIKO18lp9aemJqcAWdb/episodes'
+        # URL Spotify (sovrascrivibili per puntare a un server finto, vedi fake_services.py)
+        self.SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1").rstrip('/')
+        self.SPOTIFY_AUTH_URL = os.getenv("SPOTIFY_AUTH_URL", "https://accounts.spotify.com/api/token")
+        self.SPOTIFY_SHOW_URL = f'{self.SPOTIFY_API_BASE}/shows/2cqzDBQRxqgba39VPp3FDs/episodes'
+        self.SPOTIFY_PILLS_URL = f'{self.SPOTIFY_API_BASE}/shows/5ILsIKO18lp9aemJqcAWdb/episodes'
         
         # URL Web Scraping
-        self.SHOWNOTES_URL = 'https://officeofcards.com/ospite/'
+        self.SHOWNOTES_URL = os.getenv("SHOWNOTES_URL", "https://officeofcards.com/ospite/")
         
         # Percorsi file
-        self.DATA_DIR = Path('./data')
+        self.DATA_DIR = Path(os.getenv("DATA_DIR", "./data"))
         self.DATA_DIR.mkdir(exist_ok=True)
         
         self.DB_PATH = self.DATA_DIR / 'db.csv'
         self.STATS_PATH = self.DATA_DIR / 'stats.csv'
         self.PILLS_PATH = self.DATA_DIR / 'pills.csv'
+        self.SUBSCRIPTIONS_PATH = self.DATA_DIR / 'subscriptions.csv'
+        
+        # Coda persistente dei broadcast (SQLite)
+        self.QUEUE_DB_PATH = self.DATA_DIR / 'queue.db'
+        
+        # Cache HTTP (Spotify e sito) e token Spotify
+        self.CACHE_DB_PATH = self.DATA_DIR / 'cache.db'
+        
+        # Checkpoint del rescrape (ripresa dopo un'interruzione)
+        self.RESCRAPE_STATE_PATH = self.DATA_DIR / 'rescrape_state.db'
         
         # Inizializza file se non esistono
         self._init_files()
@@ -68,4 +163,10 @@ class Config:
         if not self.PILLS_PATH.exists():
             pd.DataFrame(columns=[
                 'Id', 'Titolo', 'Description', 'Spotify_URL'
-            ]).to_csv(self.PILLS_PATH, index=False)
\ No newline at end of file
+            ]).to_csv(self.PILLS_PATH, index=False)
+        
+        # Iscrizioni segmentate (categoria / ospite)
+        if not self.SUBSCRIPTIONS_PATH.exists():
+            pd.DataFrame(columns=[
+                'Chat ID', 'Kind', 'Value'
+            ]).to_csv(self.SUBSCRIPTIONS_PATH, index=False)
\ No newline at end of file
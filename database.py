@@ -4,9 +4,10 @@ Drop-in replacement per database.py
 """
 
 import logging
+from contextlib import contextmanager
 import sqlite3
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Set, Tuple
 from pathlib import Path
 from threading import Lock
 import pandas as pd
@@ -38,6 +39,9 @@ class Database:
                 conn = sqlite3.connect(self.db_path)
                 cursor = conn.cursor()
                 
+                # WAL: le letture non si bloccano durante le scritture concorrenti
+                cursor.execute('PRAGMA journal_mode=WAL')
+                
                 # Tabella episodi
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS episodes (
@@ -71,6 +75,27 @@ class Database:
                     ON episodes(guest)
                 ''')
                 
+                # Versione del catalogo episodi: incrementata dai trigger a ogni
+                # scrittura, anche da altri processi (es. rescrape_all_episodes.py)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS catalog_meta (
+                        key TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute(
+                    "INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('episodes_version', 0)"
+                )
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    cursor.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS episodes_version_{event.lower()}
+                        AFTER {event} ON episodes
+                        BEGIN
+                            UPDATE catalog_meta SET value = value + 1
+                            WHERE key = 'episodes_version';
+                        END
+                    ''')
+                
                 # Tabella pillole
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS pills (
@@ -107,6 +132,22 @@ class Database:
                     )
                 ''')
                 
+                # Iscrizioni segmentate: un utente senza righe riceve tutto,
+                # altrimenti solo le uscite della categoria/ospite seguiti
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS subscriptions (
+                        chat_id TEXT NOT NULL,
+                        kind TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (chat_id, kind, value)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_subscriptions_target 
+                    ON subscriptions(kind, value)
+                ''')
+                
                 conn.commit()
                 conn.close()
                 
@@ -130,6 +171,15 @@ class Database:
             self._cache_guests = None
             logger.info("Database cache cleared")
     
+    @contextmanager
+    def snapshot(self):
+        """
+        Blocca le scritture di questo processo finché il blocco with è attivo
+        (es. durante la copia dei file dati per un backup)
+        """
+        with self._lock:
+            yield
+    
     def get_max_episode_id(self) -> int:
         """Restituisce l'ID massimo degli episodi"""
         try:
@@ -469,6 +519,28 @@ class Database:
             logger.error(f"Error checking if pill is new: {e}", exc_info=True)
             return False
     
+    def get_known_spotify_urls(self, table: str = 'episodes') -> Set[str]:
+        """
+        URL Spotify già presenti nel database
+        
+        Args:
+            table: 'episodes' oppure 'pills'
+        """
+        if table not in ('episodes', 'pills'):
+            raise ValueError(f"Tabella non valida: {table}")
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT DISTINCT spotify_url FROM {table} WHERE spotify_url IS NOT NULL AND spotify_url != '*'")
+            urls = {row[0] for row in cursor.fetchall()}
+            conn.close()
+            return urls
+            
+        except Exception as e:
+            logger.error(f"Error getting known Spotify URLs: {e}", exc_info=True)
+            return set()
+    
     def add_episode(self, episode_data: dict):
         """Aggiunge un nuovo episodio al database"""
         with self._lock:
@@ -613,6 +685,148 @@ class Database:
             except Exception as e:
                 logger.error(f"Error removing user from notifications: {e}", exc_info=True)
     
+    def remove_users_from_notifications(self, chat_ids) -> int:
+        """
+        Segna come inattivi più utenti in una sola transazione
+        
+        Returns:
+            Numero di utenti disattivati
+        """
+        params = [(str(chat_id),) for chat_id in chat_ids]
+        if not params:
+            return 0
+        
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
+                
+                cursor.executemany('''
+                    UPDATE notification_users 
+                    SET active = 0 
+                    WHERE chat_id = ? AND active = 1
+                ''', params)
+                removed = cursor.rowcount
+                
+                conn.commit()
+                conn.close()
+                
+                logger.info(f"Removed {removed} users from notifications")
+                return removed
+                
+            except Exception as e:
+                logger.error(f"Error removing users from notifications: {e}", exc_info=True)
+                return 0
+    
+    def add_subscription(self, chat_id: int, kind: str, value: str):
+        """Iscrive un utente a una categoria o a un ospite ('category' / 'guest')"""
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT OR IGNORE INTO subscriptions (chat_id, kind, value)
+                    VALUES (?, ?, ?)
+                ''', (str(chat_id), kind, value.strip().lower()))
+                
+                conn.commit()
+                conn.close()
+                
+                logger.info(f"User {chat_id} subscribed to {kind} '{value}'")
+                
+            except Exception as e:
+                logger.error(f"Error adding subscription: {e}", exc_info=True)
+    
+    def remove_subscription(self, chat_id: int, kind: str, value: str) -> bool:
+        """Rimuove un'iscrizione; restituisce True se esisteva"""
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    DELETE FROM subscriptions 
+                    WHERE chat_id = ? AND kind = ? AND value = ?
+                ''', (str(chat_id), kind, value.strip().lower()))
+                removed = cursor.rowcount > 0
+                
+                conn.commit()
+                conn.close()
+                return removed
+                
+            except Exception as e:
+                logger.error(f"Error removing subscription: {e}", exc_info=True)
+                return False
+    
+    def clear_subscriptions(self, chat_id: int):
+        """Rimuove tutte le iscrizioni: l'utente torna a ricevere tutto"""
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                conn.execute('DELETE FROM subscriptions WHERE chat_id = ?', (str(chat_id),))
+                conn.commit()
+                conn.close()
+                
+            except Exception as e:
+                logger.error(f"Error clearing subscriptions: {e}", exc_info=True)
+    
+    def get_subscriptions(self, chat_id: int) -> List[Tuple[str, str]]:
+        """Restituisce le iscrizioni (kind, value) di un utente"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT kind, value FROM subscriptions 
+                WHERE chat_id = ?
+                ORDER BY kind, value
+            ''', (str(chat_id),))
+            
+            subscriptions = [(row[0], row[1]) for row in cursor.fetchall()]
+            conn.close()
+            return subscriptions
+            
+        except Exception as e:
+            logger.error(f"Error getting subscriptions: {e}", exc_info=True)
+            return []
+    
+    def get_notification_users_for_episode(self, episode) -> List[str]:
+        """
+        Utenti da notificare per un episodio: chi non ha iscrizioni segmentate
+        più chi segue la sua categoria o il suo ospite (una sola query indicizzata)
+        """
+        category = episode.get('Category')
+        guest = episode.get('Guest')
+        category = category.strip().lower() if isinstance(category, str) else ''
+        guest = guest.strip().lower() if isinstance(guest, str) else ''
+        
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT n.chat_id FROM notification_users n
+                WHERE n.active = 1
+                  AND (
+                    NOT EXISTS (SELECT 1 FROM subscriptions s WHERE s.chat_id = n.chat_id)
+                    OR n.chat_id IN (
+                        SELECT chat_id FROM subscriptions WHERE kind = 'category' AND value = ?
+                        UNION
+                        SELECT chat_id FROM subscriptions WHERE kind = 'guest' AND value = ?
+                    )
+                  )
+                ORDER BY n.added_at
+            ''', (category, guest))
+            
+            users = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            return users
+            
+        except Exception as e:
+            logger.error(f"Error getting notification users for episode: {e}", exc_info=True)
+            return []
+    
     def get_all_chat_ids(self) -> List[str]:
         """Restituisce tutti i chat ID dalle statistiche (per broadcast)"""
         try:
@@ -646,6 +860,23 @@ class Database:
             logger.error(f"Error getting total episodes: {e}", exc_info=True)
             return 0
     
+    def get_catalog_version(self) -> int:
+        """
+        Restituisce la versione del catalogo episodi
+        Contatore incrementato dai trigger a ogni inserimento, modifica o
+        rimozione di un episodio, da qualsiasi processo
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM catalog_meta WHERE key = 'episodes_version'")
+            row = cursor.fetchone()
+            conn.close()
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"Error getting catalog version: {e}", exc_info=True)
+            return 0
+    
     def get_total_pills(self) -> int:
         """Restituisce numero totale pillole"""
         try:
@@ -2,12 +2,14 @@
 Modulo per la gestione del database (CSV)
 """
 
+import hashlib
 import logging
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict, Set
 import pandas as pd
 import numpy as np
-from threading import Lock
+from threading import RLock
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +19,17 @@ class Database:
     
     def __init__(self, config):
         self.config = config
-        self._lock = Lock()  # Per thread safety
+        # Rientrante: add_episode/add_pill chiamano save_* tenendo già il lock
+        self._lock = RLock()  # Per thread safety
         self.episodes_df = None
+        self._catalog_version = 0
         self.pills_df = None
         self.stats_df = None
+        self.subscriptions_df = None
+        
+        # Indice iscrizioni: (kind, value) -> chat_id, più l'insieme delle chat con iscrizioni
+        self._subscribers_by_target: Dict[Tuple[str, str], Set[str]] = {}
+        self._subscribed_chats: Set[str] = set()
         self.reload()
     
     def reload(self):
@@ -40,6 +49,7 @@ class Database:
                         .fillna('')
                         .str.lower()
                     )
+                self._update_catalog_version()
                 
                 # Carica pillole
                 self.pills_df = pd.read_csv(
@@ -53,12 +63,29 @@ class Database:
                     encoding='utf-8'
                 )
                 
+                # Carica iscrizioni
+                self.subscriptions_df = pd.read_csv(
+                    self.config.SUBSCRIPTIONS_PATH,
+                    encoding='utf-8',
+                    dtype=str
+                )
+                self._build_subscription_index()
+                
                 logger.info("Database reloaded successfully")
                 
             except Exception as e:
                 logger.error(f"Error reloading database: {e}", exc_info=True)
                 raise
     
+    @contextmanager
+    def snapshot(self):
+        """
+        Blocca le scritture finché il blocco with è attivo: i file CSV letti
+        al suo interno (es. per un backup) sono coerenti tra loro
+        """
+        with self._lock:
+            yield
+    
     def save_episodes(self):
         """Salva il dataframe episodi"""
         with self._lock:
@@ -77,6 +104,24 @@ class Database:
             except Exception as e:
                 logger.error(f"Error saving pills: {e}", exc_info=True)
     
+    def save_subscriptions(self):
+        """Salva il dataframe iscrizioni e aggiorna l'indice"""
+        with self._lock:
+            try:
+                self.subscriptions_df.to_csv(self.config.SUBSCRIPTIONS_PATH, index=False, encoding='utf-8')
+                self._build_subscription_index()
+            except Exception as e:
+                logger.error(f"Error saving subscriptions: {e}", exc_info=True)
+    
+    def _build_subscription_index(self):
+        """Ricostruisce l'indice in memoria delle iscrizioni"""
+        index: Dict[Tuple[str, str], Set[str]] = {}
+        for chat_id, kind, value in self.subscriptions_df[['Chat ID', 'Kind', 'Value']].itertuples(index=False):
+            index.setdefault((kind, value), set()).add(chat_id)
+        
+        self._subscribers_by_target = index
+        self._subscribed_chats = set(self.subscriptions_df['Chat ID'])
+    
     def log_stat(self, chat_id: str, query: str):
         """Registra una statistica"""
         with self._lock:
@@ -239,6 +284,23 @@ class Database:
             logger.error(f"Error checking if pill is new: {e}", exc_info=True)
             return False
     
+    def get_known_spotify_urls(self, table: str = 'episodes') -> Set[str]:
+        """
+        URL Spotify già presenti nel database
+        
+        Args:
+            table: 'episodes' oppure 'pills'
+        """
+        if table not in ('episodes', 'pills'):
+            raise ValueError(f"Tabella non valida: {table}")
+        
+        df = self.episodes_df if table == 'episodes' else self.pills_df
+        if df is None or df.empty or 'Spotify_URL' not in df.columns:
+            return set()
+        
+        urls = df['Spotify_URL'].dropna().astype(str)
+        return set(urls[urls != '*'])
+    
     def add_episode(self, episode_data: dict):
         """Aggiunge un nuovo episodio al database"""
         with self._lock:
@@ -248,6 +310,7 @@ class Database:
                     [self.episodes_df, new_episode], 
                     ignore_index=True
                 )
+                self._update_catalog_version()
                 self.save_episodes()
                 logger.info(f"Added new episode: {episode_data.get('Titolo')}")
                 
@@ -273,69 +336,192 @@ class Database:
         """Aggiungi utente alla lista notifiche"""
         notifications_file = self.config.DATA_DIR / 'notification_users.txt'
         
-        try:
-            # Leggi utenti esistenti
-            if notifications_file.exists():
-                with open(notifications_file, 'r', encoding='utf-8') as f:
-                    users = set(line.strip() for line in f if line.strip())
-            else:
-                users = set()
+        with self._lock:
+            try:
+                # Leggi utenti esistenti
+                if notifications_file.exists():
+                    with open(notifications_file, 'r', encoding='utf-8') as f:
+                        users = set(line.strip() for line in f if line.strip())
+                else:
+                    users = set()
             
-            # Aggiungi nuovo utente
-            chat_id_str = str(chat_id)
-            if chat_id_str not in users:
-                users.add(chat_id_str)
+                # Aggiungi nuovo utente
+                chat_id_str = str(chat_id)
+                if chat_id_str not in users:
+                    users.add(chat_id_str)
                 
-                # Salva
-                with open(notifications_file, 'w', encoding='utf-8') as f:
-                    for user in sorted(users):
-                        f.write(f"{user}\n")
+                    # Salva
+                    with open(notifications_file, 'w', encoding='utf-8') as f:
+                        for user in sorted(users):
+                            f.write(f"{user}\n")
                 
-                logger.info(f"Added user {chat_id} to notifications")
+                    logger.info(f"Added user {chat_id} to notifications")
                     
-        except Exception as e:
-            logger.error(f"Error adding user to notifications: {e}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Error adding user to notifications: {e}", exc_info=True)
     
     def get_notification_users(self) -> List[str]:
         """Recupera lista utenti da notificare"""
         notifications_file = self.config.DATA_DIR / 'notification_users.txt'
         
-        try:
-            if not notifications_file.exists():
-                return []
+        with self._lock:
+            try:
+                if not notifications_file.exists():
+                    return []
             
-            with open(notifications_file, 'r', encoding='utf-8') as f:
-                users = [line.strip() for line in f if line.strip()]
+                with open(notifications_file, 'r', encoding='utf-8') as f:
+                    users = [line.strip() for line in f if line.strip()]
             
-            return users
+                return users
                 
-        except Exception as e:
-            logger.error(f"Error getting notification users: {e}", exc_info=True)
-            return []
+            except Exception as e:
+                logger.error(f"Error getting notification users: {e}", exc_info=True)
+                return []
     
     def remove_user_from_notifications(self, chat_id: int):
         """Rimuovi utente dalla lista (es. se ha bloccato il bot)"""
         notifications_file = self.config.DATA_DIR / 'notification_users.txt'
         
-        try:
-            if not notifications_file.exists():
-                return
+        with self._lock:
+            try:
+                if not notifications_file.exists():
+                    return
             
-            with open(notifications_file, 'r', encoding='utf-8') as f:
-                users = set(line.strip() for line in f if line.strip())
+                with open(notifications_file, 'r', encoding='utf-8') as f:
+                    users = set(line.strip() for line in f if line.strip())
             
-            chat_id_str = str(chat_id)
-            if chat_id_str in users:
-                users.discard(chat_id_str)
+                chat_id_str = str(chat_id)
+                if chat_id_str in users:
+                    users.discard(chat_id_str)
                 
-                with open(notifications_file, 'w', encoding='utf-8') as f:
-                    for user in sorted(users):
-                        f.write(f"{user}\n")
+                    with open(notifications_file, 'w', encoding='utf-8') as f:
+                        for user in sorted(users):
+                            f.write(f"{user}\n")
                 
-                logger.info(f"Removed user {chat_id} from notifications")
+                    logger.info(f"Removed user {chat_id} from notifications")
                     
-        except Exception as e:
-            logger.error(f"Error removing user from notifications: {e}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Error removing user from notifications: {e}", exc_info=True)
+    
+    def add_subscription(self, chat_id: int, kind: str, value: str):
+        """Iscrive un utente a una categoria o a un ospite ('category' / 'guest')"""
+        with self._lock:
+            try:
+                value = value.strip().lower()
+                if str(chat_id) in self._subscribers_by_target.get((kind, value), set()):
+                    return
+                
+                new_subscription = pd.DataFrame({
+                    'Chat ID': [str(chat_id)],
+                    'Kind': [kind],
+                    'Value': [value]
+                })
+                self.subscriptions_df = pd.concat(
+                    [self.subscriptions_df, new_subscription],
+                    ignore_index=True
+                )
+                self.save_subscriptions()
+                logger.info(f"User {chat_id} subscribed to {kind} '{value}'")
+                
+            except Exception as e:
+                logger.error(f"Error adding subscription: {e}", exc_info=True)
+    
+    def remove_subscription(self, chat_id: int, kind: str, value: str) -> bool:
+        """Rimuove un'iscrizione; restituisce True se esisteva"""
+        with self._lock:
+            try:
+                value = value.strip().lower()
+                if str(chat_id) not in self._subscribers_by_target.get((kind, value), set()):
+                    return False
+                
+                df = self.subscriptions_df
+                self.subscriptions_df = df[
+                    ~((df['Chat ID'] == str(chat_id)) & (df['Kind'] == kind) & (df['Value'] == value))
+                ].reset_index(drop=True)
+                self.save_subscriptions()
+                return True
+                
+            except Exception as e:
+                logger.error(f"Error removing subscription: {e}", exc_info=True)
+                return False
+    
+    def clear_subscriptions(self, chat_id: int):
+        """Rimuove tutte le iscrizioni: l'utente torna a ricevere tutto"""
+        with self._lock:
+            try:
+                if str(chat_id) not in self._subscribed_chats:
+                    return
+                
+                self.subscriptions_df = self.subscriptions_df[
+                    self.subscriptions_df['Chat ID'] != str(chat_id)
+                ].reset_index(drop=True)
+                self.save_subscriptions()
+                
+            except Exception as e:
+                logger.error(f"Error clearing subscriptions: {e}", exc_info=True)
+    
+    def get_subscriptions(self, chat_id: int) -> List[Tuple[str, str]]:
+        """Restituisce le iscrizioni (kind, value) di un utente"""
+        df = self.subscriptions_df
+        rows = df[df['Chat ID'] == str(chat_id)]
+        return sorted((kind, value) for kind, value in rows[['Kind', 'Value']].itertuples(index=False))
+    
+    def remove_users_from_notifications(self, chat_ids) -> int:
+        """
+        Rimuove più utenti con una sola riscrittura del file
+        (es. chi ha bloccato il bot durante un invio massivo)
+        
+        Returns:
+            Numero di utenti rimossi
+        """
+        notifications_file = self.config.DATA_DIR / 'notification_users.txt'
+        to_remove = {str(chat_id) for chat_id in chat_ids}
+        
+        if not to_remove:
+            return 0
+        
+        with self._lock:
+            try:
+                if not notifications_file.exists():
+                    return 0
+                
+                with open(notifications_file, 'r', encoding='utf-8') as f:
+                    users = set(line.strip() for line in f if line.strip())
+                
+                removed = users & to_remove
+                if removed:
+                    with open(notifications_file, 'w', encoding='utf-8') as f:
+                        for user in sorted(users - removed):
+                            f.write(f"{user}\n")
+                    
+                    logger.info(f"Removed {len(removed)} users from notifications")
+                
+                return len(removed)
+                
+            except Exception as e:
+                logger.error(f"Error removing users from notifications: {e}", exc_info=True)
+                return 0
+    
+    def get_notification_users_for_episode(self, episode) -> List[str]:
+        """
+        Utenti da notificare per un episodio: chi non ha iscrizioni segmentate
+        più chi segue la sua categoria o il suo ospite (lookup sull'indice)
+        """
+        category = episode.get('Category')
+        guest = episode.get('Guest')
+        category = category.strip().lower() if isinstance(category, str) else ''
+        guest = guest.strip().lower() if isinstance(guest, str) else ''
+        
+        targeted = (
+            self._subscribers_by_target.get(('category', category), set())
+            | self._subscribers_by_target.get(('guest', guest), set())
+        )
+        subscribed = self._subscribed_chats
+        
+        return [
+            chat_id for chat_id in self.get_notification_users()
+            if chat_id not in subscribed or chat_id in targeted
+        ]
     
     # ==========================================
     # METODI PER COMPATIBILITÀ CON COMANDI ADMIN
@@ -353,6 +539,21 @@ class Database:
         """Restituisce numero totale statistiche"""
         return len(self.stats_df) if not self.stats_df.empty else 0
     
+    def get_catalog_version(self) -> int:
+        """
+        Restituisce la versione del catalogo episodi
+        Hash del contenuto: cambia a ogni aggiunta, modifica o rimozione ed è
+        uguale in tutti i processi che leggono lo stesso CSV
+        """
+        return self._catalog_version
+    
+    def _update_catalog_version(self):
+        """Ricalcola la versione del catalogo da episodes_df (32 bit, entra nei callback_data)"""
+        episodes = self.episodes_df.drop(columns=['Guest_lower'], errors='ignore')
+        row_hashes = pd.util.hash_pandas_object(episodes, index=False)
+        digest = hashlib.sha256(row_hashes.values.tobytes()).hexdigest()
+        self._catalog_version = int(digest[:8], 16)
+    
     def get_top_queries(self, limit: int = 5) -> List[tuple]:
         """Restituisce top N query più frequenti"""
         try:
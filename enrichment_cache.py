@@ -0,0 +1,118 @@
+"""
+Cache persistente dei risultati di arricchimento LLM
+
+La chiave è l'hash di tutto ciò che determina la risposta del modello:
+titolo, descrizione, estratto della pagina ospiti, versione del prompt e
+modello. Lo stesso episodio rielaborato (check ripetuti, rescrape) non
+richiama l'LLM; cambiando prompt o modello la chiave cambia da sola.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from threading import Lock
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentCache:
+    """
+    Risultati di arricchimento indicizzati per contenuto
+
+    Args:
+        config: Configurazione (usa CACHE_DB_PATH)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = Lock()
+        self.db_path = self.config.CACHE_DB_PATH
+        self._init_database()
+
+    def _init_database(self):
+        """Crea tabella se non esiste"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS enrichment_cache (
+                        key TEXT PRIMARY KEY,
+                        prompt_version TEXT NOT NULL,
+                        model TEXT,
+                        result TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error initializing enrichment cache: {e}", exc_info=True)
+                raise
+
+    @staticmethod
+    def make_key(title: str, description: str, context: str, prompt_version: str, model: str) -> str:
+        """Hash SHA-256 degli input dell'arricchimento"""
+        payload = json.dumps(
+            [title or '', description or '', context or '', prompt_version, model or ''],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Risultato salvato per la chiave, se presente"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute('SELECT result FROM enrichment_cache WHERE key = ?', (key,)).fetchone()
+            conn.close()
+            return json.loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.warning(f"Enrichment cache read failed: {e}")
+            return None
+
+    def set(self, key: str, result: Dict, prompt_version: str, model: str):
+        """Salva un risultato"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('''
+                    INSERT OR REPLACE INTO enrichment_cache (key, prompt_version, model, result)
+                    VALUES (?, ?, ?, ?)
+                ''', (key, prompt_version, model, json.dumps(result, ensure_ascii=False)))
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.warning(f"Enrichment cache write failed: {e}")
+
+    def invalidate(self, keep_prompt_version: Optional[str] = None) -> int:
+        """
+        Elimina le voci in cache
+
+        Args:
+            keep_prompt_version: Se indicata, conserva solo le voci di questa
+                versione del prompt; altrimenti svuota tutto
+
+        Returns:
+            Numero di voci eliminate
+        """
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            if keep_prompt_version is None:
+                cursor = conn.execute('DELETE FROM enrichment_cache')
+            else:
+                cursor = conn.execute(
+                    'DELETE FROM enrichment_cache WHERE prompt_version != ?',
+                    (keep_prompt_version,)
+                )
+            removed = cursor.rowcount
+            conn.commit()
+            conn.close()
+
+        if removed:
+            logger.info(f"🧹 Removed {removed} stale enrichment cache entries")
+        return removed
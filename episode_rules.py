@@ -0,0 +1,180 @@
+"""
+Estrazione deterministica dei metadati di un episodio
+
+Regole su titolo e descrizione (numero e parte nel titolo, tag [CATEGORIA],
+"con <Nome>", link alle shownotes, ...). Ogni campo ha un punteggio di
+confidenza tra 0 e 1: l'LLM viene interpellato solo per i campi sotto soglia.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Categorie note (vedi prompt di arricchimento)
+KNOWN_CATEGORIES = (
+    'INTERVISTA',
+    'Q&A',
+    'OFFICE EXTRAS',
+    'OFFICE OF CARDS X SPEECH',
+    'LIBRO',
+    'ALTRO',
+    'INTRO'
+)
+
+# Campi che, se incerti, richiedono l'LLM. Le shownotes non sono incluse:
+# le recupera WebScraper dal sito a partire dall'Id
+LLM_FIELDS = ('Id', 'Category', 'Guest')
+
+# Conduttore del podcast: mai considerato ospite
+HOST_NAMES = {'davide cervellin'}
+
+# "Nome Cognome" (2-3 parole con iniziale maiuscola)
+_NAME = r"[A-ZÀ-Ý][\w'’\-]+(?:\s+[A-ZÀ-Ý][\w'’\-]+){1,2}"
+
+_ID_PART_RE = re.compile(r'^\s*(\d{1,4})(?:_(\d{1,2}))?(?=[\s\-]|$)')
+_TAG_RE = re.compile(r'\[([^\]]+)\]')
+_PART_WORDS = {'prima': 1, 'seconda': 2, 'terza': 3, 'quarta': 4}
+_PART_RE = re.compile(r'\b(prima|seconda|terza|quarta) parte\b', re.IGNORECASE)
+_SHOWNOTES_RE = re.compile(r'https?://(?:it\.)?officeofcards\.com/ospite/[^\s"\'<>)]+')
+
+# Pattern ospite, con la relativa confidenza
+_GUEST_PATTERNS = [
+    # "... – con Pasquale Acampora" in fondo al titolo
+    ('title', re.compile(rf'(?:–|-|\||,|;)\s*(?:Ep\.\s*\d+\s+)?con\s+({_NAME})\s*$'), 0.9),
+    # "038_2 - [INTERVISTA] Tiziano Tassi, “...”" / "117_2 Paolo Castelletti - Founder ..."
+    ('title', re.compile(rf'^\s*\d{{1,4}}(?:_\d{{1,2}})?\s*-?\s*(?:\[[^\]]+\]\s*-?\s*)?({_NAME})\s*(?:,|-|–|“|"|”)'), 0.85),
+    # "Prima parte dell'intervista a Enrico Zanieri", "Davide intervista Pasquale Acampora"
+    ('description', re.compile(rf"\bintervist(?:a|iamo)(?:\s+a)?\s+({_NAME})"), 0.85),
+    ('description', re.compile(rf"\b(?:incontriamo|conversa con|ospite)\s+({_NAME})"), 0.8),
+    # "... la storia di Alessandro Greco"
+    ('title', re.compile(rf'\b(?:storia|percorso|scalata) di\s+({_NAME})'), 0.75),
+]
+
+
+class Guess(NamedTuple):
+    """Valore estratto per un campo e relativa confidenza (0-1)"""
+    value: Any
+    confidence: float
+
+
+def extract_id_part(title: str):
+    """Id e parte dal prefisso del titolo ("123_2 Titolo", "123 - Titolo")"""
+    match = _ID_PART_RE.match(title or '')
+    if not match:
+        return Guess(-1, 0.0), None
+
+    part = Guess(int(match.group(2)), 0.95) if match.group(2) else None
+    return Guess(int(match.group(1)), 0.95), part
+
+
+def extract_part(title: str, description: str) -> Guess:
+    """Parte dell'episodio: dal titolo, poi da "Prima/Seconda parte" nella descrizione"""
+    _, part = extract_id_part(title)
+    if part is not None:
+        return part
+
+    match = _PART_RE.search(description or '')
+    if match:
+        return Guess(_PART_WORDS[match.group(1).lower()], 0.85)
+
+    return Guess(1, 0.6)
+
+
+def extract_guest(title: str, description: str) -> Guess:
+    """Ospite da titolo o descrizione (escluso il conduttore)"""
+    sources = {'title': title or '', 'description': description or ''}
+
+    for source, pattern, confidence in _GUEST_PATTERNS:
+        for match in pattern.finditer(sources[source]):
+            name = match.group(1).strip()
+            if name.lower() not in HOST_NAMES:
+                return Guess(name, confidence)
+
+    return Guess('*', 0.0)
+
+
+def extract_category(title: str, description: str, episode_id: int, guest: Guess) -> Guess:
+    """Categoria da tag, parole chiave o casi speciali"""
+    title = title or ''
+    lowered = title.lower()
+
+    # Casi speciali storici
+    if episode_id == 0:
+        return Guess('INTRO', 0.9)
+    if episode_id in (3, 31):
+        return Guess('Q&A', 0.9)
+
+    tag = _TAG_RE.search(title)
+    if tag:
+        category = tag.group(1).strip().upper()
+        return Guess(category, 0.95 if category in KNOWN_CATEGORIES else 0.8)
+
+    if 'office of cards x speech' in lowered:
+        return Guess('OFFICE OF CARDS X SPEECH', 0.95)
+    if 'office extras' in lowered:
+        return Guess('OFFICE EXTRAS', 0.9)
+    if 'q&a' in lowered or 'domande e risposte' in lowered:
+        return Guess('Q&A', 0.85)
+
+    if guest.value != '*' and guest.confidence >= 0.8:
+        return Guess('INTERVISTA', 0.85)
+
+    return Guess(None, 0.0)
+
+
+def extract_shownotes(description: str) -> Guess:
+    """Link alle shownotes presente nella descrizione"""
+    match = _SHOWNOTES_RE.search(description or '')
+    if match:
+        return Guess(match.group(0).rstrip('.,;!'), 0.9)
+    return Guess('*', 0.0)
+
+
+def extract_fields(title: str, description: str) -> Dict[str, Guess]:
+    """
+    Estrae Id, Part, Category, Guest e Shownotes con le regole
+
+    Returns:
+        Dizionario campo -> Guess
+    """
+    episode_id, _ = extract_id_part(title)
+    guest = extract_guest(title, description)
+    category = extract_category(title, description, episode_id.value, guest)
+
+    # Nelle categorie senza intervista l'assenza di ospite è attendibile; i libri
+    # non hanno ospiti (il titolo del libro somiglia a un nome). Gli Office Extras
+    # a volte hanno un ospite indicato solo sul sito: lì decide l'LLM
+    if category.confidence >= 0.8:
+        if category.value == 'LIBRO':
+            guest = Guess('*', 0.9)
+        elif guest.value == '*' and category.value not in ('INTERVISTA', 'OFFICE EXTRAS'):
+            guest = Guess('*', 0.8)
+
+    return {
+        'Id': episode_id,
+        'Part': extract_part(title, description),
+        'Category': category,
+        'Guest': guest,
+        'Shownotes': extract_shownotes(description)
+    }
+
+
+def low_confidence_fields(guesses: Dict[str, Guess], threshold: float,
+                          fields=LLM_FIELDS) -> List[str]:
+    """Campi con confidenza sotto soglia"""
+    return [field for field in fields if guesses[field].confidence < threshold]
+
+
+def is_informative(value: Optional[Any]) -> bool:
+    """Vero se un valore restituito dall'LLM aggiunge informazione"""
+    return value is not None and value != '*' and value != -1 and value != ''
+
+
+def merge_known(episode: Dict, updates: Dict) -> Dict:
+    """
+    Aggiorna i campi di un episodio con i soli valori informativi:
+    un segnaposto ('*', -1) non sostituisce mai un valore già noto
+    """
+    for field, value in updates.items():
+        if is_informative(value):
+            episode[field] = value
+    return episode
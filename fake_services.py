@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Servizi esterni finti per benchmark e test in locale
+
+Due sottocomandi:
+  serve  Avvia un server che sostituisce Spotify (token e pagine degli show),
+         la pagina ospiti di officeofcards.com e un endpoint chat compatibile
+         OpenAI (Z.AI), con latenza ed errori configurabili
+  bench  Misura check episodi e rescrape contro il server finto
+
+Le risposte sono ricostruite dal catalogo in data/ (db.csv, pills.csv) oppure
+lette da una cartella --fixtures con episodes.json, pills.json e ospite.html
+(più ospite-2.html, ... per l'archivio paginato) registrati.
+
+Esempio:
+  python fake_services.py serve --port 8090 --latency-ms 80 --llm-latency-ms 800 --error-rate 0.02
+  python fake_services.py bench --url http://127.0.0.1:8090 --checks 5 --new 3
+
+Per usare il bot contro il server finto:
+  SPOTIFY_API_BASE=http://127.0.0.1:8090/v1 SPOTIFY_AUTH_URL=http://127.0.0.1:8090/api/token \\
+  SHOWNOTES_URL=http://127.0.0.1:8090/ospite/ ZAI_BASE=http://127.0.0.1:8090/v1 python bot.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+
+from episode_rules import extract_fields
+
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Show Spotify usati da Config
+EPISODES_SHOW_ID = '2cqzDBQRxqgba39VPp3FDs'
+PILLS_SHOW_ID = '5ILsIKO18lp9aemJqcAWdb'
+
+_SHOW_PATH_RE = re.compile(r'^/v1/shows/([^/]+)/episodes/?$')
+_GUESTS_PATH_RE = re.compile(r'^/ospite/(?:page/(\d+)/?)?$')
+_EPISODE_BLOCK_RE = re.compile(r'### Episodio (\d+)\n(.*?)(?=\n### Episodio |\Z)', re.DOTALL)
+
+
+def _text(value) -> str:
+    return '' if pd.isna(value) else str(value)
+
+
+def _spotify_item(row) -> Dict:
+    """Item Spotify (formato API /shows/{id}/episodes) da una riga del catalogo"""
+    url = _text(row.get('Spotify_URL'))
+    return {
+        'id': url.rstrip('/').rsplit('/', 1)[-1],
+        'type': 'episode',
+        'name': _text(row.get('Titolo')),
+        'description': _text(row.get('Description')),
+        'release_date': _text(row.get('Release_Date')),
+        'external_urls': {'spotify': url}
+    }
+
+
+def _guest_containers(df: pd.DataFrame) -> List[str]:
+    """Voci della pagina ospiti con la stessa struttura del sito (div.container-overlay)"""
+    containers = []
+    seen = set()
+
+    rows = df[pd.to_numeric(df['Id'], errors='coerce').fillna(-1) > 0]
+    for _, row in rows.sort_values('Id', ascending=False).iterrows():
+        episode_id = int(row['Id'])
+        guest = _text(row.get('Guest'))
+        if episode_id in seen or not guest or guest == '*':
+            continue
+        seen.add(episode_id)
+
+        shownotes = _text(row.get('Shownotes')) or '*'
+        containers.append(
+            f'<div class="container-overlay"><a href="{html.escape(shownotes)}">'
+            f'<span>Episodio {episode_id}</span><span>{html.escape(guest)}</span></a></div>'
+        )
+    return containers
+
+
+def _guests_pages(containers: List[str], per_page: int) -> List[str]:
+    """Archivio ospiti paginato come WordPress: /ospite/, /ospite/page/2/, ..."""
+    if per_page:
+        chunks = [containers[i:i + per_page] for i in range(0, len(containers), per_page)] or [[]]
+    else:
+        chunks = [containers]
+    last = len(chunks)
+
+    pages = []
+    for number, chunk in enumerate(chunks, 1):
+        # Come sul sito: prima, ultima e pagine vicine, il resto è "…"
+        shown = sorted({1, last, number - 1, number, number + 1} & set(range(1, last + 1)))
+        links = ''.join(
+            f'<a class="page-numbers" href="/ospite/page/{shown_number}/">{shown_number}</a>'
+            for shown_number in shown if shown_number != number
+        )
+        pages.append(
+            '<html><body>\n' + '\n'.join(chunk)
+            + f'\n<nav class="pagination">{links}</nav>\n</body></html>'
+        )
+    return pages
+
+
+class Fixtures:
+    """Risposte servite dal server finto"""
+
+    def __init__(self, data_dir: Path, fixtures_dir: Optional[Path] = None, guests_per_page: int = 0):
+        if fixtures_dir is not None:
+            self.episodes = json.loads((fixtures_dir / 'episodes.json').read_text(encoding='utf-8'))
+            self.pills = json.loads((fixtures_dir / 'pills.json').read_text(encoding='utf-8'))
+            # ospite.html, poi eventuali ospite-2.html, ospite-3.html, ...
+            self.guests_pages = [(fixtures_dir / 'ospite.html').read_text(encoding='utf-8')]
+            while (fixtures_dir / f'ospite-{len(self.guests_pages) + 1}.html').exists():
+                path = fixtures_dir / f'ospite-{len(self.guests_pages) + 1}.html'
+                self.guests_pages.append(path.read_text(encoding='utf-8'))
+            return
+
+        episodes = pd.read_csv(data_dir / 'db.csv', encoding='utf-8')
+        if 'Release_Date' in episodes.columns:
+            episodes = episodes.sort_values('Release_Date', ascending=False, na_position='last')
+        pills = pd.read_csv(data_dir / 'pills.csv', encoding='utf-8')
+
+        # Spotify restituisce gli item dal più recente
+        self.episodes = [_spotify_item(row) for _, row in episodes.iterrows()]
+        self.pills = [_spotify_item(row) for _, row in pills.iloc[::-1].iterrows()]
+        self.guests_pages = _guests_pages(_guest_containers(episodes), guests_per_page)
+
+    def show_items(self, show_id: str) -> Optional[List[Dict]]:
+        return {EPISODES_SHOW_ID: self.episodes, PILLS_SHOW_ID: self.pills}.get(show_id)
+
+
+def _llm_answer(prompt: str) -> Dict:
+    """Risposta plausibile dell'LLM, ricavata dalle regole su titolo e descrizione"""
+
+    def enrich(block: str) -> Dict:
+        title = re.search(r'^Titolo: (.*)$', block, re.MULTILINE)
+        description = re.search(r'^Descrizione: (.*)$', block, re.MULTILINE)
+        guesses = extract_fields(
+            title.group(1) if title else '',
+            description.group(1) if description else ''
+        )
+        return {
+            'Id': guesses['Id'].value,
+            'Category': guesses['Category'].value or 'ALTRO',
+            'Guest': guesses['Guest'].value,
+            'Shownotes': guesses['Shownotes'].value
+        }
+
+    blocks = _EPISODE_BLOCK_RE.findall(prompt)
+    if blocks:
+        return {'episodes': [{'index': int(index), **enrich(block)} for index, block in blocks]}
+    return enrich(prompt)
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    """Spotify, pagina ospiti e chat LLM finti"""
+
+    protocol_version = 'HTTP/1.1'
+
+    fixtures: Fixtures = None
+    latency = 0.0
+    jitter = 0.0
+    llm_latency = 0.0
+    error_rate = 0.0
+
+    calls = {}
+    calls_lock = threading.Lock()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+
+        if parsed.path == '/_stats':
+            with self.calls_lock:
+                self._send_json(200, dict(self.calls))
+            return
+
+        match = _SHOW_PATH_RE.match(parsed.path)
+        if match:
+            self._count('spotify_page')
+            if self._inject_failure(spotify=True):
+                return
+            self._show_page(match.group(1), parse_qs(parsed.query))
+        elif _GUESTS_PATH_RE.match(parsed.path):
+            self._count('guests_page')
+            if self._inject_failure():
+                return
+            number = int(_GUESTS_PATH_RE.match(parsed.path).group(1) or 1)
+            if not 1 <= number <= len(self.fixtures.guests_pages):
+                self._send_json(404, {'error': 'not found'})
+                return
+            self._send_cacheable(self.fixtures.guests_pages[number - 1].encode('utf-8'), 'text/html; charset=utf-8')
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        raw = self.rfile.read(length) if length else b''
+        path = urlparse(self.path).path.rstrip('/')
+
+        if path.endswith('/api/token'):
+            self._count('spotify_token')
+            self._send_json(200, {'access_token': 'fake-token', 'token_type': 'Bearer', 'expires_in': 3600})
+        elif path.endswith('/chat/completions'):
+            self._count('llm_chat')
+            if self._inject_failure(latency=self.llm_latency):
+                return
+            self._chat_completion(json.loads(raw or b'{}'))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _count(self, name: str):
+        with self.calls_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _inject_failure(self, spotify: bool = False, latency: Optional[float] = None) -> bool:
+        """Applica la latenza simulata; restituisce True se ha risposto con un errore"""
+        delay = self.latency if latency is None else latency
+        time.sleep(max(0.0, delay + random.uniform(-self.jitter, self.jitter)))
+
+        if random.random() >= self.error_rate:
+            return False
+
+        self._count('errors')
+        if spotify and random.random() < 0.5:
+            self._send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                            headers={'Retry-After': '1'})
+        else:
+            self._send_json(503, {'error': {'status': 503, 'message': 'Service unavailable'}})
+        return True
+
+    def _show_page(self, show_id: str, query: Dict):
+        items = self.fixtures.show_items(show_id)
+        if items is None:
+            self._send_json(404, {'error': {'status': 404, 'message': 'non existing id'}})
+            return
+
+        limit = int(query.get('limit', ['20'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        base = f"http://{self.headers.get('Host')}/v1/shows/{show_id}/episodes"
+        body = {
+            'href': f"{base}?offset={offset}&limit={limit}",
+            'items': items[offset:offset + limit],
+            'limit': limit,
+            'offset': offset,
+            'total': len(items),
+            'next': f"{base}?offset={offset + limit}&limit={limit}" if offset + limit < len(items) else None,
+            'previous': None
+        }
+        self._send_cacheable(json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _chat_completion(self, request: Dict):
+        messages = request.get('messages') or [{}]
+        answer = _llm_answer(messages[-1].get('content') or '')
+        self._send_json(200, {
+            'id': f"chatcmpl-{random.getrandbits(32):x}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': json.dumps(answer, ensure_ascii=False)},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+    def _send_cacheable(self, body: bytes, content_type: str):
+        """Risposta con ETag: una richiesta condizionale invariata riceve 304"""
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def serve(host: str, port: int, data_dir: Path, fixtures_dir: Optional[Path],
+          latency_ms: float, jitter_ms: float, llm_latency_ms: float, error_rate: float,
+          guests_per_page: int = 0):
+    """Avvia i servizi finti finché non vengono interrotti"""
+    FakeServicesHandler.fixtures = Fixtures(data_dir, fixtures_dir, guests_per_page)
+    FakeServicesHandler.latency = latency_ms / 1000
+    FakeServicesHandler.jitter = jitter_ms / 1000
+    FakeServicesHandler.llm_latency = llm_latency_ms / 1000
+    FakeServicesHandler.error_rate = error_rate
+
+    server = ThreadingHTTPServer((host, port), FakeServicesHandler)
+    logger.info(
+        f"🧪 Servizi finti su http://{host}:{port} "
+        f"({len(FakeServicesHandler.fixtures.episodes)} episodi, "
+        f"{len(FakeServicesHandler.fixtures.pills)} pillole, "
+        f"{len(FakeServicesHandler.fixtures.guests_pages)} pagine ospiti, errori {error_rate:.0%})"
+    )
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"📊 Chiamate ricevute: {FakeServicesHandler.calls}")
+
+
+def _server_stats(url: str) -> Dict[str, int]:
+    return requests.get(f"{url}/_stats", timeout=5).json()
+
+
+def _stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)}
+
+
+def _bench_environment(url: str) -> str:
+    """Punta Config al server finto, con dati e cache in una cartella temporanea"""
+    data_dir = tempfile.mkdtemp(prefix='oc_bench_')
+    for name in ('db.csv', 'pills.csv'):
+        if Path('data', name).exists():
+            shutil.copy(Path('data', name), data_dir)
+
+    os.environ.update({
+        'SPOTIFY_API_BASE': f"{url}/v1",
+        'SPOTIFY_AUTH_URL': f"{url}/api/token",
+        'SHOWNOTES_URL': f"{url}/ospite/",
+        'ZAI_BASE': f"{url}/v1",
+        'ZAI_API_KEY': 'fake-key',
+        'ZAI_MODEL': 'fake-model',
+        'DATA_DIR': data_dir
+    })
+    for name in ('BOT_TOKEN', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET'):
+        os.environ.setdefault(name, 'fake')
+    return data_dir
+
+
+def bench_checks(url: str, checks: int, new: int):
+    """Check episodi ripetuti: il primo a cache vuota, i successivi a cache calda"""
+    from config import Config
+    from spotify_service import SpotifyService
+
+    spotify = SpotifyService(Config())
+    page = spotify._fetch_page(spotify.config.SPOTIFY_SHOW_URL, limit=50)
+    urls = [item['external_urls']['spotify'] for item in page.get('items', [])]
+    known = set(urls[new:])
+
+    async def run():
+        for round_number in range(1, checks + 1):
+            before = _server_stats(url)
+            start = time.perf_counter()
+            episodes = await spotify.get_new_episodes_async(known)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"  check {round_number}: {len(episodes)} nuovi in {elapsed * 1000:.0f} ms "
+                f"{_stats_delta(before, _server_stats(url))}"
+            )
+
+    logger.info(f"🔁 {checks} check con {new} episodi nuovi")
+    asyncio.run(run())
+
+
+def bench_rescrape(url: str):
+    """
+    Rescrape degli episodi in pipeline (download, parsing, classificazione LLM,
+    shownotes): completo e poi incrementale sul catalogo locale
+    """
+    from rescrape_all_episodes import EpisodeRescraper
+
+    rescraper = EpisodeRescraper(use_llm=True)
+    runs = [("📚 Rescrape completo", None), ("♻️  Rescrape incrementale", rescraper.load_catalog())]
+
+    for label, catalog in runs:
+        logger.info(label)
+        rescraper.state.clear()
+
+        before = _server_stats(url)
+        start = time.perf_counter()
+        df = rescraper.scrape_all_episodes(catalog)
+        elapsed = time.perf_counter() - start
+
+        logger.info(f"  pipeline   {elapsed:7.2f} s  {_stats_delta(before, _server_stats(url))}")
+        logger.info(f"🚀 Throughput {len(df) / elapsed:.1f} episodi/s ({len(df)} episodi)")
+        if catalog is not None:
+            diff = rescraper.diff_catalog(df, catalog)
+            logger.info(f"  differenze {({key: len(episodes) for key, episodes in diff.items()})}")
+
+    rescraper.state.clear()
+
+
+def main():
+    """Funzione principale"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Avvia i servizi finti')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8090)
+    serve_parser.add_argument('--data-dir', type=Path, default=Path('data'))
+    serve_parser.add_argument('--fixtures', type=Path, default=None,
+                              help='Cartella con episodes.json, pills.json e ospite.html registrati')
+    serve_parser.add_argument('--latency-ms', type=float, default=50)
+    serve_parser.add_argument('--jitter-ms', type=float, default=10)
+    serve_parser.add_argument('--llm-latency-ms', type=float, default=800)
+    serve_parser.add_argument('--error-rate', type=float, default=0.0)
+    serve_parser.add_argument('--guests-per-page', type=int, default=24,
+                              help='Voci per pagina dell\'archivio ospiti (0 = pagina unica)')
+
+    bench_parser = subparsers.add_parser('bench', help='Misura check e rescrape contro i servizi finti')
+    bench_parser.add_argument('--url', default='http://127.0.0.1:8090')
+    bench_parser.add_argument('--checks', type=int, default=5)
+    bench_parser.add_argument('--new', type=int, default=3, help='Episodi nuovi a ogni check')
+    bench_parser.add_argument('--skip-rescrape', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(
+            args.host, args.port, args.data_dir, args.fixtures,
+            args.latency_ms, args.jitter_ms, args.llm_latency_ms, args.error_rate,
+            args.guests_per_page
+        )
+        return
+
+    url = args.url.rstrip('/')
+    data_dir = _bench_environment(url)
+    try:
+        bench_checks(url, args.checks, args.new)
+        if not args.skip_rescrape:
+            bench_rescrape(url)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
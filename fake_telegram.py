@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Client Telegram finto per testare il bot in modalità webhook in locale
+
+Due sottocomandi:
+  api   Avvia una Bot API finta che risponde a getMe, setWebhook, sendMessage, ...
+        (da usare con TELEGRAM_API_BASE_URL=http://127.0.0.1:<porta>/bot)
+  send  Invia N update al webhook del bot, come farebbe Telegram, e misura
+        latenza e throughput
+
+Esempio:
+  python fake_telegram.py api --port 8081
+  BOT_MODE=webhook TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot python bot.py
+  python fake_telegram.py send --url http://127.0.0.1:8443/telegram --updates 200
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+
+import requests
+
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    'id': 1,
+    'is_bot': True,
+    'first_name': 'Office of Cards Bot',
+    'username': 'office_of_cards_test_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False
+}
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    """Risponde alle chiamate Bot API con risultati plausibili"""
+
+    message_ids = count(1)
+    calls = {}
+    calls_lock = threading.Lock()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_GET(self):
+        self._handle()
+
+    def _handle(self):
+        method = self.path.rstrip('/').split('/')[-1]
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        raw = self.rfile.read(length) if length else b''
+
+        try:
+            params = json.loads(raw) if raw else {}
+        except ValueError:
+            params = {}
+
+        with self.calls_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'sendDocument'):
+            chat_id = int(params.get('chat_id', 0) or 0)
+            result = {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', '')
+            }
+        else:
+            result = True
+
+        body = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def serve_api(host: str, port: int):
+    """Avvia la Bot API finta finché non viene interrotta"""
+    server = ThreadingHTTPServer((host, port), FakeBotApiHandler)
+    logger.info(f"🧪 Fake Bot API su http://{host}:{port}/bot")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"📊 Chiamate ricevute: {FakeBotApiHandler.calls}")
+
+
+def build_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Costruisce un update Telegram con un messaggio di testo"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f'Tester {chat_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            'text': text
+        }
+    }
+
+
+def send_updates(url: str, updates: int, chats: int, text: str,
+                 secret_token: str = None, concurrency: int = 10):
+    """Invia gli update al webhook e stampa latenza e throughput"""
+    session = requests.Session()
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret_token
+
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def post(update_id: int):
+        nonlocal failures
+        chat_id = 1000 + (update_id % chats)
+        payload = build_update(update_id, chat_id, text)
+
+        start = time.perf_counter()
+        try:
+            response = session.post(url, data=json.dumps(payload), headers=headers, timeout=10)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+
+    logger.info(f"📨 Invio {updates} update a {url} ({chats} chat, concorrenza {concurrency})")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(post, range(1, updates + 1)))
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        logger.info(f"✅ {len(latencies)} accettati, ❌ {failures} falliti")
+        logger.info(f"⏱️  Latenza p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+        logger.info(f"🚀 Throughput {len(latencies) / total:.1f} update/s")
+    else:
+        logger.error(f"❌ Nessun update accettato ({failures} falliti)")
+
+
+def main():
+    """Funzione principale"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    api_parser = subparsers.add_parser('api', help='Avvia la Bot API finta')
+    api_parser.add_argument('--host', default='127.0.0.1')
+    api_parser.add_argument('--port', type=int, default=8081)
+
+    send_parser = subparsers.add_parser('send', help='Invia update al webhook del bot')
+    send_parser.add_argument('--url', default='http://127.0.0.1:8443/telegram')
+    send_parser.add_argument('--updates', type=int, default=100)
+    send_parser.add_argument('--chats', type=int, default=10)
+    send_parser.add_argument('--text', default='Ultimo Episodio')
+    send_parser.add_argument('--secret-token', default=None)
+    send_parser.add_argument('--concurrency', type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == 'api':
+        serve_api(args.host, args.port)
+    else:
+        send_updates(
+            args.url, args.updates, args.chats, args.text,
+            secret_token=args.secret_token, concurrency=args.concurrency
+        )
+
+
+if __name__ == "__main__":
+    main()
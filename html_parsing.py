@@ -0,0 +1,73 @@
+"""
+Parsing veloce delle pagine del sito
+
+La pagina ospiti viene analizzata con lxml (parser C) e interrogata con XPath
+solo sui nodi che interessano: le voci dell'archivio (div.container-overlay)
+e i link. Una pagina viene letta una sola volta per estrarre sia le voci sia
+la paginazione.
+"""
+
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+import lxml.html
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# Voci dell'archivio ospiti (equivalente di find_all('div', class_='container-overlay'))
+_CONTAINERS = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' container-overlay ')]"
+)
+_SPANS = etree.XPath(".//span")
+_FIRST_LINK_HREF = etree.XPath("(.//a)[1]/@href")
+_LINK_HREFS = etree.XPath("//a/@href")
+
+
+class GuestEntry(NamedTuple):
+    """Voce compatta della pagina ospiti"""
+    episode_id: int
+    guest: str
+    url: str
+
+
+def _episode_id(spans) -> Optional[int]:
+    """ID episodio dal primo span ("Episodio 123")"""
+    if not spans:
+        return None
+
+    words = spans[0].text_content().split()
+    try:
+        return int(words[-1]) if words else None
+    except ValueError:
+        return None
+
+
+def parse_guests_page(html: str) -> Tuple[List[GuestEntry], List[str]]:
+    """
+    Analizza una pagina dell'archivio ospiti
+
+    Returns:
+        Tupla (voci della pagina nell'ordine del sito, href di tutti i link)
+    """
+    if not html or not html.strip():
+        return [], []
+
+    document = lxml.html.fromstring(html)
+
+    entries = []
+    for container in _CONTAINERS(document):
+        spans = _SPANS(container)
+        episode_id = _episode_id(spans)
+        if episode_id is None:
+            logger.debug("Could not extract episode ID from container")
+            continue
+
+        href = _FIRST_LINK_HREF(container)
+        entries.append(GuestEntry(
+            episode_id=episode_id,
+            guest=spans[1].text_content().strip() if len(spans) > 1 else '*',
+            url=href[0] if href else '*'
+        ))
+
+    return entries, [str(href) for href in _LINK_HREFS(document)]
@@ -0,0 +1,175 @@
+"""
+Cache HTTP persistente con richieste condizionali
+
+Le risposte vengono salvate su SQLite insieme a ETag e Last-Modified.
+Entro il TTL una risposta viene servita dalla cache senza rete; dopo il TTL
+viene rivalidata con If-None-Match / If-Modified-Since, così una pagina
+invariata costa un 304 senza body invece del download completo.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Risposta HTTP (dalla rete o dalla cache)"""
+
+    def __init__(self, url: str, status_code: int, text: str, from_cache: bool, revalidated: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpCache:
+    """
+    Cache HTTP condivisa tra SpotifyService, WebScraper e arricchimento episodi
+
+    Args:
+        config: Configurazione (usa CACHE_DB_PATH)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = Lock()
+        self.db_path = self.config.CACHE_DB_PATH
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0}
+        self._init_database()
+
+    def _init_database(self):
+        """Crea tabella se non esiste"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                cursor = conn.cursor()
+
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS http_cache (
+                        key TEXT PRIMARY KEY,
+                        etag TEXT,
+                        last_modified TEXT,
+                        body TEXT NOT NULL,
+                        fetched_at REAL NOT NULL
+                    )
+                ''')
+
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error initializing HTTP cache: {e}", exc_info=True)
+                raise
+
+    def _get_connection(self):
+        """Crea connessione al database della cache"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _key(url: str, params: Optional[Dict]) -> str:
+        """Chiave di cache: URL più parametri ordinati (mai gli header, es. token)"""
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    def _load(self, key: str) -> Optional[sqlite3.Row]:
+        try:
+            conn = self._get_connection()
+            row = conn.execute('SELECT * FROM http_cache WHERE key = ?', (key,)).fetchone()
+            conn.close()
+            return row
+
+        except Exception as e:
+            logger.warning(f"HTTP cache read failed for {key}: {e}")
+            return None
+
+    def _store(self, key: str, etag: Optional[str], last_modified: Optional[str], body: str):
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                conn.execute('''
+                    INSERT OR REPLACE INTO http_cache (key, etag, last_modified, body, fetched_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, etag, last_modified, body, time.time()))
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.warning(f"HTTP cache write failed for {key}: {e}")
+
+    def _touch(self, key: str):
+        """Rinnova il TTL di una voce rivalidata con 304"""
+        with self._lock:
+            try:
+                conn = self._get_connection()
+                conn.execute('UPDATE http_cache SET fetched_at = ? WHERE key = ?', (time.time(), key))
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.warning(f"HTTP cache update failed for {key}: {e}")
+
+    def get(self, session: requests.Session, url: str, params: Optional[Dict] = None,
+            headers: Optional[Dict] = None, ttl: float = 0, timeout: float = 10) -> CachedResponse:
+        """
+        GET con cache
+
+        Args:
+            session: Sessione HTTP da usare per la richiesta
+            ttl: Secondi per cui una voce è servita senza contattare il server
+            timeout: Timeout della richiesta
+
+        Returns:
+            CachedResponse con status 200. Le risposte di errore non vengono
+            salvate e sollevano requests.HTTPError (con .response)
+        """
+        key = self._key(url, params)
+        cached = self._load(key)
+
+        if cached is not None and time.time() - cached['fetched_at'] < ttl:
+            self.stats['fresh'] += 1
+            return CachedResponse(url, 200, cached['body'], from_cache=True)
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached['etag']:
+                request_headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = session.get(url, params=params, headers=request_headers, timeout=timeout)
+
+        if response.status_code == 304 and cached is not None:
+            self._touch(key)
+            self.stats['revalidated'] += 1
+            logger.debug(f"HTTP cache revalidated: {key}")
+            return CachedResponse(url, 200, cached['body'], from_cache=True, revalidated=True)
+
+        response.raise_for_status()
+
+        self.stats['downloaded'] += 1
+        self._store(key, response.headers.get('ETag'), response.headers.get('Last-Modified'), response.text)
+        return CachedResponse(url, response.status_code, response.text, from_cache=False)
+
+    def clear(self):
+        """Svuota la cache"""
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute('DELETE FROM http_cache')
+            conn.commit()
+            conn.close()
@@ -0,0 +1,156 @@
+"""
+Client HTTP condiviso
+
+Tutte le chiamate in uscita (API Spotify, sito, cache HTTP) passano dalla
+stessa sessione requests:
+- pool di connessioni keep-alive (niente nuovo handshake TCP+TLS a ogni richiesta)
+- timeout di default per le richieste che non lo specificano
+- retry con backoff per errori temporanei, rispettando Retry-After
+- limite di richieste contemporanee per host
+- latenze ed esiti per host, consultabili con /http
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+    'AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/91.0.4472.124 Safari/537.36'
+)
+
+# Status temporanei: ritentati dall'adapter e contati come errori
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+
+# Latenze conservate per host per il calcolo dei percentili
+LATENCY_SAMPLES = 500
+
+# Host con un pool di connessioni aperto (API Spotify, account Spotify, sito)
+POOLED_HOSTS = 4
+
+
+class HostMetrics:
+    """Contatori e latenze delle richieste verso un host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'statuses': dict(self.statuses),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p95_ms': round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 1) if latencies else None
+        }
+
+
+class PooledSession(requests.Session):
+    """Sessione con timeout di default, limite per host e metriche"""
+
+    def __init__(self, client: 'HttpClient'):
+        super().__init__()
+        self._client = client
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self._client.timeout
+
+        host = urlparse(url).netloc
+        with self._client._host_slot(host):
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.RequestException:
+                self._client._record(host, time.perf_counter() - start, None)
+                raise
+
+        self._client._record(host, time.perf_counter() - start, response.status_code)
+        return response
+
+
+class HttpClient:
+    """
+    Client HTTP condiviso da SpotifyService, WebScraper e HttpCache
+
+    Args:
+        config: Configurazione (usa HTTP_*)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.timeout = config.HTTP_TIMEOUT
+
+        self._metrics: Dict[str, HostMetrics] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        self.session = PooledSession(self)
+        self.session.headers['User-Agent'] = DEFAULT_USER_AGENT
+
+        adapter = self._adapter(Retry(
+            total=config.HTTP_MAX_RETRIES,
+            backoff_factor=config.HTTP_BACKOFF_FACTOR,
+            status_forcelist=TRANSIENT_STATUS,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        ))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _adapter(self, retries) -> HTTPAdapter:
+        return HTTPAdapter(
+            pool_connections=POOLED_HOSTS,
+            pool_maxsize=self.config.HTTP_POOL_SIZE,
+            max_retries=retries
+        )
+
+    def disable_retries(self, base_url: str):
+        """
+        Nessun retry automatico per gli URL che iniziano con `base_url`
+        (per chi gestisce già i retry, es. SpotifyService con jitter e scadenze)
+        """
+        self.session.mount(base_url, self._adapter(Retry(total=0, raise_on_status=False)))
+
+    def _host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self.config.HTTP_MAX_PER_HOST)
+            return slot
+
+    def _record(self, host: str, elapsed: float, status: Optional[int]):
+        with self._lock:
+            metrics = self._metrics.get(host)
+            if metrics is None:
+                metrics = self._metrics[host] = HostMetrics()
+
+            metrics.requests += 1
+            metrics.latencies.append(elapsed)
+            if status is None:
+                metrics.errors += 1
+            else:
+                metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+                if status in TRANSIENT_STATUS:
+                    metrics.errors += 1
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Metriche per host (richieste, errori, status, latenza p50/p95)"""
+        with self._lock:
+            return {host: metrics.snapshot() for host, metrics in sorted(self._metrics.items())}
@@ -0,0 +1,208 @@
+"""
+Client LLM per l'arricchimento degli episodi
+
+Il modello e i prompt vengono creati una sola volta e riusati da tutte le
+chiamate. Le richieste sono asincrone e hanno una scadenza rigida
+(asyncio.wait_for), quindi un LLM lento non blocca il check degli episodi.
+Le risposte sono JSON validate con pydantic: niente eval sul testo del modello.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+logger = logging.getLogger(__name__)
+
+# Da incrementare a ogni modifica dei prompt: invalida i risultati in cache
+# ottenuti con il prompt precedente
+ENRICHMENT_PROMPT_VERSION = '3'
+
+# Le graffe sono raddoppiate: il testo passa da ChatPromptTemplate
+ENRICHMENT_SYSTEM_PROMPT = """
+Sei un assistente AI che aiuta ad estrarre informazioni chiave riguardo episodi di podcast dal titolo, dalla descrizione e da un elenco di ospiti presi dal sito del podcast (una riga per episodio: numero | ospite | URL shownotes), tra cui potrebbe esserci l'episodio.
+Le informazioni che devi estrarre sono:
+- Id dell'episodio: numero identificativo dell'episodio, da restituire solo se disponibile, altrimenti metti -1
+- Category:
+    - INTERVISTA: se c'è un ospite che sta venendo intervistato
+    - Q&A: se l'episodio consiste in domande e risposte alla community. Di solito è specificato nel titolo o nella descrizione
+    - OFFICE EXTRAS: Di solito è specificato nel titolo o nella descrizione
+    - OFFICE OF CARDS X SPEECH: Di solito è specificato nel titolo o nella descrizione
+    - LIBRO: se l'episodio parla di un libro specifico
+    - ALTRO: se nessuna delle categorie precedenti si applica
+- Guest: nome dell'ospite intervistato, solo in caso di Category INTERVISTA, altrimenti "*"
+- Shownotes: l'URL delle shownotes dell'episodio, se disponibile, altrimenti "*"
+"""
+
+SINGLE_OUTPUT_INSTRUCTIONS = """
+Rispondi SOLO con un oggetto JSON:
+{{"Id": int, "Category": str, "Guest": str, "Shownotes": str}}
+"""
+
+BATCH_OUTPUT_INSTRUCTIONS = """
+Riceverai più episodi, ognuno introdotto da "### Episodio <indice>".
+Rispondi SOLO con un oggetto JSON con un elemento per episodio, nello stesso ordine:
+{{"episodes": [{{"index": int, "Id": int, "Category": str, "Guest": str, "Shownotes": str}}, ...]}}
+"""
+
+
+class EpisodeEnrichment(BaseModel):
+    """Campi restituiti dall'LLM per un episodio"""
+    model_config = ConfigDict(extra='ignore')
+
+    Id: int = -1
+    Category: str = '*'
+    Guest: str = '*'
+    Shownotes: str = '*'
+
+    @field_validator('Id', 'Category', 'Guest', 'Shownotes', mode='before')
+    @classmethod
+    def _null_as_default(cls, value, info):
+        """null nel JSON equivale a campo assente"""
+        if value is None:
+            return cls.model_fields[info.field_name].default
+        return value
+
+
+class BatchItem(EpisodeEnrichment):
+    index: int
+
+
+class BatchEnrichment(BaseModel):
+    episodes: List[BatchItem]
+
+
+def _json_body(content: str) -> str:
+    """Oggetto JSON della risposta, senza eventuali blocchi ``` o testo attorno"""
+    start = content.find('{')
+    end = content.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError(f"No JSON object in LLM response: {content[:200]!r}")
+    return content[start:end + 1]
+
+
+def _format_episode(title: str, description: str, guest_context: str) -> str:
+    return (
+        f"Titolo: {title}\n"
+        f"Descrizione: {description}\n"
+        f"Ospiti dal sito:\n{guest_context or 'non disponibili'}"
+    )
+
+
+class EnrichmentClient:
+    """
+    Client LLM condiviso per l'arricchimento
+
+    Args:
+        config: Configurazione (usa ZAI_*, ENRICHMENT_TIMEOUT, ENRICHMENT_BATCH_TIMEOUT)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.model = config.ZAI_MODEL
+        self._single_chain = None
+        self._batch_chain = None
+
+    def _model(self, timeout: float) -> ChatOpenAI:
+        """
+        Modello con timeout HTTP pari alla scadenza della chiamata
+        Nessun retry interno: l'unico limite è la scadenza di _invoke
+        """
+        return ChatOpenAI(
+            model=self.config.ZAI_MODEL,
+            api_key=self.config.ZAI_API_KEY,
+            base_url=self.config.ZAI_BASE,
+            timeout=timeout,
+            max_retries=0,
+            temperature=0
+        )
+
+    def _build_chains(self):
+        """Crea modelli e prompt alla prima chiamata (il bot parte anche senza chiave LLM)"""
+        self._single_chain = ChatPromptTemplate.from_messages([
+            ("system", ENRICHMENT_SYSTEM_PROMPT + SINGLE_OUTPUT_INSTRUCTIONS),
+            ("human", "{input}")
+        ]) | self._model(self.config.ENRICHMENT_TIMEOUT)
+        self._batch_chain = ChatPromptTemplate.from_messages([
+            ("system", ENRICHMENT_SYSTEM_PROMPT + BATCH_OUTPUT_INSTRUCTIONS),
+            ("human", "{input}")
+        ]) | self._model(self.config.ENRICHMENT_BATCH_TIMEOUT)
+
+    async def _invoke(self, chain, text: str, deadline: float) -> str:
+        response = await asyncio.wait_for(chain.ainvoke({"input": text}), timeout=deadline)
+        return response.content
+
+    async def enrich(self, title: str, description: str, guest_context: str = '') -> Optional[Dict]:
+        """
+        Arricchisce un episodio
+
+        Returns:
+            Dizionario Id/Category/Guest/Shownotes, None se l'LLM non risponde
+            entro ENRICHMENT_TIMEOUT o la risposta non è valida
+        """
+        try:
+            if self._single_chain is None:
+                self._build_chains()
+
+            content = await self._invoke(
+                self._single_chain,
+                _format_episode(title, description, guest_context),
+                self.config.ENRICHMENT_TIMEOUT
+            )
+            return EpisodeEnrichment.model_validate_json(_json_body(content)).model_dump()
+
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ LLM enrichment timed out after {self.config.ENRICHMENT_TIMEOUT}s: {title}")
+        except (ValidationError, ValueError) as e:
+            logger.warning(f"Invalid LLM enrichment for {title}: {e}")
+        except Exception as e:
+            logger.error(f"Error in episode enrichment: {e}", exc_info=True)
+        return None
+
+    async def enrich_many(self, items: List[Tuple[str, str, str]]) -> Dict[int, Dict]:
+        """
+        Arricchisce un blocco di episodi con una sola richiesta
+
+        Args:
+            items: Lista di (titolo, descrizione, contesto ospiti)
+
+        Returns:
+            Posizione nel blocco -> risultato (mancano gli episodi senza risposta valida)
+        """
+        blocks = [
+            f"### Episodio {index}\n{_format_episode(*item)}"
+            for index, item in enumerate(items)
+        ]
+
+        try:
+            if self._batch_chain is None:
+                self._build_chains()
+
+            content = await self._invoke(
+                self._batch_chain,
+                "\n\n".join(blocks),
+                self.config.ENRICHMENT_BATCH_TIMEOUT
+            )
+            parsed = BatchEnrichment.model_validate_json(_json_body(content))
+
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Batch enrichment timed out after {self.config.ENRICHMENT_BATCH_TIMEOUT}s")
+            return {}
+        except (ValidationError, ValueError) as e:
+            logger.warning(f"Invalid batch enrichment response: {e}")
+            return {}
+        except Exception as e:
+            logger.error(f"Error in batch enrichment: {e}", exc_info=True)
+            return {}
+
+        results = {
+            item.index: item.model_dump(exclude={'index'})
+            for item in parsed.episodes
+            if 0 <= item.index < len(items)
+        }
+        if len(results) < len(items):
+            logger.warning(f"Batch enrichment returned {len(results)}/{len(items)} items")
+        return results
@@ -0,0 +1,212 @@
+"""
+Invio parallelo di notifiche rispettando i limiti di Telegram
+
+Telegram accetta circa 30 messaggi/s in totale e circa 1 messaggio/s per
+singola chat. I messaggi vengono inviati da un pool di worker che prendono
+token da un bucket globale; un RetryAfter mette in pausa tutto il bucket per
+il tempo richiesto e il messaggio viene ritentato.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from telegram.error import (
+    BadRequest,
+    ChatMigrated,
+    Forbidden,
+    NetworkError,
+    RetryAfter,
+    TimedOut
+)
+
+from rate_limit import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Esiti di consegna
+SENT = 'sent'
+BLOCKED = 'blocked'
+NOT_FOUND = 'not_found'
+DEACTIVATED = 'deactivated'
+FAILED = 'failed'
+
+
+class DeliveryReport:
+    """Risultato di un invio massivo"""
+
+    def __init__(self):
+        self.outcomes: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+        self.retries = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def record(self, chat_id: str, outcome: str, error: str = None):
+        """Registra l'esito per una chat"""
+        self.outcomes[chat_id] = outcome
+        if error:
+            self.errors[chat_id] = error
+
+    def chats_with(self, *outcomes: str) -> List[str]:
+        """Chat con uno degli esiti indicati"""
+        return [chat_id for chat_id, outcome in self.outcomes.items() if outcome in outcomes]
+
+    @property
+    def sent(self) -> int:
+        return len(self.chats_with(SENT))
+
+    @property
+    def failed(self) -> int:
+        return len(self.outcomes) - self.sent
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Messaggi consegnati al secondo"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        """Riepilogo leggibile"""
+        return (
+            f"{self.sent} sent, {self.failed} failed, {self.retries} retries "
+            f"in {self.elapsed:.1f}s ({self.throughput:.1f} msg/s)"
+        )
+
+
+class NotificationDispatcher:
+    """
+    Invia lo stesso messaggio a molte chat in parallelo
+
+    Args:
+        bot: Bot Telegram
+        rate_per_second: Messaggi al secondo sostenuti su tutte le chat
+        per_chat_interval: Secondi minimi tra due messaggi alla stessa chat
+        max_concurrency: Numero di invii contemporanei
+        max_retries: Tentativi aggiuntivi per errori temporanei
+    """
+
+    def __init__(self, bot, rate_per_second: float = 25, per_chat_interval: float = 1.0,
+                 max_concurrency: int = 20, max_retries: int = 3):
+        self.bot = bot
+        self.bucket = AsyncTokenBucket(rate_per_second)
+        self.per_chat_interval = per_chat_interval
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._last_sent: Dict[str, float] = {}
+
+    async def send(self, chat_ids: Iterable, text: str, parse_mode: Optional[str] = None,
+                   reply_markup=None,
+                   on_result: Optional[Callable[[str, str, Optional[str]], None]] = None) -> DeliveryReport:
+        """
+        Invia `text` a tutte le chat
+
+        Args:
+            on_result: Callback opzionale chiamata con (chat_id, esito, errore)
+                appena l'esito di una chat è definitivo
+
+        Returns:
+            DeliveryReport con l'esito per ogni chat
+        """
+        report = DeliveryReport()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        for chat_id in chat_ids:
+            queue.put_nowait(str(chat_id))
+
+        async def worker():
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                outcome, error = await self._deliver(chat_id, text, parse_mode, reply_markup, report)
+                report.record(chat_id, outcome, error)
+
+                if on_result is not None:
+                    try:
+                        on_result(chat_id, outcome, error)
+                    except Exception as e:
+                        logger.error(f"Error in delivery callback for {chat_id}: {e}", exc_info=True)
+
+        workers = min(self.max_concurrency, queue.qsize()) or 1
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        report.finished_at = time.monotonic()
+        logger.info(f"📨 Dispatch complete: {report.summary()}")
+        return report
+
+    async def _wait_for_chat(self, chat_id: str):
+        """Rispetta l'intervallo minimo tra messaggi alla stessa chat"""
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            wait = last + self.per_chat_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def _deliver(self, chat_id: str, text: str, parse_mode, reply_markup,
+                       report: DeliveryReport):
+        """Invia a una chat con retry; restituisce (esito, errore)"""
+        target = chat_id
+        attempt = 0
+
+        while True:
+            await self._wait_for_chat(target)
+            await self.bucket.acquire()
+
+            try:
+                await self.bot.send_message(
+                    chat_id=int(target),
+                    text=text,
+                    parse_mode=parse_mode,
+                    reply_markup=reply_markup
+                )
+                self._last_sent[target] = time.monotonic()
+                return SENT, None
+
+            except RetryAfter as e:
+                # Flood control: ferma tutti i worker, non solo questo
+                self._last_sent[target] = time.monotonic()
+                retry_after = float(e.retry_after)
+                logger.warning(f"RetryAfter {retry_after}s while notifying {chat_id}")
+                self.bucket.pause(retry_after)
+                error = str(e)
+
+            except ChatMigrated as e:
+                target = str(e.new_chat_id)
+                error = str(e)
+
+            except Forbidden as e:
+                message = str(e).lower()
+                if 'deactivated' in message:
+                    return DEACTIVATED, str(e)
+                return BLOCKED, str(e)
+
+            except BadRequest as e:
+                if 'chat not found' in str(e).lower():
+                    return NOT_FOUND, str(e)
+                return FAILED, str(e)
+
+            except (TimedOut, NetworkError) as e:
+                # Backoff esponenziale con jitter
+                self._last_sent[target] = time.monotonic()
+                await asyncio.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1.5))
+                error = str(e)
+
+            except Exception as e:
+                logger.warning(f"Failed to notify user {chat_id}: {e}")
+                return FAILED, str(e)
+
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.warning(f"Giving up on {chat_id} after {attempt} attempts: {error}")
+                return FAILED, error
+
+            report.retries += 1
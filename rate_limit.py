@@ -0,0 +1,118 @@
+"""
+Rate limiter condivisi
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket asincrono
+
+    Args:
+        rate: Token aggiunti al secondo (richieste/s sostenute)
+        capacity: Dimensione massima del bucket (burst). Default: rate
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate deve essere positivo")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        """Aggiunge i token maturati dall'ultimo aggiornamento"""
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def pause(self, seconds: float):
+        """Blocca l'emissione di token per almeno `seconds` (es. dopo un RetryAfter)"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated_at = max(self._updated_at, self._paused_until)
+
+    async def acquire(self, tokens: float = 1):
+        """Attende finché non sono disponibili `tokens` token e li consuma"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class TokenBucket:
+    """
+    Token bucket per codice sincrono (thread-safe)
+
+    Ogni chiamata prenota i propri token e attende fuori dal lock,
+    così i thread in coda vengono serviti in ordine senza busy wait.
+
+    Args:
+        rate: Token aggiunti al secondo (richieste/s sostenute)
+        capacity: Dimensione massima del bucket (burst). Default: rate
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate deve essere positivo")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """Attende finché non sono disponibili `tokens` token e li consuma"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Un TokenBucket per host: richieste a siti diversi non si rallentano a vicenda
+
+    Args:
+        rate: Richieste/s per host
+        capacity: Burst per host. Default: rate
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str):
+        """Attende il turno per una richiesta all'host di `url`"""
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
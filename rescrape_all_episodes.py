@@ -4,17 +4,38 @@
 """
 Script per rifare lo scraping completo di tutti gli episodi
 Scarica da Spotify e integra con shownotes dal sito
+
+Gli episodi attraversano una pipeline asincrona con code limitate:
+download delle pagine Spotify in parallelo → parsing → classificazione
+(LLM opzionale) e shownotes in un pool di worker. Le fasi lavorano in
+sovrapposizione e ogni servizio esterno ha il proprio rate limit.
+
+Pagine ed episodi elaborati vengono salvati in RescrapeState: dopo
+un'interruzione lo script riprende da dove si era fermato.
+
+In modalità incrementale ogni episodio viene confrontato con il catalogo
+esistente tramite un hash del contenuto: solo gli episodi nuovi o modificati
+passano da classificazione e LLM, e solo questi vengono scritti (UPSERT in
+SQLite, sostituzione atomica del CSV). Il database non viene mai svuotato.
 """
 
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import sqlite3
 import time
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 
 from config import Config
+from episode_rules import merge_known
+from rate_limit import AsyncTokenBucket
+from rescrape_state import RescrapeState
 from spotify_service import SpotifyService
-from web_scraper import WebScraper
+from web_scraper import GuestArchive
 
 # Configurazione logging
 logging.basicConfig(
@@ -23,62 +44,216 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Item per pagina Spotify (massimo consentito)
+SPOTIFY_PAGE_SIZE = 50
+
+# Pagine in attesa di parsing: oltre, il download si ferma finché il parsing non recupera
+PAGES_QUEUE_SIZE = 8
+
+# Fine di una coda della pipeline
+_DONE = None
+
+# Campi da cui dipende la classificazione: se cambiano l'episodio viene rielaborato
+CONTENT_FIELDS = ('Titolo', 'Description')
+
+# Campi della classificazione che un episodio modificato può aggiornare
+CLASSIFIED_FIELDS = ('Id', 'Part', 'Category', 'Guest', 'Shownotes')
+
+# Colonne della tabella episodes di SQLite → colonne del CSV
+SQLITE_COLUMNS = {
+    'episode_id': 'Id',
+    'part': 'Part',
+    'title': 'Titolo',
+    'description': 'Description',
+    'category': 'Category',
+    'guest': 'Guest',
+    'spotify_url': 'Spotify_URL',
+    'shownotes_url': 'Shownotes',
+    'gpt': 'GPT',
+    'subtitle': 'Sottotitolo'
+}
+
+# Titoli mostrati per ogni voce del report delle differenze
+DIFF_SAMPLES = 5
+
+
+def _normalized(value):
+    """Valore confrontabile tra CSV, SQLite e Spotify (vuoti e segnaposto coincidono)"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    value = str(value)
+    return '' if value == '*' else value
+
+
+def content_hash(episode: dict) -> str:
+    """Hash dei campi di contenuto (CONTENT_FIELDS) di un episodio"""
+    payload = json.dumps([_normalized(episode.get(field)) for field in CONTENT_FIELDS], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _write_csv(df: pd.DataFrame, path: Path):
+    """Scrive un CSV in un file temporaneo e lo sostituisce all'originale in un colpo solo"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    df.to_csv(tmp_path, index=False, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _sql_text(value, default: str = '*') -> str:
+    """Testo per SQLite (NaN del CSV → segnaposto)"""
+    return default if value is None or pd.isna(value) else str(value)
+
+
+def _episode_params(row) -> tuple:
+    """Parametri di un episodio, nell'ordine delle colonne SQLITE_COLUMNS"""
+    return (
+        int(row['Id']),
+        int(row['Part']),
+        str(row['Titolo']),
+        _sql_text(row['Description'], default=''),
+        _sql_text(row['Category']),
+        _sql_text(row['Guest']),
+        str(row['Spotify_URL']),
+        _sql_text(row['Shownotes']),
+        _sql_text(row.get('GPT')),
+        _sql_text(row.get('Sottotitolo'))
+    )
+
 
 class EpisodeRescraper:
     """Gestisce il rescraping completo degli episodi"""
     
-    def __init__(self):
+    def __init__(self, use_llm: bool = False):
         self.config = Config()
+        self.use_llm = use_llm
         self.spotify = SpotifyService(self.config)
-        self.scraper = WebScraper()
+        self.scraper = self.spotify.scraper
+        self.state = RescrapeState(self.config)
         
-        # Dataframe per raccogliere episodi
-        self.episodes = []
-        self.pills = []
+        # Rate limit per servizio esterno (il sito è limitato dal WebScraper),
+        # creati a ogni esecuzione della pipeline (asyncio.run)
+        self.spotify_bucket = None
+        self.llm_bucket = None
         
     def fetch_all_from_spotify(self, show_url: str, is_pills: bool = False) -> list:
         """
         Scarica TUTTI gli episodi da uno show Spotify
-        Gestisce automaticamente la paginazione
+        Gestisce automaticamente la paginazione (pagine in parallelo)
         """
         logger.info(f"📡 Scaricando episodi da Spotify...")
         
-        all_items = []
-        offset = 0
-        limit = 50  # Max permesso da Spotify
-        
-        while True:
-            try:
-                # Chiamata API con offset
-                results = self.spotify.client._get(
-                    show_url,
-                    limit=limit,
-                    offset=offset,
-                    market='IT'
-                )
-                
-                items = results.get('items', [])
-                
-                if not items:
-                    break  # Finiti gli episodi
-                
-                all_items.extend(items)
-                logger.info(f"  ✓ Scaricati {len(all_items)} episodi finora...")
-                
-                # Se abbiamo meno di 'limit' items, siamo all'ultima pagina
-                if len(items) < limit:
-                    break
-                
-                offset += limit
-                time.sleep(0.5)  # Rate limiting gentile
-                
-            except Exception as e:
-                logger.error(f"Errore durante download: {e}")
-                break
+        all_items = [item for _, item in asyncio.run(self._collect_items(show_url))]
         
         logger.info(f"✅ Totale episodi scaricati: {len(all_items)}")
         return all_items
     
+    def _reset_rate_limits(self):
+        """Token bucket nuovi per l'event loop corrente"""
+        self.spotify_bucket = AsyncTokenBucket(self.config.RESCRAPE_SPOTIFY_RATE_PER_SECOND)
+        self.llm_bucket = AsyncTokenBucket(self.config.RESCRAPE_LLM_RATE_PER_SECOND)
+    
+    async def _collect_items(self, show_url: str) -> list:
+        """Tutti gli item di uno show come (posizione, item), nell'ordine di Spotify"""
+        self._reset_rate_limits()
+        pages = asyncio.Queue(maxsize=PAGES_QUEUE_SIZE)
+        items = []
+        
+        async def collect():
+            while True:
+                page = await pages.get()
+                if page is _DONE:
+                    return
+                items.extend(page)
+        
+        await asyncio.gather(self._stream_pages(show_url, pages), collect())
+        return sorted(items, key=lambda entry: entry[0])
+    
+    async def _stream_pages(self, show_url: str, pages: asyncio.Queue):
+        """
+        Scarica le pagine di uno show e le mette in coda appena arrivano,
+        come liste di (posizione, item). La prima pagina dà il totale, le altre
+        vengono scaricate in parallelo (RESCRAPE_SPOTIFY_CONCURRENCY), tranne
+        quelle già salvate da un'esecuzione interrotta.
+        Solleva eccezioni se Spotify non risponde dopo i retry o restituisce
+        una pagina incompleta: meglio fermarsi che salvare un catalogo parziale.
+        """
+        # La prima pagina si scarica sempre: dice se lo show è cambiato
+        first = await self._fetch_spotify_page(show_url, 0)
+        total = first.get('total') or 0
+        self.state.start_show(show_url, total)
+        self._check_page(first, 0, total)
+        self.state.save_page(show_url, 0, first.get('items') or [])
+        await pages.put(self._positioned_items(first, 0))
+        
+        offsets = asyncio.Queue()
+        resumed = 0
+        for offset in range(SPOTIFY_PAGE_SIZE, total, SPOTIFY_PAGE_SIZE):
+            items = self.state.get_page(show_url, offset)
+            if items is None:
+                offsets.put_nowait(offset)
+                continue
+            
+            resumed += 1
+            await pages.put(self._positioned_items({'items': items}, offset))
+        
+        logger.info(
+            f"  ✓ {total} item su Spotify, {offsets.qsize() + resumed + 1} pagine"
+            + (f" ({resumed} già salvate)" if resumed else "")
+        )
+        
+        errors = []
+        
+        async def worker():
+            # Dopo un errore nessuna pagina nuova, ma quelle in corso vengono salvate
+            while not errors:
+                try:
+                    offset = offsets.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                
+                try:
+                    page = await self._fetch_spotify_page(show_url, offset)
+                    self._check_page(page, offset, total)
+                except Exception as e:
+                    errors.append(e)
+                    return
+                
+                self.state.save_page(show_url, offset, page.get('items') or [])
+                await pages.put(self._positioned_items(page, offset))
+        
+        workers = min(self.config.RESCRAPE_SPOTIFY_CONCURRENCY, offsets.qsize())
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if errors:
+            raise errors[0]
+        await pages.put(_DONE)
+    
+    async def _fetch_spotify_page(self, show_url: str, offset: int) -> dict:
+        """Una pagina dello show, nel rispetto del rate limit Spotify (con retry)"""
+        await self.spotify_bucket.acquire()
+        return await self.spotify._call_with_retry(
+            self.spotify._fetch_page, show_url, SPOTIFY_PAGE_SIZE, offset
+        )
+    
+    @staticmethod
+    def _check_page(page: dict, offset: int, total: int):
+        """Solleva un'eccezione se la pagina ha meno item di quanti ne indica il totale"""
+        expected = min(SPOTIFY_PAGE_SIZE, total - offset)
+        received = len(page.get('items') or [])
+        if received < expected:
+            raise RuntimeError(
+                f"Pagina Spotify incompleta (offset {offset}: {received}/{expected} item)"
+            )
+    
+    @staticmethod
+    def _positioned_items(page: dict, offset: int) -> list:
+        """Item di una pagina con la loro posizione nello show (null = non disponibile nel market)"""
+        return [
+            (offset + index, item)
+            for index, item in enumerate(page.get('items') or [])
+            if item
+        ]
+    
     def parse_episode_from_spotify(self, item: dict) -> dict:
         """Parse singolo episodio da risposta Spotify"""
         try:
@@ -87,18 +262,13 @@ class EpisodeRescraper:
             if title.startswith('Office of Cards -'):
                 title = title.replace('Office of Cards -', '').strip()
             
-            # Parse ID e Part
-            episode_id, part = self.spotify._parse_id_part(title)
-            
-            # Estrai categoria
-            category = self.spotify._extract_category(title, episode_id)
-            
+            # Id, parte e categoria arrivano dalla classificazione (regole ed eventuale LLM)
             episode_data = {
-                'Id': episode_id,
-                'Part': part,
+                'Id': -1,
+                'Part': 1,
                 'Titolo': title,
                 'Description': item.get('description', ''),
-                'Category': category,
+                'Category': '*',
                 'Guest': '*',  # Da aggiornare con scraping
                 'Spotify_URL': item.get('external_urls', {}).get('spotify', ''),
                 'Shownotes': '*',  # Da aggiornare con scraping
@@ -133,68 +303,226 @@ class EpisodeRescraper:
             logger.error(f"Errore parsing pillola: {e}")
             return None
     
-    def enrich_with_shownotes(self, episodes: list) -> list:
+    @staticmethod
+    def _apply_classification(episode: dict, fields: dict):
         """
-        Arricchisce episodi con dati da shownotes
-        Fa scraping del sito per ogni episodio
+        Scrive sull'episodio i campi della classificazione (regole, completate
+        dall'LLM): sono l'unica fonte di Id, parte, categoria e ospite, anche
+        quando valgono -1 o '*'
         """
-        logger.info("🌐 Arricchendo episodi con shownotes...")
-        
-        enriched = []
-        total = len(episodes)
+        episode.update({field: fields[field] for field in CLASSIFIED_FIELDS if field in fields})
+    
+    @staticmethod
+    def _apply_shownotes(episode: dict, archive: GuestArchive):
+        """
+        Shownotes e ospite dall'archivio del sito (una ricerca nell'indice)
+        Se il sito non ha l'episodio restano i valori della classificazione
+        """
+        episode_id = episode.get('Id')
+        if not episode_id or episode_id <= 0:
+            return
         
-        for idx, episode in enumerate(episodes, 1):
-            episode_id = episode.get('Id')
+        entry = archive.index.get(episode_id)
+        if entry is not None:
+            merge_known(episode, {'Shownotes': entry.url, 'Guest': entry.guest})
+    
+    def load_catalog(self, from_sqlite: bool = False) -> dict:
+        """
+        Episodi già salvati, per URL Spotify (vuoto se il database non esiste)
+        Legge il CSV del bot oppure la tabella episodes di SQLite
+        """
+        db_path = self.config.DATA_DIR / 'bot.db'
+        if from_sqlite:
+            if not db_path.exists():
+                return {}
+            conn = sqlite3.connect(db_path)
+            columns = ', '.join(f'{column} AS {name}' for column, name in SQLITE_COLUMNS.items())
+            df = pd.read_sql_query(f'SELECT {columns} FROM episodes', conn)
+            conn.close()
+        else:
+            if not self.config.DB_PATH.exists():
+                return {}
+            df = pd.read_csv(self.config.DB_PATH, encoding='utf-8')
+        
+        catalog = {
+            row['Spotify_URL']: row
+            for row in df.to_dict('records')
+            if _normalized(row.get('Spotify_URL'))
+        }
+        logger.info(f"📚 Catalogo esistente: {len(catalog)} episodi ({'SQLite' if from_sqlite else 'CSV'})")
+        return catalog
+    
+    @staticmethod
+    def _merge_stored(episode: dict, stored: dict, changed: bool) -> dict:
+        """
+        Episodio da Spotify unito alla sua versione nel catalogo
+        Non modificato: restano i valori salvati (GPT, sottotitolo, correzioni).
+        Modificato: contenuto nuovo e classificazione nuova dove informativa.
+        """
+        merged = {**episode, **stored}
+        if changed:
+            merge_known(merged, {field: episode[field] for field in CLASSIFIED_FIELDS})
+            merged.update({field: episode[field] for field in CONTENT_FIELDS})
+        return merged
+    
+    async def _episodes_pipeline(self, catalog: dict = None) -> list:
+        """
+        Pipeline degli episodi:
+        1. pagine Spotify scaricate in parallelo (coda limitata a PAGES_QUEUE_SIZE)
+           e, nel frattempo, archivio ospiti del sito
+        2. parsing e classificazione a regole appena arriva una pagina; con use_llm
+           gli episodi incerti vanno in blocchi da ENRICHMENT_BATCH_SIZE
+        3. ENRICHMENT_BATCH_CONCURRENCY worker LLM, una richiesta per blocco
+           (max RESCRAPE_LLM_RATE_PER_SECOND richieste/s)
+        Le shownotes sono una ricerca nell'archivio appena un episodio è classificato.
+        
+        Gli episodi già elaborati da un'esecuzione interrotta vengono ripresi
+        da RescrapeState; quelli nuovi vengono salvati per pagina o per blocco
+        LLM (non quelli per cui l'LLM non ha risposto: verranno ritentati).
+        Solleva eccezioni se Spotify o il sito non rispondono.
+        
+        Con un catalogo (modalità incrementale) gli episodi con lo stesso hash
+        del contenuto saltano regole e LLM e mantengono i valori salvati.
+        
+        Returns:
+            Episodi nell'ordine di Spotify
+        """
+        self._reset_rate_limits()
+        batch_size = max(1, self.config.ENRICHMENT_BATCH_SIZE)
+        workers = max(1, self.config.ENRICHMENT_BATCH_CONCURRENCY)
+        pages = asyncio.Queue(maxsize=PAGES_QUEUE_SIZE)
+        llm_batches = asyncio.Queue(maxsize=workers * 2)
+        done = []  # (posizione, episodio)
+        archive_task = None
+        
+        catalog = catalog or {}
+        stored_hashes = {url: content_hash(stored) for url, stored in catalog.items()}
+        
+        saved = self.state.load_episodes(self.use_llm)
+        if saved:
+            logger.info(f"♻️  {len(saved)} episodi già elaborati in un'esecuzione precedente")
+        
+        def unchanged(episode: dict) -> bool:
+            return stored_hashes.get(episode['Spotify_URL']) == content_hash(episode)
+        
+        def finish(position: int, episode: dict, archive: GuestArchive) -> dict:
+            stored = catalog.get(episode['Spotify_URL'])
+            if stored is not None:
+                episode = self._merge_stored(episode, stored, changed=not unchanged(episode))
+            self._apply_shownotes(episode, archive)
+            done.append((position, episode))
+            return episode
+        
+        async def parse():
+            archive = await archive_task
+            batch = []
             
-            if episode_id and episode_id > 0:
-                logger.info(f"  [{idx}/{total}] Episodio {episode_id}: {episode.get('Titolo', '')[:50]}...")
-                
-                # Scraping shownotes e guest
-                shownotes_url, guest_name = self.scraper.get_shownotes_and_guest(episode_id)
+            while True:
+                page = await pages.get()
+                if page is _DONE:
+                    break
                 
-                episode['Shownotes'] = shownotes_url
-                episode['Guest'] = guest_name
+                finished = []
+                for position, item in page:
+                    url = item.get('external_urls', {}).get('spotify', '')
+                    if url in saved:
+                        done.append((position, saved[url]))
+                        continue
+                    
+                    episode = self.parse_episode_from_spotify(item)
+                    if not episode:
+                        continue
+                    
+                    # Già nel catalogo con lo stesso contenuto: niente da riclassificare
+                    if unchanged(episode):
+                        finish(position, episode, archive)
+                        continue
+                    
+                    fields, uncertain = self.spotify.classify_by_rules(
+                        episode['Titolo'], episode['Description'], archive.entries
+                    )
+                    self._apply_classification(episode, fields)
+                    if not uncertain or not self.use_llm:
+                        finished.append(finish(position, episode, archive))
+                        continue
+                    
+                    batch.append((position, episode, fields, *uncertain))
+                    if len(batch) >= batch_size:
+                        await llm_batches.put(batch)
+                        batch = []
                 
-                # Rate limiting - pausa tra richieste
-                time.sleep(1)
-            else:
-                logger.warning(f"  [{idx}/{total}] Episodio senza ID valido: {episode.get('Titolo', '')[:50]}")
+                self.state.save_episodes(finished, self.use_llm)
+                logger.info(f"  ✓ {len(done)} episodi elaborati...")
             
-            enriched.append(episode)
-        
-        logger.info("✅ Arricchimento completato!")
-        return enriched
+            if batch:
+                await llm_batches.put(batch)
+            for _ in range(workers):
+                await llm_batches.put(_DONE)
+        
+        async def complete_with_llm():
+            archive = await archive_task
+            while True:
+                batch = await llm_batches.get()
+                if batch is _DONE:
+                    return
+                
+                await self.llm_bucket.acquire()
+                answered = await self.spotify.complete_with_llm([
+                    (fields, uncertain, llm_input)
+                    for _, _, fields, uncertain, llm_input in batch
+                ])
+                
+                finished = []
+                for (position, episode, fields, _, _), ok in zip(batch, answered):
+                    self._apply_classification(episode, fields)
+                    episode = finish(position, episode, archive)
+                    if ok:
+                        finished.append(episode)
+                self.state.save_episodes(finished, self.use_llm)
+                logger.info(f"  🧠 {len(batch)} episodi classificati con LLM ({len(done)} elaborati)")
+        
+        # Regole, LLM e shownotes usano lo stesso download dell'archivio ospiti,
+        # avviato subito in parallelo al download da Spotify. Se una qualsiasi
+        # pagina dell'archivio fallisce get_archive solleva l'eccezione prima che
+        # un episodio venga elaborato: nessun checkpoint senza shownotes
+        with self.scraper.request_scope():
+            archive_task = asyncio.create_task(asyncio.to_thread(self.scraper.get_archive))
+            await asyncio.gather(
+                self._stream_pages(self.config.SPOTIFY_SHOW_URL, pages),
+                parse(),
+                *(complete_with_llm() for _ in range(workers))
+            )
+        
+        return [episode for _, episode in sorted(done, key=lambda entry: entry[0])]
     
-    def scrape_all_episodes(self) -> pd.DataFrame:
-        """Scraping completo episodi principali"""
+    def scrape_all_episodes(self, catalog: dict = None) -> pd.DataFrame:
+        """
+        Scraping episodi principali
+        Con il catalogo esistente (modalità incrementale) vengono elaborati
+        solo gli episodi nuovi o modificati
+        """
         logger.info("\n" + "="*60)
         logger.info("📊 SCRAPING EPISODI PRINCIPALI")
         logger.info("="*60 + "\n")
         
-        # 1. Download da Spotify
-        items = self.fetch_all_from_spotify(self.config.SPOTIFY_SHOW_URL)
+        # 1-4. Download da Spotify, parsing, classificazione (LLM opzionale)
+        # e shownotes, in pipeline
+        mode = "con LLM" if self.use_llm else "solo regole"
+        if catalog:
+            mode += ", incrementale"
+        logger.info(f"📡 Scaricando ed elaborando episodi ({mode})...")
+        episodes = asyncio.run(self._episodes_pipeline(catalog))
         
-        if not items:
+        if not episodes:
             logger.error("❌ Nessun episodio scaricato da Spotify!")
             return pd.DataFrame()
         
-        # 2. Parse episodi
-        logger.info("🔄 Parsing episodi...")
-        episodes = []
-        for item in items:
-            episode = self.parse_episode_from_spotify(item)
-            if episode:
-                episodes.append(episode)
-        
-        logger.info(f"✅ {len(episodes)} episodi parsati")
+        logger.info(f"✅ {len(episodes)} episodi elaborati")
         
-        # 3. Arricchimento con shownotes
-        episodes = self.enrich_with_shownotes(episodes)
-        
-        # 4. Converti in DataFrame
+        # 5. Converti in DataFrame
         df = pd.DataFrame(episodes)
         
-        # 5. Ordina per ID e Part
+        # 6. Ordina per ID e Part
         if not df.empty:
             df = df.sort_values(['Id', 'Part'], ascending=[True, True])
             df = df.reset_index(drop=True)
@@ -234,40 +562,129 @@ class EpisodeRescraper:
         
         return df
     
+    def diff_catalog(self, df_episodes: pd.DataFrame, catalog: dict) -> dict:
+        """
+        Confronta gli episodi con il catalogo salvato (per URL Spotify)
+        
+        Returns:
+            Dict con liste di episodi: added, changed, unchanged e missing
+            (nel catalogo ma non più su Spotify: vengono mantenuti)
+        """
+        diff = {'added': [], 'changed': [], 'unchanged': [], 'missing': []}
+        
+        for episode in df_episodes.to_dict('records'):
+            stored = catalog.get(episode['Spotify_URL'])
+            if stored is None:
+                diff['added'].append(episode)
+            elif any(_normalized(episode.get(field)) != _normalized(value) for field, value in stored.items()):
+                diff['changed'].append(episode)
+            else:
+                diff['unchanged'].append(episode)
+        
+        urls = set(df_episodes['Spotify_URL'])
+        diff['missing'] = [stored for url, stored in catalog.items() if url not in urls]
+        return diff
+    
+    def print_diff_report(self, diff: dict):
+        """Report delle differenze con il catalogo"""
+        logger.info("\n" + "="*60)
+        logger.info("🔍 DIFFERENZE CON IL CATALOGO")
+        logger.info("="*60)
+        
+        sections = [
+            ('added', "🆕 Nuovi"),
+            ('changed', "✏️  Modificati"),
+            ('unchanged', "✅ Invariati"),
+            ('missing', "⚠️  Solo nel catalogo (non più su Spotify, mantenuti)")
+        ]
+        for key, label in sections:
+            episodes = diff[key]
+            if key == 'missing' and not episodes:
+                continue
+            
+            logger.info(f"  {label}: {len(episodes)}")
+            if key == 'unchanged':
+                continue
+            for episode in episodes[:DIFF_SAMPLES]:
+                logger.info(f"    - ID {episode['Id']}: {str(episode['Titolo'])[:60]}")
+            if len(episodes) > DIFF_SAMPLES:
+                logger.info(f"    ... e altri {len(episodes) - DIFF_SAMPLES}")
+        
+        logger.info("="*60 + "\n")
+    
+    def _backup(self, path: Path, prefix: str):
+        """Copia di sicurezza di un file esistente in DATA_DIR"""
+        if not path.exists():
+            return
+        
+        import shutil
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup = self.config.DATA_DIR / f'{prefix}_backup_{timestamp}{path.suffix}'
+        logger.info(f"📦 Backup vecchio {path.name} → {backup.name}")
+        shutil.copy(path, backup)
+    
     def save_to_csv(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame):
-        """Salva DataFrame in CSV"""
+        """Salva DataFrame in CSV (ogni file viene sostituito in un colpo solo)"""
         logger.info("\n" + "="*60)
         logger.info("💾 SALVATAGGIO DATI")
         logger.info("="*60 + "\n")
         
         # Backup vecchi file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        if self.config.DB_PATH.exists():
-            backup_db = self.config.DATA_DIR / f'db_backup_{timestamp}.csv'
-            logger.info(f"📦 Backup vecchio db.csv → {backup_db.name}")
-            import shutil
-            shutil.copy(self.config.DB_PATH, backup_db)
-        
-        if self.config.PILLS_PATH.exists():
-            backup_pills = self.config.DATA_DIR / f'pills_backup_{timestamp}.csv'
-            logger.info(f"📦 Backup vecchio pills.csv → {backup_pills.name}")
-            import shutil
-            shutil.copy(self.config.PILLS_PATH, backup_pills)
+        self._backup(self.config.DB_PATH, 'db')
+        self._backup(self.config.PILLS_PATH, 'pills')
         
         # Salva nuovi file
         logger.info(f"💾 Salvando {len(df_episodes)} episodi...")
-        df_episodes.to_csv(self.config.DB_PATH, index=False, encoding='utf-8')
+        _write_csv(df_episodes, self.config.DB_PATH)
         logger.info(f"✅ Salvato: {self.config.DB_PATH}")
         
         logger.info(f"💾 Salvando {len(df_pills)} pillole...")
-        df_pills.to_csv(self.config.PILLS_PATH, index=False, encoding='utf-8')
+        _write_csv(df_pills, self.config.PILLS_PATH)
         logger.info(f"✅ Salvato: {self.config.PILLS_PATH}")
     
-    def save_to_sqlite(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame):
-        """Salva DataFrame in SQLite"""
-        import sqlite3
+    def save_incremental_csv(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame, diff: dict):
+        """
+        Aggiorna il CSV con gli episodi nuovi o modificati
+        Le righe non più su Spotify restano; il file viene riscritto solo se
+        qualcosa è cambiato, con sostituzione atomica
+        """
+        logger.info("\n" + "="*60)
+        logger.info("💾 SALVATAGGIO INCREMENTALE CSV")
+        logger.info("="*60 + "\n")
         
+        if diff['added'] or diff['changed']:
+            current = pd.DataFrame()
+            if self.config.DB_PATH.exists():
+                current = pd.read_csv(self.config.DB_PATH, encoding='utf-8')
+            
+            kept = current
+            if not current.empty:
+                kept = current[~current['Spotify_URL'].isin(df_episodes['Spotify_URL'])]
+            
+            columns = list(current.columns) + [c for c in df_episodes.columns if c not in current.columns]
+            df = pd.concat([df_episodes, kept], ignore_index=True)[columns]
+            df = df.sort_values(['Id', 'Part'], ascending=[True, True]).reset_index(drop=True)
+            
+            self._backup(self.config.DB_PATH, 'db')
+            logger.info(
+                f"💾 Aggiornando {len(diff['added'])} nuovi e {len(diff['changed'])} "
+                f"modificati ({len(df)} episodi nel file)..."
+            )
+            _write_csv(df, self.config.DB_PATH)
+            logger.info(f"✅ Salvato: {self.config.DB_PATH}")
+        else:
+            logger.info(f"✅ {self.config.DB_PATH.name} già aggiornato, nessuna scrittura")
+        
+        logger.info(f"💾 Salvando {len(df_pills)} pillole...")
+        _write_csv(df_pills, self.config.PILLS_PATH)
+        logger.info(f"✅ Salvato: {self.config.PILLS_PATH}")
+    
+    def save_to_sqlite(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame):
+        """
+        Salva DataFrame in SQLite
+        Svuotamento e reinserimento avvengono in un'unica transazione: in caso
+        di errore il database resta com'era
+        """
         logger.info("\n" + "="*60)
         logger.info("💾 SALVATAGGIO IN SQLITE")
         logger.info("="*60 + "\n")
@@ -275,61 +692,114 @@ class EpisodeRescraper:
         db_path = self.config.DATA_DIR / 'bot.db'
         
         # Backup database esistente
-        if db_path.exists():
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_db = self.config.DATA_DIR / f'bot_backup_{timestamp}.db'
-            logger.info(f"📦 Backup vecchio database → {backup_db.name}")
-            import shutil
-            shutil.copy(db_path, backup_db)
-        
-        # Connessione
-        conn = sqlite3.connect(db_path)
+        self._backup(db_path, 'bot')
         
-        # Svuota tabelle esistenti
-        logger.info("🗑️  Svuotando tabelle esistenti...")
-        conn.execute('DELETE FROM episodes')
-        conn.execute('DELETE FROM pills')
-        conn.commit()
-        
-        # Inserisci episodi
-        logger.info(f"💾 Inserendo {len(df_episodes)} episodi...")
-        for _, row in df_episodes.iterrows():
-            conn.execute('''
-                INSERT INTO episodes 
-                (episode_id, part, title, description, category, guest, 
-                 spotify_url, shownotes_url, gpt, subtitle)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                int(row['Id']),
-                int(row['Part']),
-                str(row['Titolo']),
-                str(row['Description']),
-                str(row['Category']),
-                str(row['Guest']),
-                str(row['Spotify_URL']),
-                str(row['Shownotes']),
-                str(row.get('GPT', '*')),
-                str(row.get('Sottotitolo', '*'))
-            ))
-        
-        # Inserisci pillole
-        logger.info(f"💾 Inserendo {len(df_pills)} pillole...")
-        for _, row in df_pills.iterrows():
-            conn.execute('''
+        conn = sqlite3.connect(db_path)
+        try:
+            logger.info("🗑️  Sostituendo i dati delle tabelle...")
+            conn.execute('DELETE FROM episodes')
+            conn.execute('DELETE FROM pills')
+            
+            # Inserisci episodi
+            logger.info(f"💾 Inserendo {len(df_episodes)} episodi...")
+            conn.executemany(f'''
+                INSERT INTO episodes ({', '.join(SQLITE_COLUMNS)})
+                VALUES ({', '.join('?' for _ in SQLITE_COLUMNS)})
+            ''', [_episode_params(row) for row in df_episodes.to_dict('records')])
+            
+            # Inserisci pillole
+            logger.info(f"💾 Inserendo {len(df_pills)} pillole...")
+            conn.executemany('''
                 INSERT INTO pills (episode_id, title, description, spotify_url)
                 VALUES (?, ?, ?, ?)
-            ''', (
-                int(row['Id']) if pd.notna(row['Id']) else None,
-                str(row['Titolo']),
-                str(row['Description']),
-                str(row['Spotify_URL'])
-            ))
-        
-        conn.commit()
-        conn.close()
+            ''', [self._pill_params(row) for row in df_pills.to_dict('records')])
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         
         logger.info(f"✅ Database salvato: {db_path}")
     
+    def upsert_sqlite(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame):
+        """
+        Aggiorna SQLite con i soli episodi nuovi o modificati (UPSERT per URL
+        Spotify) e le pillole (UPSERT per titolo), in un'unica transazione.
+        Le differenze sono calcolate sul contenuto attuale di SQLite.
+        """
+        logger.info("\n" + "="*60)
+        logger.info("💾 SALVATAGGIO INCREMENTALE IN SQLITE")
+        logger.info("="*60 + "\n")
+        
+        db_path = self.config.DATA_DIR / 'bot.db'
+        if not db_path.exists():
+            logger.error("❌ Database SQLite non trovato: crealo con migrate_csv_sql.py")
+            return
+        
+        diff = self.diff_catalog(df_episodes, self.load_catalog(from_sqlite=True))
+        rows = diff['added'] + diff['changed']
+        if rows:
+            self._backup(db_path, 'bot')
+        
+        assignments = ', '.join(f'{column} = ?' for column in SQLITE_COLUMNS)
+        written = 0
+        skipped = []
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            for row in rows:
+                params = _episode_params(row)
+                try:
+                    cursor = conn.execute(
+                        f'UPDATE episodes SET {assignments} WHERE spotify_url = ?',
+                        params + (row['Spotify_URL'],)
+                    )
+                    if not cursor.rowcount:
+                        conn.execute(f'''
+                            INSERT INTO episodes ({', '.join(SQLITE_COLUMNS)})
+                            VALUES ({', '.join('?' for _ in SQLITE_COLUMNS)})
+                        ''', params)
+                    written += 1
+                except sqlite3.IntegrityError:
+                    # UNIQUE(episode_id, part): un altro URL ha già lo stesso ID e parte
+                    skipped.append(row)
+            
+            conn.executemany('''
+                INSERT INTO pills (episode_id, title, description, spotify_url)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(title) DO UPDATE SET
+                    episode_id = excluded.episode_id,
+                    description = excluded.description,
+                    spotify_url = excluded.spotify_url
+            ''', [self._pill_params(row) for row in df_pills.to_dict('records')])
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        logger.info(f"✅ Episodi scritti: {written} (invariati: {len(diff['unchanged'])})")
+        if skipped:
+            logger.warning(f"⚠️  {len(skipped)} episodi saltati: ID e parte già usati da un altro episodio")
+            for row in skipped[:DIFF_SAMPLES]:
+                logger.info(f"    - ID {row['Id']} parte {row['Part']}: {str(row['Titolo'])[:60]}")
+        logger.info(f"✅ Pillole aggiornate: {len(df_pills)}")
+        logger.info(f"✅ Database aggiornato: {db_path}")
+    
+    @staticmethod
+    def _pill_params(row: dict) -> tuple:
+        """Parametri di una pillola per la tabella pills"""
+        return (
+            int(row['Id']) if pd.notna(row['Id']) else None,
+            str(row['Titolo']),
+            _sql_text(row['Description'], default=''),
+            str(row['Spotify_URL'])
+        )
+    
     def generate_report(self, df_episodes: pd.DataFrame, df_pills: pd.DataFrame):
         """Genera report finale"""
         logger.info("\n" + "="*60)
@@ -378,9 +848,9 @@ def main():
     print("  1. Scarica TUTTI gli episodi da Spotify")
     print("  2. Fa scraping delle shownotes dal sito")
     print("  3. Crea backup dei dati esistenti")
-    print("  4. Sovrascrive il database con dati puliti")
+    print("  4. Aggiorna il database (solo le differenze o tutto)")
     print()
-    print("⏱️  Tempo stimato: 5-15 minuti (dipende dal numero di episodi)")
+    print("⏱️  Tempo stimato: 1-2 minuti (dipende dal numero di episodi)")
     print()
     
     # Chiedi conferma
@@ -398,29 +868,70 @@ def main():
     
     format_choice = input("\nScegli (1/2/3): ").strip()
     
+    # Classificazione LLM: utile per episodi senza numero o categoria nel titolo
+    use_llm = input("\nUsare l'LLM per classificare gli episodi incerti? (s/n): ").strip().lower()
+    use_llm = use_llm in ['s', 'si', 'sì', 'y', 'yes']
+    
+    # Modalità: incrementale rielabora e scrive solo le differenze col catalogo
+    print("\nModalità:")
+    print("  1. Incrementale (solo episodi nuovi o modificati, consigliata)")
+    print("  2. Completa (rielabora e riscrive tutto)")
+    
+    incremental = input("\nScegli (1/2) [1]: ").strip() != '2'
+    
     # Inizio rescraping
     print("\n🚀 Inizio rescraping...\n")
     start_time = time.time()
     
     try:
-        scraper = EpisodeRescraper()
+        scraper = EpisodeRescraper(use_llm=use_llm)
+        
+        # Ripresa di un rescrape interrotto
+        progress = scraper.state.progress()
+        if progress['pages'] or progress['episodes']:
+            print(
+                f"♻️  Trovato un rescrape interrotto: {progress['pages']} pagine e "
+                f"{progress['episodes']} episodi già salvati"
+            )
+            resume = input("Riprendere da lì? (s/n): ").strip().lower()
+            if resume not in ['s', 'si', 'sì', 'y', 'yes']:
+                scraper.state.clear()
+                print("🗑️  Stato precedente cancellato, si riparte da zero\n")
+        
+        # Catalogo di riferimento per la modalità incrementale (SQLite solo se è l'unico formato)
+        catalog = None
+        if incremental:
+            catalog = scraper.load_catalog(from_sqlite=format_choice == '2')
         
         # Scraping episodi
-        df_episodes = scraper.scrape_all_episodes()
+        df_episodes = scraper.scrape_all_episodes(catalog)
         
         if df_episodes.empty:
             logger.error("❌ Nessun episodio scaricato! Operazione interrotta.")
             return
         
+        if incremental:
+            diff = scraper.diff_catalog(df_episodes, catalog)
+            scraper.print_diff_report(diff)
+        
         # Scraping pillole
         df_pills = scraper.scrape_all_pills()
         
         # Salvataggio
         if format_choice in ['1', '3']:
-            scraper.save_to_csv(df_episodes, df_pills)
+            if incremental:
+                scraper.save_incremental_csv(df_episodes, df_pills, diff)
+            else:
+                scraper.save_to_csv(df_episodes, df_pills)
         
         if format_choice in ['2', '3']:
-            scraper.save_to_sqlite(df_episodes, df_pills)
+            if incremental:
+                scraper.upsert_sqlite(df_episodes, df_pills)
+            else:
+                scraper.save_to_sqlite(df_episodes, df_pills)
+        
+        # Dati salvati: il prossimo rescrape riparte da zero
+        scraper.state.clear()
         
         # Report finale
         scraper.generate_report(df_episodes, df_pills)
@@ -442,9 +953,11 @@ def main():
         
     except KeyboardInterrupt:
         print("\n\n❌ Operazione interrotta dall'utente.")
+        print("💾 Progressi salvati: rilancia lo script per riprendere.")
     except Exception as e:
         logger.error(f"\n❌ Errore durante il rescraping: {e}", exc_info=True)
-        print("\n💡 Suggerimento: I backup sono stati creati, puoi ripristinarli se necessario.")
+        print("\n💾 Progressi salvati: rilancia lo script per riprendere da dove si è fermato.")
+        print("💡 Suggerimento: I backup sono stati creati, puoi ripristinarli se necessario.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+"""
+Stato persistente del rescrape
+
+Ogni pagina Spotify scaricata e ogni episodio elaborato (classificazione e
+shownotes) vengono salvati appena pronti. Se il rescrape si interrompe
+(rete, LLM, Ctrl+C) la successiva esecuzione riparte da qui: le pagine già
+scaricate non vengono richieste di nuovo e gli episodi già elaborati non
+ripassano da regole e LLM. Lo stato viene cancellato a salvataggio completato.
+"""
+
+import json
+import logging
+import sqlite3
+from threading import Lock
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Campi degli item Spotify usati dal parsing (il resto non viene salvato)
+ITEM_FIELDS = ('name', 'description', 'external_urls', 'release_date')
+
+
+class RescrapeState:
+    """
+    Checkpoint per pagina e per episodio del rescrape
+
+    Args:
+        config: Configurazione (usa RESCRAPE_STATE_PATH)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = Lock()
+        self.db_path = self.config.RESCRAPE_STATE_PATH
+        self._init_database()
+
+    def _init_database(self):
+        """Crea tabelle se non esistono"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS rescrape_shows (
+                        show_url TEXT PRIMARY KEY,
+                        total INTEGER NOT NULL
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS rescrape_pages (
+                        show_url TEXT NOT NULL,
+                        page_offset INTEGER NOT NULL,
+                        items TEXT NOT NULL,
+                        saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (show_url, page_offset)
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS rescrape_episodes (
+                        spotify_url TEXT PRIMARY KEY,
+                        episode TEXT NOT NULL,
+                        use_llm INTEGER NOT NULL,
+                        saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error initializing rescrape state: {e}", exc_info=True)
+                raise
+
+    def start_show(self, show_url: str, total: int):
+        """
+        Registra il totale di item di uno show
+        Se è cambiato dall'ultima esecuzione (episodi usciti o rimossi) gli
+        offset non corrispondono più: le pagine salvate vengono scartate
+        """
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute('SELECT total FROM rescrape_shows WHERE show_url = ?', (show_url,)).fetchone()
+            if row is not None and row[0] != total:
+                conn.execute('DELETE FROM rescrape_pages WHERE show_url = ?', (show_url,))
+                logger.info(f"🔄 Show changed ({row[0]} → {total} items), saved pages discarded")
+            conn.execute(
+                'INSERT OR REPLACE INTO rescrape_shows (show_url, total) VALUES (?, ?)',
+                (show_url, total)
+            )
+            conn.commit()
+            conn.close()
+
+    def get_page(self, show_url: str, offset: int) -> Optional[List[Dict]]:
+        """Item salvati di una pagina, se presente"""
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            'SELECT items FROM rescrape_pages WHERE show_url = ? AND page_offset = ?',
+            (show_url, offset)
+        ).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def save_page(self, show_url: str, offset: int, items: List[Optional[Dict]]):
+        """Salva gli item di una pagina (solo i campi in ITEM_FIELDS)"""
+        compact = [
+            {field: item.get(field) for field in ITEM_FIELDS} if item else None
+            for item in items
+        ]
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                INSERT OR REPLACE INTO rescrape_pages (show_url, page_offset, items)
+                VALUES (?, ?, ?)
+            ''', (show_url, offset, json.dumps(compact, ensure_ascii=False)))
+            conn.commit()
+            conn.close()
+
+    def load_episodes(self, use_llm: bool) -> Dict[str, Dict]:
+        """
+        Episodi già elaborati, per URL Spotify
+        Con use_llm vengono ignorati quelli elaborati senza LLM
+        """
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            'SELECT spotify_url, episode FROM rescrape_episodes WHERE use_llm >= ?',
+            (int(use_llm),)
+        ).fetchall()
+        conn.close()
+        return {url: json.loads(episode) for url, episode in rows}
+
+    def save_episodes(self, episodes: List[Dict], use_llm: bool):
+        """Salva episodi elaborati (una transazione per blocco)"""
+        if not episodes:
+            return
+
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT OR REPLACE INTO rescrape_episodes (spotify_url, episode, use_llm)
+                VALUES (?, ?, ?)
+            ''', [
+                (episode['Spotify_URL'], json.dumps(episode, ensure_ascii=False), int(use_llm))
+                for episode in episodes
+            ])
+            conn.commit()
+            conn.close()
+
+    def progress(self) -> Dict[str, int]:
+        """Pagine ed episodi salvati"""
+        conn = sqlite3.connect(self.db_path)
+        pages = conn.execute('SELECT COUNT(*) FROM rescrape_pages').fetchone()[0]
+        episodes = conn.execute('SELECT COUNT(*) FROM rescrape_episodes').fetchone()[0]
+        conn.close()
+        return {'pages': pages, 'episodes': episodes}
+
+    def clear(self):
+        """Cancella lo stato (rescrape completato o ripartenza da zero)"""
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('DELETE FROM rescrape_shows')
+            conn.execute('DELETE FROM rescrape_pages')
+            conn.execute('DELETE FROM rescrape_episodes')
+            conn.commit()
+            conn.close()
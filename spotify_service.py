@@ -2,23 +2,55 @@
 Servizio per interagire con Spotify API
 """
 
+import asyncio
 import logging
-from typing import Optional, Dict, Tuple
+import random
+from typing import Optional, Dict, List, Set, Tuple
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.exceptions import SpotifyException
 import requests
-from bs4 import BeautifulSoup
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+
+from enrichment_cache import EnrichmentCache
+from episode_rules import Guess, extract_fields, low_confidence_fields, is_informative
+from http_cache import HttpCache
+from http_client import HttpClient
+from llm_client import ENRICHMENT_PROMPT_VERSION, EnrichmentClient
+from token_cache import SqliteTokenCache
+from web_scraper import GuestEntry, WebScraper
 
 logger = logging.getLogger(__name__)
 
+# Status HTTP per cui ha senso ritentare
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+# Sync incrementale: la prima pagina è piccola (di solito c'è al massimo un
+# episodio nuovo), le successive usano il massimo consentito da Spotify
+FIRST_PAGE_SIZE = 5
+PAGE_SIZE = 50
+
+# Voci della pagina ospiti passate all'LLM: le più recenti (il nuovo episodio
+# è di solito in cima al sito) più quelle che citano ospite o numero
+GUEST_CONTEXT_LATEST = 3
+GUEST_CONTEXT_MAX = 8
+
 
 class SpotifyService:
     """Gestisce le interazioni con Spotify"""
     
-    def __init__(self, config):
+    def __init__(self, config, http_cache: Optional[HttpCache] = None,
+                 scraper: Optional[WebScraper] = None, http_client: Optional[HttpClient] = None):
         self.config = config
+        self.http_client = http_client or HttpClient(config)
+        # I retry verso l'API sono gestiti da _call_with_retry (con jitter), non da urllib3
+        self.http_client.disable_retries(config.SPOTIFY_API_BASE)
+        self.session = self.http_client.session
+        self.http_cache = http_cache or HttpCache(config)
+        self.scraper = scraper or WebScraper.from_config(config, self.http_cache, self.http_client)
+        self.token_cache = SqliteTokenCache(config)
+        self.enrichment_cache = EnrichmentCache(config)
+        self.enrichment_cache.invalidate(keep_prompt_version=ENRICHMENT_PROMPT_VERSION)
+        self.llm = EnrichmentClient(config)
         self.client = self._create_client()
     
     def _create_client(self) -> spotipy.Spotify:
@@ -26,27 +58,77 @@ class SpotifyService:
         try:
             auth_manager = SpotifyClientCredentials(
                 client_id=self.config.SPOTIFY_CLIENT_ID,
-                client_secret=self.config.SPOTIFY_CLIENT_SECRET
+                client_secret=self.config.SPOTIFY_CLIENT_SECRET,
+                requests_session=self.session,
+                requests_timeout=self.config.SPOTIFY_TIMEOUT,
+                cache_handler=self.token_cache
             )
-            return spotipy.Spotify(auth_manager=auth_manager)
+            auth_manager.OAUTH_TOKEN_URL = self.config.SPOTIFY_AUTH_URL
+            
+            client = spotipy.Spotify(
+                auth_manager=auth_manager,
+                requests_session=self.session,
+                requests_timeout=self.config.SPOTIFY_TIMEOUT
+            )
+            client.prefix = f"{self.config.SPOTIFY_API_BASE}/"
+            return client
         except Exception as e:
             logger.error(f"Error creating Spotify client: {e}", exc_info=True)
             raise
     
-    def get_latest_episode(self) -> Optional[Dict]:
-        """Recupera l'ultimo episodio del podcast principale"""
+    def refresh_token_if_needed(self) -> bool:
+        """
+        Rinnova il token prima della scadenza (SPOTIFY_TOKEN_REFRESH_MARGIN)
+        così nessuna chiamata API paga il round trip di autenticazione
+        
+        Returns:
+            True se il token è stato rinnovato
+        """
+        if self.token_cache.seconds_left() > self.config.SPOTIFY_TOKEN_REFRESH_MARGIN:
+            return False
+        
+        self.client.auth_manager.get_access_token(as_dict=False, check_cache=False)
+        logger.info("🔑 Spotify token refreshed")
+        return True
+    
+    def _fetch_page(self, url: str, limit: int, offset: int = 0) -> Dict:
+        """
+        Scarica una pagina di item di uno show, dal più recente (solleva eccezioni)
+        Passa dalla cache HTTP: entro SPOTIFY_CACHE_TTL nessuna richiesta, poi
+        una richiesta condizionale
+        """
         try:
-            results = self.client._get(
-                self.config.SPOTIFY_SHOW_URL,
-                limit=1,
-                market='IT'
+            response = self.http_cache.get(
+                self.session,
+                url,
+                params={'limit': limit, 'offset': offset, 'market': 'IT'},
+                headers={'Authorization': f"Bearer {self.client.auth_manager.get_access_token(as_dict=False)}"},
+                ttl=self.config.SPOTIFY_CACHE_TTL,
+                timeout=self.config.SPOTIFY_TIMEOUT
             )
+        except requests.HTTPError as e:
+            # Stessa eccezione di spotipy, così _call_with_retry sa cosa ritentare
+            raise SpotifyException(
+                e.response.status_code, -1, f"{url}: {e}", headers=e.response.headers
+            )
+        
+        return response.json() or {}
+    
+    def _fetch_items(self, url: str, limit: int = 1) -> List[Dict]:
+        """Scarica gli item più recenti di uno show (solleva eccezioni)"""
+        results = self._fetch_page(url, limit)
+        return results.get('items') or []
+    
+    async def get_latest_episode_async(self) -> Optional[Dict]:
+        """Recupera l'ultimo episodio del podcast principale"""
+        try:
+            results = await self._call_with_retry(self._fetch_page, self.config.SPOTIFY_SHOW_URL, 1)
+            items = [item for item in results.get('items') or [] if item]
             
-            if not results or 'items' not in results or not results['items']:
+            if not items:
                 return None
             
-            episode = results['items'][0]
-            return self._parse_episode(episode)
+            return await self._parse_episode(items[0])
             
         except Exception as e:
             logger.error(f"Error getting latest episode: {e}", exc_info=True)
@@ -55,23 +137,134 @@ class SpotifyService:
     def get_latest_pill(self) -> Optional[Dict]:
         """Recupera l'ultima pillola"""
         try:
-            results = self.client._get(
-                self.config.SPOTIFY_PILLS_URL,
-                limit=1,
-                market='IT'
-            )
+            items = self._fetch_items(self.config.SPOTIFY_PILLS_URL)
             
-            if not results or 'items' not in results or not results['items']:
+            if not items:
                 return None
             
-            pill = results['items'][0]
+            pill = items[0]
             return self._parse_pill(pill)
             
         except Exception as e:
             logger.error(f"Error getting latest pill: {e}", exc_info=True)
             return None
     
-    def _parse_episode(self, episode: Dict) -> Dict:
+    async def get_new_episodes_async(self, known_urls: Set[str]) -> List[Dict]:
+        """
+        Tutti gli episodi usciti dopo l'ultimo già noto, dal più vecchio al più recente
+        Ci si ferma al primo episodio che non si riesce a elaborare: lui e i
+        successivi restano sconosciuti e vengono ritentati al prossimo check
+        
+        Args:
+            known_urls: URL Spotify degli episodi già nel database
+        """
+        items = await self._fetch_new_items(self.config.SPOTIFY_SHOW_URL, known_urls)
+        
+        episodes = []
+        for item in reversed(items):
+            episode = await self._parse_episode(item)
+            if not episode:
+                logger.warning(
+                    f"Could not parse episode {item.get('name', '')}: "
+                    f"it and {len(items) - len(episodes) - 1} newer episode(s) will be retried"
+                )
+                break
+            episodes.append(episode)
+        return episodes
+    
+    async def get_new_pills_async(self, known_urls: Set[str]) -> List[Dict]:
+        """Tutte le pillole uscite dopo l'ultima già nota, dalla più vecchia alla più recente"""
+        items = await self._fetch_new_items(self.config.SPOTIFY_PILLS_URL, known_urls)
+        
+        pills = [self._parse_pill(item) for item in reversed(items)]
+        return [pill for pill in pills if pill]
+    
+    async def _fetch_new_items(self, url: str, known_urls: Set[str]) -> List[Dict]:
+        """
+        Scorre lo show dal più recente e si ferma al primo item già noto
+        Il costo è proporzionale al numero di item nuovi, non alla dimensione dello show.
+        Solleva eccezioni se Spotify non risponde (meglio saltare un check che
+        perdere episodi).
+        """
+        max_items = self.config.SPOTIFY_SYNC_MAX_ITEMS
+        new_items = []
+        offset = 0
+        limit = FIRST_PAGE_SIZE
+        
+        while True:
+            results = await self._call_with_retry(self._fetch_page, url, limit, offset)
+            items = results.get('items') or []
+            
+            for item in items:
+                # Spotify può restituire null per episodi non disponibili nel market
+                if not item:
+                    continue
+                
+                if item.get('external_urls', {}).get('spotify', '') in known_urls:
+                    return new_items
+                
+                new_items.append(item)
+                if len(new_items) >= max_items:
+                    logger.warning(
+                        f"Incremental sync stopped after {max_items} new items "
+                        f"without reaching a known one ({url})"
+                    )
+                    return new_items
+            
+            if not items or not results.get('next'):
+                return new_items
+            
+            offset += len(items)
+            limit = PAGE_SIZE
+    
+    async def _call_with_retry(self, func, *args):
+        """
+        Esegue una chiamata bloccante in un thread, con deadline e retry con jitter
+        Ritenta solo errori temporanei (rete, timeout, 429, 5xx)
+        """
+        # Una chiamata può includere il rinnovo del token: due round trip
+        deadline = self.config.SPOTIFY_TIMEOUT * 2 + 1
+        attempt = 0
+        
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout=deadline)
+                
+            except Exception as e:
+                if attempt >= self.config.SPOTIFY_MAX_RETRIES or not self._is_transient(e):
+                    raise
+                
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                logger.warning(
+                    f"Spotify request failed ({type(e).__name__}: {e}), "
+                    f"retry {attempt}/{self.config.SPOTIFY_MAX_RETRIES} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+    
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Errore temporaneo per cui ha senso ritentare"""
+        if isinstance(error, (asyncio.TimeoutError, requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(error, SpotifyException):
+            return error.http_status in TRANSIENT_STATUS
+        return False
+    
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Attesa prima del prossimo tentativo: Retry-After se presente, altrimenti backoff con jitter"""
+        if isinstance(error, SpotifyException) and error.headers:
+            retry_after = error.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        
+        return min(30, 2 ** attempt) * random.uniform(0.5, 1.5)
+    
+    async def _parse_episode(self, episode: Dict) -> Dict:
         """Parsea un episodio Spotify in formato database"""
         try:
             # Estrai titolo
@@ -83,17 +276,11 @@ class SpotifyService:
 
             description = episode.get('description', '')
             
-            # Estrai ID e Part dal titolo
-            # episode_id, part = self._parse_id_part(title)
-            
-            # Estrai categoria
-            # category = self._extract_category(title, episode_id)
-
-            enrichment = self._episode_enrichment(title, description)
+            enrichment = await self._classify_episode(title, description)
             
             return {
                 'Id': enrichment.get('Id', -1),
-                'Part': 1, 
+                'Part': enrichment.get('Part', 1),
                 'Titolo': title,
                 'Description': description,
                 'Category': enrichment.get('Category', '*'),
@@ -108,73 +295,211 @@ class SpotifyService:
             logger.error(f"Error parsing episode: {e}", exc_info=True)
             return {}
 
-    def _episode_enrichment(self, title: str, description: str) -> Dict:
-        """Estrae ID, categoria, ospite e shownotes da titolo, descrizione e pagina ospiti HTML"""
-
-        SYSTEM_PROMPT = """
-            Sei un assistente AI che aiuta ad estrarre informazioni chiave riguardo episodi di podcast dal titolo, dalla descrizione da un estratto della pagina html del podcast in cui ci potrebbero essere listati gli ultimi ospiti.
-            Le informazioni che devi estrarre sono:
-            - Id dell'episodio: numero identificativo dell'episodio, da restituire solo se disponibile, altrimenti metti -1
-            - Category:
-                - INTERVISTA: se c'è un ospite che sta venendo intervistato
-                - Q&A: se l'episodio consiste in domande e risposte alla community. Di solito è specificato nel titolo o nella descrizione
-                - OFFICE EXTRAS: Di solito è specificato nel titolo o nella descrizione
-                - OFFICE OF CARDS X SPEECH: Di solito è specificato nel titolo o nella descrizione
-                - LIBRO: se l'episodio parla di un libro specifico
-                - ALTRO: se nessuna delle categorie precedenti si applica
-            - Guest: nome dell'ospite intervistato, solo in caso di Category INTERVISTA, altrimenti "*"
-            - Shownotes: l'URL delle shownotes dell'episodio, se disponibile, altrimenti "*"
-
-            Restituisci sempre un dizionario con le seguenti chiavi:
-            - 'Id': int
-            - 'Category': str
-            - 'Guest': str
-            - 'Shownotes': str
-            """
-        
-        headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
-                            'AppleWebKit/537.36 (KHTML, like Gecko) '
-                            'Chrome/91.0.4472.124 Safari/537.36'
-            }
+    async def _classify_episode(self, title: str, description: str) -> Dict:
+        """
+        Estrae i metadati con le regole deterministiche e ricorre all'LLM
+        solo per i campi con confidenza sotto ENRICHMENT_MIN_CONFIDENCE
+        """
+        return (await self.classify_episodes([(title, description)]))[0]
+    
+    async def classify_episodes(self, episodes: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Versione a blocchi di _classify_episode per molti episodi (es. rescrape)
+        Gli episodi incerti vengono arricchiti con enrich_batch
         
+        Args:
+            episodes: Lista di (titolo, descrizione)
+        
+        Returns:
+            Un dizionario di campi per episodio, nello stesso ordine
+        """
+        site_entries = await asyncio.to_thread(self._load_guest_entries)
+        
+        classified = [
+            self.classify_by_rules(title, description, site_entries)
+            for title, description in episodes
+        ]
+        pending = [(fields, *uncertain) for fields, uncertain in classified if uncertain]
+        if pending:
+            await self.complete_with_llm(pending)
+        
+        return [fields for fields, _ in classified]
+    
+    def classify_by_rules(self, title: str, description: str,
+                          site_entries: List[GuestEntry]) -> Tuple[Dict, Optional[Tuple]]:
+        """
+        Campi di un episodio dalle regole e dalla pagina ospiti, senza LLM
+        
+        Returns:
+            Tupla (campi, None) se tutti i campi superano ENRICHMENT_MIN_CONFIDENCE,
+            altrimenti (campi, (campi incerti, input LLM)) da passare a complete_with_llm
+        """
+        guesses = extract_fields(title, description)
+        entries = self._relevant_guest_entries(site_entries, title, description, guesses['Id'].value)
+        self._apply_guest_entries(guesses, entries, site_entries[:GUEST_CONTEXT_LATEST], title)
+        fields = {field: guess.value for field, guess in guesses.items() if guess.value is not None}
+        
+        uncertain = low_confidence_fields(guesses, self.config.ENRICHMENT_MIN_CONFIDENCE)
+        if not uncertain:
+            logger.info(f"Episode classified by rules: {title}")
+            return fields, None
+        
+        logger.info(f"Fields {uncertain} uncertain, asking LLM: {title}")
+        if guesses['Shownotes'].confidence < self.config.ENRICHMENT_MIN_CONFIDENCE:
+            uncertain.append('Shownotes')
+        return fields, (uncertain, (title, description, self._format_guest_entries(entries)))
+    
+    async def complete_with_llm(self, pending: List[Tuple[Dict, List[str], Tuple[str, str, str]]]) -> List[bool]:
+        """
+        Completa con l'LLM i campi incerti di classify_by_rules (una richiesta
+        per episodio singolo, enrich_batch per più episodi)
+        
+        Args:
+            pending: Lista di (campi, campi incerti, input LLM); i campi sono aggiornati sul posto
+        
+        Returns:
+            Per ogni episodio, False se l'LLM non ha risposto (restano i valori delle regole)
+        """
+        if len(pending) == 1:
+            enrichments = [await self._episode_enrichment(*pending[0][2])]
+        else:
+            enrichments = await self.enrich_batch([item for _, _, item in pending])
+        
+        # L'LLM decide i campi incerti; se non sa rispondere resta il valore delle regole
+        for (fields, uncertain, _), enrichment in zip(pending, enrichments):
+            if enrichment is None:
+                continue
+            for field in uncertain:
+                if is_informative(enrichment.get(field)):
+                    fields[field] = enrichment[field]
+        
+        return [enrichment is not None for enrichment in enrichments]
+    
+    def _load_guest_entries(self) -> List[GuestEntry]:
+        """Voci della pagina ospiti (lista vuota se il sito non risponde)"""
         try:
-            result = requests.get("https://officeofcards.com/ospite/", headers=headers).text
-            html = BeautifulSoup(result, 'html.parser').find_all(class_='single_ospite_in_archive')
-        except:
-            html = ''
-
-        try:
-            messages = f"""
-                Titolo: {title}
-                Descrizione: {description}
-                Pagina Ospiti HTML: {str(html)}
-                """
+            return self.scraper.get_guest_entries()
+        except Exception as e:
+            logger.warning(f"Guests page unavailable for enrichment: {e}")
+            return []
+    
+    @staticmethod
+    def _relevant_guest_entries(entries: List[GuestEntry], title: str, description: str,
+                                episode_id: int) -> List[GuestEntry]:
+        """Voci della pagina ospiti utili per questo episodio (poche righe invece dell'HTML)"""
+        text = f"{title} {description}".lower()
+        relevant = [
+            entry for entry in entries
+            if entry.episode_id == episode_id or (len(entry.guest) > 4 and entry.guest.lower() in text)
+        ]
+        for entry in entries[:GUEST_CONTEXT_LATEST]:
+            if entry not in relevant:
+                relevant.append(entry)
+        
+        return relevant[:GUEST_CONTEXT_MAX]
+    
+    @staticmethod
+    def _apply_guest_entries(guesses: Dict[str, Guess], entries: List[GuestEntry],
+                             latest: List[GuestEntry], title: str):
+        """
+        Completa i campi incerti con la voce del sito che cita l'ospite nel titolo
+        L'Id è attendibile solo se la voce è tra le ultime pubblicate: un ospite
+        che torna potrebbe corrispondere a un episodio vecchio
+        """
+        lowered = title.lower()
+        
+        for entry in entries:
+            if len(entry.guest) <= 4 or entry.guest.lower() not in lowered:
+                continue
             
-            llm_z = ChatOpenAI(
-                model=self.config.ZAI_MODEL,
-                openai_api_key=self.config.ZAI_API_KEY,
-                openai_api_base=self.config.ZAI_BASE,
-                streaming=True
+            if guesses['Guest'].confidence < 0.9:
+                guesses['Guest'] = Guess(entry.guest, 0.9)
+            if guesses['Id'].confidence < 0.9:
+                guesses['Id'] = Guess(entry.episode_id, 0.9 if entry in latest else 0.5)
+            if guesses['Shownotes'].confidence < 0.9 and entry.url != '*':
+                guesses['Shownotes'] = Guess(entry.url, 0.9)
+            if guesses['Category'].value is None:
+                guesses['Category'] = Guess('INTERVISTA', 0.8)
+            return
+    
+    @staticmethod
+    def _format_guest_entries(entries: List[GuestEntry]) -> str:
+        """Voci della pagina ospiti in formato compatto per il prompt"""
+        return '\n'.join(f"{entry.episode_id} | {entry.guest} | {entry.url}" for entry in entries)
+    
+    async def _episode_enrichment(self, title: str, description: str, guest_context: str = '') -> Optional[Dict]:
+        """
+        Estrae ID, categoria, ospite e shownotes da titolo, descrizione e ultimi ospiti del sito
+        None se l'LLM non risponde o risponde in modo non valido
+        """
+        cache_key = EnrichmentCache.make_key(
+            title, description, guest_context, ENRICHMENT_PROMPT_VERSION, self.llm.model
+        )
+        cached = self.enrichment_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Enrichment cache hit: {title}")
+            return cached
+        
+        result = await self.llm.enrich(title, description, guest_context)
+        if result is None:
+            return None
+        
+        # Solo i risultati riusciti finiscono in cache
+        self.enrichment_cache.set(cache_key, result, ENRICHMENT_PROMPT_VERSION, self.llm.model)
+        return result
+    
+    async def enrich_batch(self, items: List[Tuple[str, str, str]]) -> List[Optional[Dict]]:
+        """
+        Arricchisce molti episodi con poche chiamate LLM
+        
+        Gli episodi già in cache non vengono inviati; gli altri sono raggruppati
+        in blocchi da ENRICHMENT_BATCH_SIZE, con al massimo
+        ENRICHMENT_BATCH_CONCURRENCY blocchi in parallelo.
+        
+        Args:
+            items: Lista di (titolo, descrizione, contesto ospiti)
+        
+        Returns:
+            Un risultato per episodio, nello stesso ordine (None se l'LLM non ha
+            risposto per quell'episodio)
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        keys = []
+        missing = []
+        
+        for position, (title, description, guest_context) in enumerate(items):
+            key = EnrichmentCache.make_key(
+                title, description, guest_context, ENRICHMENT_PROMPT_VERSION, self.llm.model
             )
-
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", SYSTEM_PROMPT),
-                ("human", "{input}")
-            ])
-
-            chain = prompt | llm_z
-
-            response = chain.invoke({"input": messages})
-            result = eval(response.content)
-
-            return result
-        except Exception as e:
-            logger.error(f"Error in episode enrichment: {e}", exc_info=True)
-            return {'Id': -1,
-                    'Category': '*',
-                    'Guest': '*',
-                    'Shownotes': '*'}
+            keys.append(key)
+            results[position] = self.enrichment_cache.get(key)
+            if results[position] is None:
+                missing.append(position)
+        
+        size = max(1, self.config.ENRICHMENT_BATCH_SIZE)
+        chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+        logger.info(
+            f"🧠 Batch enrichment: {len(items) - len(missing)} cached, "
+            f"{len(missing)} to enrich in {len(chunks)} requests"
+        )
+        
+        semaphore = asyncio.Semaphore(max(1, self.config.ENRICHMENT_BATCH_CONCURRENCY))
+        
+        async def run_chunk(chunk: List[int]) -> Dict[int, Dict]:
+            async with semaphore:
+                return await self.llm.enrich_many([items[position] for position in chunk])
+        
+        chunk_results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        
+        for chunk, enriched in zip(chunks, chunk_results):
+            for index, position in enumerate(chunk):
+                result = enriched.get(index)
+                if result is None:
+                    continue
+                results[position] = result
+                self.enrichment_cache.set(keys[position], result, ENRICHMENT_PROMPT_VERSION, self.llm.model)
+        
+        return results
     
     def _parse_pill(self, pill: Dict) -> Dict:
         """Parsea una pillola Spotify"""
@@ -195,62 +520,6 @@ class SpotifyService:
             logger.error(f"Error parsing pill: {e}", exc_info=True)
             return {}
     
-    def _parse_id_part(self, title: str) -> Tuple[int, int]:
-        """
-        Estrae ID e Part da un titolo
-        Formato: "123_2 Titolo" oppure "123 Titolo"
-        """
-        try:
-            parts = title.split(' ')
-            if not parts:
-                return 0, 1
-            
-            id_part = parts[0].split('_')
-            
-            # Estrai ID
-            try:
-                episode_id = int(id_part[0])
-            except (ValueError, IndexError):
-                return 0, 1
-            
-            # Estrai Part (default 1 se non presente)
-            if len(id_part) > 1:
-                try:
-                    part = int(id_part[1])
-                except ValueError:
-                    part = 1
-            else:
-                part = 1
-            
-            return episode_id, part
-            
-        except Exception as e:
-            logger.error(f"Error parsing ID/Part from '{title}': {e}")
-            return 0, 1
-    
-    def _extract_category(self, title: str, episode_id: int) -> str:
-        """Estrae la categoria da un titolo"""
-        try:
-            # Casi speciali
-            if episode_id == 0:
-                return 'INTRO'
-            elif episode_id in [3, 31]:
-                return 'Q&A'
-            
-            # Cerca categoria tra parentesi quadre [CATEGORIA]
-            start = title.find('[')
-            end = title.find(']')
-            
-            if start != -1 and end != -1:
-                return title[start+1:end].strip()
-            
-            # Default: INTERVISTA
-            return 'INTERVISTA'
-            
-        except Exception as e:
-            logger.error(f"Error extracting category: {e}")
-            return 'INTERVISTA'
-    
     def _extract_id_from_description(self, description: str) -> int:
         """Estrae l'ID episodio dalla descrizione di una pillola"""
         try:
@@ -0,0 +1,104 @@
+"""
+Cache persistente del token Spotify
+
+Il token client-credentials viene salvato in data/cache.db, così bot,
+rescrape_all_episodes.py ed eventuali altri processi riusano lo stesso token
+anche dopo un riavvio invece di richiederne uno nuovo ogni volta.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, Optional
+
+from spotipy.cache_handler import CacheHandler
+
+logger = logging.getLogger(__name__)
+
+# Margine (s) sotto il quale un token in memoria viene riletto dal database:
+# un altro processo potrebbe averlo già rinnovato
+RELOAD_MARGIN = 60
+
+
+class SqliteTokenCache(CacheHandler):
+    """
+    CacheHandler spotipy su SQLite
+
+    Args:
+        config: Configurazione (usa CACHE_DB_PATH e SPOTIFY_CLIENT_ID)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = Lock()
+        self.db_path = self.config.CACHE_DB_PATH
+        self.key = f"spotify:{self.config.SPOTIFY_CLIENT_ID}"
+        self._token: Optional[Dict] = None
+        self._init_database()
+
+    def _init_database(self):
+        """Crea tabella se non esiste"""
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS oauth_tokens (
+                        key TEXT PRIMARY KEY,
+                        token_info TEXT NOT NULL,
+                        expires_at INTEGER NOT NULL
+                    )
+                ''')
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.error(f"Error initializing token cache: {e}", exc_info=True)
+                raise
+
+    def get_cached_token(self) -> Optional[Dict]:
+        """Token in memoria, oppure dal database se in scadenza o assente"""
+        token = self._token
+        if token is not None and token['expires_at'] - time.time() > RELOAD_MARGIN:
+            return token
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute(
+                'SELECT token_info FROM oauth_tokens WHERE key = ?', (self.key,)
+            ).fetchone()
+            conn.close()
+
+            if row is not None:
+                self._token = json.loads(row[0])
+
+        except Exception as e:
+            logger.warning(f"Could not read cached Spotify token: {e}")
+
+        return self._token
+
+    def save_token_to_cache(self, token_info: Dict):
+        """Salva il token in memoria e su database"""
+        self._token = token_info
+
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('''
+                    INSERT OR REPLACE INTO oauth_tokens (key, token_info, expires_at)
+                    VALUES (?, ?, ?)
+                ''', (self.key, json.dumps(token_info), int(token_info['expires_at'])))
+                conn.commit()
+                conn.close()
+
+            except Exception as e:
+                logger.warning(f"Could not save Spotify token: {e}")
+
+    def seconds_left(self) -> float:
+        """Secondi di validità residua del token (0 se assente)"""
+        token = self.get_cached_token()
+        if token is None:
+            return 0
+        return max(0, token['expires_at'] - time.time())
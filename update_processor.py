@@ -0,0 +1,79 @@
+"""
+Update processor per l'elaborazione concorrente degli update Telegram
+
+Gli update di chat diverse vengono elaborati in parallelo, quelli della
+stessa chat uno alla volta e nell'ordine di arrivo.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Elabora gli update in modo concorrente mantenendo l'ordine per chat
+
+    Args:
+        max_concurrent_updates: Numero massimo di handler in esecuzione contemporanea
+        max_pending_updates: Numero massimo di update accettati (in esecuzione o in
+            attesa del proprio turno nella chat). Default: 10x max_concurrent_updates
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: Optional[int] = None):
+        # Il semaforo della classe base limita gli update in volo; quello interno
+        # viene acquisito solo dopo il lock della chat, così un update in coda
+        # dietro alla propria chat non occupa uno slot di esecuzione
+        super().__init__(max_pending_updates or max_concurrent_updates * 10)
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks: Dict[Hashable, asyncio.Lock] = {}
+        self._chat_waiters: Dict[Hashable, int] = {}
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[Hashable]:
+        """Chiave di serializzazione: chat, oppure utente se la chat manca"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ('user', update.effective_user.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Attende il turno della chat, poi uno slot libero, poi esegue l'handler"""
+        key = self._chat_key(update)
+
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+
+        try:
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            # Rimuove il lock quando nessun altro update della chat è in attesa
+            self._chat_waiters[key] -= 1
+            if self._chat_waiters[key] == 0:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        """Nessuna risorsa da allocare"""
+
+    async def shutdown(self) -> None:
+        """Nessuna risorsa da liberare"""
+        if self._chat_locks:
+            logger.info(f"Update processor shutting down with {len(self._chat_locks)} busy chats")
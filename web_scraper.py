@@ -3,70 +3,132 @@ Modulo per lo scraping delle shownotes dal sito
 """
 
 import logging
-from typing import Optional, Tuple
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
 import requests
-from bs4 import BeautifulSoup
+
+from html_parsing import GuestEntry, parse_guests_page
+from http_cache import HttpCache
+from episode_rules import merge_known
+from http_client import DEFAULT_USER_AGENT, HttpClient
+from rate_limit import HostRateLimiter
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = 'https://officeofcards.com/ospite/'
+
+# Link di paginazione dell'archivio ospiti (".../ospite/page/3/")
+_PAGE_LINK_RE = re.compile(r'/page/(\d+)/?$')
+
+# Archivio ospiti condiviso dalle fasi di una stessa richiesta (vedi request_scope).
+# asyncio.to_thread copia il contesto, quindi anche i thread vedono lo stesso dizionario
+_request_archives: ContextVar[Optional[Dict]] = ContextVar('guest_archives', default=None)
+
+
+class GuestArchive(NamedTuple):
+    """Voci dell'archivio ospiti scaricate insieme, dalla più recente, e indice per episodio"""
+    entries: List[GuestEntry]
+    index: Dict[int, GuestEntry]
+
 
 class WebScraper:
-    """Gestisce lo scraping del sito Office of Cards"""
+    """
+    Gestisce lo scraping del sito Office of Cards
+    
+    Args:
+        http_cache: Cache HTTP condivisa (opzionale)
+        cache_ttl: Secondi per cui la pagina ospiti in cache è considerata aggiornata
+        base_url: URL della pagina ospiti (Config.SHOWNOTES_URL)
+        crawl_concurrency: Pagine dell'archivio scaricate in parallelo
+        rate_per_second: Richieste/s massime verso il sito
+        max_pages: Limite di pagine dell'archivio (protezione da paginazioni anomale)
+        session: Sessione HTTP condivisa (HttpClient.session); senza, una sessione propria
+    """
     
-    def __init__(self):
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
-                         'AppleWebKit/537.36 (KHTML, like Gecko) '
-                         'Chrome/91.0.4472.124 Safari/537.36'
-        }
-        self.base_url = 'https://officeofcards.com/ospite/'
+    def __init__(self, http_cache: Optional[HttpCache] = None, cache_ttl: float = 0,
+                 base_url: str = DEFAULT_BASE_URL, crawl_concurrency: int = 4,
+                 rate_per_second: float = 2, max_pages: int = 50,
+                 session: Optional[requests.Session] = None):
+        self.http_cache = http_cache
+        self.cache_ttl = cache_ttl
+        self.crawl_concurrency = max(1, crawl_concurrency)
+        self.max_pages = max_pages
+        self.rate_limiter = HostRateLimiter(rate_per_second)
+        
+        # Sessione keep-alive condivisa dai worker del crawl
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = DEFAULT_USER_AGENT
+        self.session = session
+        
+        # Archivio ospiti già estratto (riusato entro cache_ttl); il lock fa sì
+        # che richieste contemporanee aspettino un solo download
+        self._archive: Optional[GuestArchive] = None
+        self._archive_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.base_url = base_url
+    
+    @classmethod
+    def from_config(cls, config, http_cache: Optional[HttpCache] = None,
+                    http_client: Optional[HttpClient] = None) -> 'WebScraper':
+        """Scraper con URL, cache e limiti di crawl presi dalla configurazione"""
+        return cls(
+            http_cache,
+            config.WEBSITE_CACHE_TTL,
+            config.SHOWNOTES_URL,
+            crawl_concurrency=config.WEBSITE_CRAWL_CONCURRENCY,
+            rate_per_second=config.WEBSITE_RATE_PER_SECOND,
+            max_pages=config.WEBSITE_MAX_PAGES,
+            session=http_client.session if http_client else None
+        )
+    
+    @contextmanager
+    def request_scope(self):
+        """
+        Dentro il blocco (anche nei thread di asyncio.to_thread) tutte le letture
+        dell'archivio ospiti usano lo stesso download: arricchimento e metadati
+        di un check vedono gli stessi dati e il sito viene contattato una volta
+        """
+        token = _request_archives.set({})
+        try:
+            yield
+        finally:
+            _request_archives.reset(token)
     
     def get_shownotes_and_guest(self, episode_id: int) -> Tuple[str, str]:
         """
         Recupera URL shownotes e nome ospite per un episodio
+        La pagina ospiti è scaricata e indicizzata una volta ogni cache_ttl
+        (o una volta per request_scope): ogni ricerca è un accesso al dizionario
         
         Returns:
             Tupla (shownotes_url, guest_name) oppure ('*', '*') se non trovati
         """
         try:
-            response = requests.get(
-                self.base_url,
-                headers=self.headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            containers = soup.find_all('div', attrs={'class': 'container-overlay'})
+            entries, index = self.get_archive()
             
-            if not containers:
+            if not entries:
                 logger.warning("No containers found on shownotes page")
                 return '*', '*'
             
             # Verifica se l'episodio è già pubblicato
-            latest_id = self._extract_episode_id(containers[0])
-            if latest_id is None or episode_id > latest_id:
+            if episode_id > entries[0].episode_id:
                 logger.info(f"Episode {episode_id} not yet published on website")
                 return '*', '*'
             
-            # Cerca l'episodio specifico
-            for container in containers:
-                container_id = self._extract_episode_id(container)
-                
-                if container_id == episode_id:
-                    # Estrai URL
-                    link = container.find('a')
-                    url = link.get('href', '*') if link else '*'
-                    
-                    # Estrai nome ospite
-                    spans = container.find_all('span')
-                    guest = spans[1].text.strip() if len(spans) > 1 else '*'
-                    
-                    logger.info(f"Found shownotes for episode {episode_id}: {guest}")
-                    return url, guest
+            entry = index.get(episode_id)
+            if entry is None:
+                logger.warning(f"Episode {episode_id} not found in containers")
+                return '*', '*'
             
-            logger.warning(f"Episode {episode_id} not found in containers")
-            return '*', '*'
+            logger.info(f"Found shownotes for episode {episode_id}: {entry.guest}")
+            return entry.url, entry.guest
             
         except requests.RequestException as e:
             logger.error(f"Network error scraping shownotes: {e}")
@@ -75,30 +137,128 @@ class WebScraper:
             logger.error(f"Error scraping shownotes for episode {episode_id}: {e}", exc_info=True)
             return '*', '*'
     
-    def _extract_episode_id(self, container) -> Optional[int]:
-        """Estrae l'ID episodio da un container"""
-        try:
-            spans = container.find_all('span')
-            if not spans:
-                return None
-            
-            # Il primo span contiene qualcosa come "Episodio 123"
-            text = spans[0].text.strip()
-            words = text.split()
-            
-            # L'ultimo elemento dovrebbe essere il numero
-            if words:
-                return int(words[-1])
-            
-            return None
+    def get_guest_entries(self) -> List[GuestEntry]:
+        """
+        Archivio ospiti completo in forma compatta (episodio, ospite, URL shownotes),
+        dal più recente. Solleva eccezioni se una pagina non è raggiungibile.
+        """
+        return self.get_archive().entries
+    
+    def get_archive(self) -> GuestArchive:
+        """
+        Voci e indice dell'archivio ospiti
+        Dentro request_scope il primo download viene riusato per tutta la richiesta
+        """
+        scope = _request_archives.get()
+        if scope is not None and self in scope:
+            return scope[self]
+        
+        archive = self._load_archive()
+        if scope is not None:
+            scope[self] = archive
+        return archive
+    
+    def _load_archive(self) -> GuestArchive:
+        """
+        Prima pagina e paginazione vengono scaricate e analizzate una volta ogni
+        cache_ttl secondi. Un solo download alla volta: chi arriva mentre è in
+        corso ne riceve il risultato invece di scaricare di nuovo.
+        Se una pagina fallisce l'eccezione arriva al chiamante e la cache resta
+        quella precedente: un archivio incompleto non viene mai salvato.
+        """
+        requested_at = time.monotonic()
+        if self._archive is not None and requested_at - self._archive_at < self.cache_ttl:
+            return self._archive
+        
+        with self._refresh_lock:
+            # Scaricato da un'altra richiesta mentre si aspettava il lock
+            if self._archive is not None and (
+                self._archive_at >= requested_at
+                or time.monotonic() - self._archive_at < self.cache_ttl
+            ):
+                return self._archive
             
-        except (ValueError, IndexError, AttributeError) as e:
-            logger.debug(f"Could not extract episode ID from container: {e}")
-            return None
+            self._archive = self._download_archive()
+            self._archive_at = time.monotonic()
+            return self._archive
+    
+    def _download_archive(self) -> GuestArchive:
+        """Scarica e analizza tutte le pagine dell'archivio ospiti"""
+        entries, links = parse_guests_page(self._fetch_page(self.base_url))
+        
+        pages = self._discover_pages(links)
+        if pages:
+            for page_entries in self._crawl_pages(pages):
+                entries.extend(page_entries)
+        
+        # In caso di numeri ripetuti vale la voce più recente (la prima)
+        index = {}
+        for entry in entries:
+            index.setdefault(entry.episode_id, entry)
+        
+        logger.info(f"Parsed {len(entries)} entries from {len(pages) + 1} guests pages")
+        return GuestArchive(entries, index)
+    
+    def _discover_pages(self, links: List[str]) -> List[str]:
+        """
+        URL delle pagine successive dell'archivio
+        La paginazione mostra solo alcuni numeri ("1 2 3 … 12"): si usa il massimo
+        """
+        last_page = 1
+        for link in links:
+            href = urljoin(self.base_url, link)
+            match = _PAGE_LINK_RE.search(href)
+            if match and href.startswith(self.base_url):
+                last_page = max(last_page, int(match.group(1)))
+        
+        if last_page > self.max_pages:
+            logger.warning(f"Guests archive has {last_page} pages, crawling only {self.max_pages}")
+            last_page = self.max_pages
+        
+        return [urljoin(self.base_url, f"page/{number}/") for number in range(2, last_page + 1)]
+    
+    def _crawl_pages(self, pages: List[str]) -> List[List[GuestEntry]]:
+        """
+        Scarica e analizza le pagine con al massimo crawl_concurrency richieste
+        in parallelo, nel rispetto del rate limit per host
+        
+        Returns:
+            Voci di ogni pagina, nello stesso ordine
+        
+        Raises:
+            requests.RequestException: se una pagina non è raggiungibile dopo i
+            retry del client HTTP (un archivio parziale non va mai in cache)
+        """
+        def crawl(url: str) -> List[GuestEntry]:
+            try:
+                return parse_guests_page(self._fetch_page(url))[0]
+            except requests.RequestException as e:
+                logger.warning(f"Could not fetch guests page {url}: {e}")
+                raise
+        
+        with ThreadPoolExecutor(max_workers=self.crawl_concurrency) as executor:
+            return list(executor.map(crawl, pages))
+    
+    def _fetch_page(self, url: str) -> str:
+        """Scarica una pagina del sito (dalla cache HTTP se disponibile)"""
+        self.rate_limiter.acquire(url)
+        
+        if self.http_cache is not None:
+            return self.http_cache.get(
+                self.session,
+                url,
+                ttl=self.cache_ttl
+            ).text
+        
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        return response.text
     
     def update_episode_metadata(self, episode_data: dict) -> dict:
         """
         Aggiorna i metadati di un episodio con shownotes e guest
+        Se il sito non ha ancora l'episodio restano i valori già noti
+        (es. trovati dall'arricchimento): un '*' non sostituisce mai un valore
         
         Args:
             episode_data: Dizionario con dati episodio (deve contenere 'Id')
@@ -113,10 +273,7 @@ class WebScraper:
             
             shownotes_url, guest_name = self.get_shownotes_and_guest(episode_id)
             
-            episode_data['Shownotes'] = shownotes_url
-            episode_data['Guest'] = guest_name
-            
-            return episode_data
+            return merge_known(episode_data, {'Shownotes': shownotes_url, 'Guest': guest_name})
             
         except Exception as e:
             logger.error(f"Error updating episode metadata: {e}", exc_info=True)